@@ -53,8 +53,11 @@ def main():
     try:
         # Импортируем и запускаем Dash приложение
         from dashboard import app
+        from data_store import background_load_enabled
         
         print(f"✅ Dash-приложение успешно запущено!")
+        if background_load_enabled():
+            print(f"⏳ Данные загружаются в фоне, готовность: http://127.0.0.1:{PORT}/readyz")
         print(f"📂 Рабочая директория: {os.getcwd()}")
         print(f"🔗 Откроется в браузере через 2 секунды...")
         print(f"⏹️  Для остановки нажмите Ctrl+C")
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Фоновое выполнение тяжелых callback'ов через DiskcacheManager Dash.
+
+Callback выполняется в отдельном процессе, поэтому веб-воркер остается свободным
+для легких запросов. Результаты хранятся в diskcache по ключу из входов и версии
+данных: готовый результат отдается без запуска процесса, а одинаковые запросы,
+пришедшие пока задача еще считается, присоединяются к уже запущенному процессу.
+При смене входов Dash сам отменяет прежнюю задачу. Если зависимостей нет или режим
+выключен, те же функции регистрируются как обычные callback'и.
+"""
+
+import functools
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_ENABLED = os.environ.get('DASHBOARD_BACKGROUND_CALLBACKS', '1') == '1'
+CACHE_DIR = os.environ.get('DASHBOARD_BACKGROUND_CACHE', os.path.join('.cache', 'background'))
+# Сколько секунд хранить результат, к которому никто не обращался
+RESULT_EXPIRE = int(os.environ.get('DASHBOARD_BACKGROUND_EXPIRE', '3600'))
+
+try:
+    import diskcache
+    from dash import DiskcacheManager
+except ImportError:
+    diskcache = None
+    DiskcacheManager = object
+
+
+class SharedJobManager(DiskcacheManager):
+    """DiskcacheManager, который не запускает второй процесс для уже считаемого ключа.
+
+    Реестр задач (ключ -> pid и число ожидающих клиентов) хранится в том же diskcache,
+    поэтому работает и между воркерами gunicorn. Процесс завершается при отмене только
+    когда его больше никто не ждет. Прогресс задачи читается без удаления, чтобы его
+    видели все клиенты, ожидающие общий процесс.
+    """
+
+    JOB_PREFIX = 'job:'
+    REFS_PREFIX = 'job-refs:'
+    PID_PREFIX = 'job-pid:'
+    # Номер задачи, когда результат уже посчитан и процесс не нужен
+    NO_JOB = 0
+    # Отметка "процесс для ключа запускается" и сколько она живет, если запускавший упал
+    STARTING = -1
+    START_TIMEOUT = 10
+    POLL_INTERVAL = 0.02
+
+    def call_job_fn(self, key, job_fn, args, context):
+        if self.result_ready(key):
+            return self.NO_JOB
+        while True:
+            with self.handle.transact():
+                job = self.handle.get(self.JOB_PREFIX + key)
+                if job is None or (job != self.STARTING and not self.job_running(job)):
+                    # Ключ наш: отмечаем запуск, а сам fork - после выхода из транзакции,
+                    # чтобы дочерний процесс не унаследовал открытую транзакцию SQLite
+                    self.handle.set(self.JOB_PREFIX + key, self.STARTING, expire=self.START_TIMEOUT)
+                    self.clear_cache_entry(self._make_progress_key(key))
+                    break
+                if job != self.STARTING:
+                    self.handle.incr(self.REFS_PREFIX + key)
+                    return job
+            # Процесс для этого ключа запускает другой клиент - ждем его pid
+            time.sleep(self.POLL_INTERVAL)
+
+        job = super().call_job_fn(key, job_fn, args, context)
+        with self.handle.transact():
+            self.handle.set(self.JOB_PREFIX + key, job, expire=RESULT_EXPIRE)
+            self.handle.set(self.REFS_PREFIX + key, 1, expire=RESULT_EXPIRE)
+            self.handle.set(self.PID_PREFIX + str(job), key, expire=RESULT_EXPIRE)
+        return job
+
+    def get_progress(self, key):
+        # Базовый менеджер удаляет прогресс при чтении, и при общем процессе шаг видел бы
+        # только первый опросивший клиент; прогресс очищается вместе с результатом
+        return self.handle.get(self._make_progress_key(key))
+
+    def terminate_job(self, job):
+        if job is None or int(job) == self.NO_JOB:
+            return
+        with self.handle.transact():
+            key = self.handle.get(self.PID_PREFIX + str(job))
+            if key is not None:
+                if self.handle.decr(self.REFS_PREFIX + key) > 0:
+                    # Результат еще ждут другие клиенты
+                    return
+                for name in (self.JOB_PREFIX + key, self.REFS_PREFIX + key, self.PID_PREFIX + str(job)):
+                    self.handle.delete(name)
+        super().terminate_job(job)
+
+
+def create_manager(version_getter):
+    """Менеджер фоновых callback'ов или None, если режим выключен или нет зависимостей"""
+    if not BACKGROUND_ENABLED:
+        return None
+    if diskcache is None:
+        logger.warning("Фоновые callback'и недоступны: не установлен diskcache, выполняются синхронно")
+        return None
+    try:
+        manager = SharedJobManager(
+            diskcache.Cache(CACHE_DIR),
+            cache_by=[version_getter],
+            expire=RESULT_EXPIRE,
+        )
+    except ImportError as e:
+        logger.warning("Фоновые callback'и недоступны (%s), выполняются синхронно", e)
+        return None
+    logger.info("Фоновые callback'и: diskcache в %s", CACHE_DIR)
+    return manager
+
+
+def _no_progress(value):
+    pass
+
+
+def background_callback(app, manager, *args, progress=None, running=None, **kwargs):
+    """Регистрирует callback фоновым при наличии менеджера, иначе - обычным.
+
+    Функция получает первым аргументом set_progress((шаг, всего)); в синхронном
+    режиме это заглушка. Декоратор возвращает вариант без set_progress для прямых
+    вызовов (бенчмарки, проверки).
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def sync_callback(*values):
+            return func(_no_progress, *values)
+
+        if manager is not None:
+            app.callback(
+                *args, background=True, manager=manager,
+                progress=progress, running=running, **kwargs
+            )(func)
+        else:
+            app.callback(*args, running=running, **kwargs)(sync_callback)
+        return sync_callback
+
+    return decorator
@@ -7,16 +7,11 @@
 import pandas as pd
 import numpy as np
 
-def analyze_current_issues():
+def analyze_current_issues(trade_data, country_mapping, countries_original):
     """Анализируем текущие проблемы в данных"""
     
     print("=== АНАЛИЗ ПРОБЛЕМ В ДАННЫХ ===")
     
-    # Загружаем данные
-    trade_data = pd.read_csv('/workspace/data/final_trade_data.csv')
-    country_mapping = pd.read_csv('/workspace/data/country_mapping.csv')
-    countries_original = pd.read_csv('/workspace/user_input_files/countries.csv')
-    
     print(f"Trade data shape: {trade_data.shape}")
     print(f"Country mapping shape: {country_mapping.shape}")
     print(f"Original countries shape: {countries_original.shape}")
@@ -81,15 +76,11 @@ def analyze_current_issues():
     
     return trade_data, country_mapping, countries_original
 
-def fix_country_mapping():
+def fix_country_mapping(country_mapping, countries_original):
     """Исправляем мапинг стран"""
     
     print("\n=== ИСПРАВЛЕНИЕ МАПИНГА СТРАН ===")
     
-    # Загружаем данные
-    country_mapping = pd.read_csv('/workspace/data/country_mapping.csv')
-    countries_original = pd.read_csv('/workspace/user_input_files/countries.csv')
-    
     # Создаем улучшенный мапинг
     fixed_mapping = country_mapping.copy()
     
@@ -116,15 +107,13 @@ def fix_country_mapping():
     fixed_mapping.loc[fixed_mapping['world_part'] == 'Неизвестно', 'world_part'] = 'Прочие регионы'
     fixed_mapping.loc[fixed_mapping['world_part'] == 'world_part', 'world_part'] = 'Прочие регионы'
     
-    # Сохраняем исправленный мапинг
-    fixed_mapping.to_csv('/workspace/data/country_mapping_fixed.csv', index=False)
-    
-    print(f"\nИсправленный мапинг сохранен: {len(fixed_mapping)} стран")
+    print(f"\nИсправленный мапинг: {len(fixed_mapping)} стран")
     print("Распределение по регионам:")
     print(fixed_mapping['world_part'].value_counts())
     
     return fixed_mapping
 
 if __name__ == "__main__":
-    trade_data, country_mapping, countries_original = analyze_current_issues()
-    fixed_mapping = fix_country_mapping()
+    # Анализ и country_mapping_fixed.csv строятся стадиями общего конвейера
+    from pipeline import main
+    main(['--only', 'fixed_mapping', '--reports'])
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замер времени построения фигур: plotly.express + update_* против словарей из figures
+"""
+
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import plotly.express as px
+from plotly.io.json import to_json_plotly
+
+import figures
+from snapshot import load_or_prepare
+
+REPEATS = 50
+
+FLOW_NAMES = {'E': 'Экспорт', 'I': 'Импорт'}
+LABELS = {'value': figures.VALUE_TITLE, 'year': figures.YEAR_TITLE}
+
+
+def express_yearly(aggregates):
+    yearly = aggregates['yearly'].assign(flow=lambda frame: frame['flow'].map(FLOW_NAMES))
+    fig = px.line(yearly, x='year', y='value', color='flow', title="Динамика",
+                  labels={**LABELS, 'flow': 'Тип потока'})
+    fig.update_traces(hovertemplate=figures.HOVER_Y_VALUE)
+    fig.update_layout(template="plotly_white")
+    return fig
+
+
+def dict_yearly(aggregates):
+    yearly = aggregates['yearly']
+    return figures.line_figure(yearly['year'], yearly['value'], yearly['flow'].map(FLOW_NAMES),
+                               title="Динамика", legend_title='Тип потока')
+
+
+def express_regions(aggregates):
+    trend = aggregates['region_year_flow']
+    fig = px.line(trend, x='year', y='value', color='world_part', title="Регионы",
+                  labels={**LABELS, 'world_part': 'Регион'})
+    fig.update_traces(hovertemplate=figures.HOVER_Y_VALUE)
+    fig.update_layout(template="plotly_white")
+    return fig
+
+
+def dict_regions(aggregates):
+    trend = aggregates['region_year_flow']
+    return figures.line_figure(trend['year'], trend['value'], trend['world_part'],
+                               title="Регионы", legend_title='Регион')
+
+
+def express_partners(aggregates):
+    partners = aggregates['partner_totals'].nlargest(15).reset_index()
+    fig = px.bar(partners, x='value', y='partnerName', orientation='h', title="Партнеры",
+                 labels={**LABELS, 'partnerName': 'Страна/Регион'})
+    fig.update_traces(hovertemplate=figures.HOVER_BAR_H)
+    fig.update_layout(template="plotly_white")
+    return fig
+
+
+def dict_partners(aggregates):
+    partners = aggregates['partner_totals'].nlargest(15)
+    return figures.bar_figure(partners.to_numpy(), partners.index, title="Партнеры",
+                              label_title='Страна/Регион')
+
+
+def express_sectors(aggregates):
+    sectors = aggregates['sector_totals'].nlargest(10, 'value')
+    fig = px.pie(sectors, values='value', names='sector', title="Сектора")
+    fig.update_traces(hovertemplate='%{label}<br>%{value:,.0f}<extra></extra>')
+    fig.update_layout(template="plotly_white")
+    return fig
+
+
+def dict_sectors(aggregates):
+    sectors = aggregates['sector_totals'].nlargest(10, 'value')
+    return figures.pie_figure(sectors['value'], sectors['sector'], title="Сектора",
+                              hovertemplate='%{label}<br>%{value:,.0f}<extra></extra>')
+
+
+FIGURES = [
+    ('yearly_trend', express_yearly, dict_yearly),
+    ('region_trend', express_regions, dict_regions),
+    ('top_partners', express_partners, dict_partners),
+    ('sector_structure', express_sectors, dict_sectors),
+]
+
+
+def measure(build, aggregates):
+    """Возвращает (фигура, мс на построение, мс на JSON)"""
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        fig = build(aggregates)
+    built = time.perf_counter()
+    for _ in range(REPEATS):
+        to_json_plotly(fig)
+    encoded = time.perf_counter()
+    return fig, (built - start) / REPEATS * 1000, (encoded - built) / REPEATS * 1000
+
+
+def same_traces(express_fig, dict_fig):
+    """Проверяем, что обе фигуры показывают одни и те же точки"""
+    if len(express_fig.data) != len(dict_fig['data']):
+        return False
+    for left, right in zip(express_fig.data, dict_fig['data']):
+        for attr in ('x', 'y', 'values', 'labels'):
+            if attr in right and not np.array_equal(np.asarray(left[attr]), np.asarray(right[attr])):
+                return False
+    return True
+
+
+def print_report(aggregates):
+    print(f"{'figure':<20}{'px, ms':>10}{'dict, ms':>10}{'px json':>10}{'dict json':>10}  traces")
+    total_express = total_dict = 0.0
+    for name, express_build, dict_build in FIGURES:
+        express_fig, express_ms, express_json = measure(express_build, aggregates)
+        dict_fig, dict_ms, dict_json = measure(dict_build, aggregates)
+        total_express += express_ms
+        total_dict += dict_ms
+        status = "совпадают" if same_traces(express_fig, dict_fig) else "РАЗЛИЧАЮТСЯ"
+        print(f"{name:<20}{express_ms:>10.2f}{dict_ms:>10.2f}{express_json:>10.2f}{dict_json:>10.2f}  {status}")
+    print(f"\nПостроение фигур: {total_express:.1f} мс -> {total_dict:.1f} мс "
+          f"({total_express / max(total_dict, 1e-9):.0f}x)")
+
+
+if __name__ == "__main__":
+    print("=== ПОСТРОЕНИЕ ФИГУР ===")
+    print_report(load_or_prepare().aggregates)
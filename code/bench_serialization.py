@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замер размера и времени сериализации ответов callback'ов: стандартный путь против быстрого
+"""
+
+import copy
+import gzip
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from plotly.io.json import to_json_plotly
+
+import dashboard
+from serialization import shrink_figure
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+REPEATS = 20
+
+CALLBACKS = [
+    (dashboard.update_kpi, '/'),
+    (dashboard.update_yearly_trend, '/'),
+    (dashboard.update_top_commodities, 'E'),
+    (dashboard.update_sector_structure, '/'),
+    (dashboard.update_geography_map, None),
+    (dashboard.update_top_partners, '/'),
+    (dashboard.update_russia_analysis, '/'),
+    (dashboard.update_structure_changes, '/'),
+]
+
+
+def measure_encoding(value, engine):
+    """Возвращает (байты, среднее время кодирования в мс)"""
+    start = time.perf_counter()
+    for _ in range(REPEATS):
+        payload = to_json_plotly(value, engine=engine).encode('utf-8')
+    elapsed = (time.perf_counter() - start) / REPEATS * 1000
+    return payload, elapsed
+
+
+def compare_callback(callback, argument):
+    """Сравниваем стандартный и быстрый путь для одного callback'а"""
+    value = callback(argument)
+    is_figure = isinstance(value, dict) or hasattr(value, 'data')
+    fast_value = shrink_figure(copy.deepcopy(value)) if is_figure else value
+
+    base_payload, base_time = measure_encoding(value, 'json')
+    fast_payload, fast_time = measure_encoding(fast_value, 'orjson')
+
+    result = {
+        'callback': callback.__name__,
+        'base_bytes': len(base_payload),
+        'base_ms': base_time,
+        'fast_bytes': len(fast_payload),
+        'fast_ms': fast_time,
+        'gzip_bytes': len(gzip.compress(fast_payload, compresslevel=6)),
+    }
+    if brotli is not None:
+        result['br_bytes'] = len(brotli.compress(fast_payload, quality=5))
+    return result
+
+
+def print_report(results):
+    """Печатаем таблицу с результатами"""
+    print(f"{'callback':<28}{'json, B':>10}{'json, ms':>10}{'fast, B':>10}"
+          f"{'fast, ms':>10}{'gzip, B':>10}{'br, B':>10}")
+    for row in results:
+        br_bytes = row.get('br_bytes', '-')
+        print(f"{row['callback']:<28}{row['base_bytes']:>10}{row['base_ms']:>10.2f}"
+              f"{row['fast_bytes']:>10}{row['fast_ms']:>10.2f}{row['gzip_bytes']:>10}{br_bytes:>10}")
+
+    base_bytes = sum(row['base_bytes'] for row in results)
+    # Маленькие ответы не сжимаются, поэтому берем меньший из вариантов
+    sent_bytes = sum(min(row['fast_bytes'], row.get('br_bytes', row['gzip_bytes'])) for row in results)
+    base_time = sum(row['base_ms'] for row in results)
+    fast_time = sum(row['fast_ms'] for row in results)
+    print(f"\nВсего: {base_bytes} B -> {sent_bytes} B на проводе "
+          f"({100 * (1 - sent_bytes / base_bytes):.0f}% меньше), "
+          f"кодирование {base_time:.1f} мс -> {fast_time:.1f} мс")
+
+
+if __name__ == "__main__":
+    print("=== СЕРИАЛИЗАЦИЯ ОТВЕТОВ CALLBACK'ОВ ===")
+    print_report([compare_callback(callback, argument) for callback, argument in CALLBACKS])
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Замер теплого старта из снимка на синтетических данных растущего размера.
+
+Теплый старт не должен зависеть от числа строк: колонки отображаются в память,
+строковые читаются как category поверх кодов. Код возврата 1, если время загрузки
+снимка на самых больших данных заметно больше, чем на самых маленьких.
+
+Пример:
+    python code/bench_snapshot.py --rows 20000 200000 2000000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+from data_store import TradeData, build_aggregates
+from snapshot import load_snapshot, save_snapshot
+
+REPEATS = 5
+PARTNERS = 200
+COMMODITIES = 1000
+YEARS = range(2000, 2024)
+REGIONS = ('Европа', 'Азия', 'Африка', 'Северная Америка', 'Южная Америка', 'Океания')
+
+# Допуск: время на самых больших данных не больше TOLERANCE * время на самых маленьких + SLACK_MS
+TOLERANCE = 3.0
+SLACK_MS = 20.0
+
+
+def synthetic_data(rows, seed=0):
+    """TradeData с колонками как у подготовленных данных и rows строками"""
+    rng = np.random.default_rng(seed)
+    partner = rng.integers(0, PARTNERS, rows)
+    names = np.array([f"Страна {code}" for code in range(PARTNERS)], dtype=object)
+    regions = np.array(REGIONS, dtype=object)[np.arange(PARTNERS) % len(REGIONS)]
+    trade_df = pd.DataFrame({
+        'year': rng.choice(np.array(YEARS), rows),
+        'month': np.zeros(rows, dtype=np.int8),
+        'reporterCode': np.full(rows, 246),
+        'flow': np.where(rng.random(rows) < 0.5, 'E', 'I').astype(object),
+        'partnerCode': partner + 1,
+        'commodityCode': 100 + rng.integers(0, COMMODITIES, rows),
+        'value': rng.lognormal(12, 2, rows),
+        'partnerName': names[partner],
+        'world_part': regions[partner],
+    })
+    countries_df = pd.DataFrame({'id': np.arange(1, PARTNERS + 1), 'text': names})
+    commodities_df = pd.DataFrame({'id': np.arange(100, 100 + COMMODITIES),
+                                   'text': [f"Товар {code}" for code in range(COMMODITIES)]})
+    return TradeData(trade_df=trade_df, countries_df=countries_df, commodities_df=commodities_df,
+                     aggregates=build_aggregates(trade_df), version=f'synthetic-{rows}')
+
+
+def measure_load(path):
+    """Лучшее время загрузки снимка в мс из REPEATS попыток"""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        data = load_snapshot(path)
+        best = min(best, (time.perf_counter() - start) * 1000)
+        del data
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время теплого старта из снимка в зависимости от числа строк")
+    parser.add_argument('--rows', type=int, nargs='+', default=[20_000, 200_000, 2_000_000])
+    args = parser.parse_args()
+
+    timings = []
+    with tempfile.TemporaryDirectory() as directory:
+        for rows in sorted(args.rows):
+            path = os.path.join(directory, f'{rows}.snap')
+            save_snapshot(synthetic_data(rows), path, stats={})
+            elapsed = measure_load(path)
+            timings.append((rows, elapsed))
+            print(f"{rows:>12,} строк  {os.path.getsize(path) / 2**20:>9.1f} МБ  загрузка {elapsed:>8.1f} мс")
+
+    (smallest_rows, smallest), (largest_rows, largest) = timings[0], timings[-1]
+    if largest > smallest * TOLERANCE + SLACK_MS:
+        print(f"❌ Теплый старт растет с данными: {smallest:.1f} мс на {smallest_rows:,} строк, "
+              f"{largest:.1f} мс на {largest_rows:,} строк")
+        sys.exit(1)
+    print(f"✅ Теплый старт не зависит от размера данных: строк в {largest_rows / smallest_rows:.0f} раз больше, "
+          f"время {smallest:.1f} -> {largest:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
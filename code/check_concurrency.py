@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка потокобезопасности callback'ов перед запуском под gthread/gevent.
+
+Все callback'и дашборда вызываются из многих потоков одновременно с разными входами.
+Проверяется, что:
+    - результат каждого вызова совпадает с последовательным вызовом тех же входов;
+    - данные снимка (таблицы и агрегаты) после нагрузки не изменились;
+    - ленивые индексы (справочник товаров, разреженные матрицы, рост) построены один раз.
+Код возврата 1, если что-то не так.
+
+Пример:
+    python code/check_concurrency.py --threads 16 --rounds 20
+"""
+
+import argparse
+import dataclasses
+import hashlib
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Проверяем сами callback'и в этом процессе: без фоновых задач и общего кэша
+os.environ.setdefault('DASHBOARD_BACKGROUND_LOAD', '0')
+os.environ['DASHBOARD_BACKGROUND_CALLBACKS'] = '0'
+os.environ['DASHBOARD_RESULT_CACHE'] = '0'
+
+import pandas as pd
+from plotly.io.json import to_json_plotly
+
+import dashboard
+
+LAZY_PROPERTIES = ('commodities', 'partner_commodity', 'growth', 'search', 'tables', 'mirror')
+
+
+def callback_cases(years, search, mirror_partners):
+    """Пары (callback, входы), покрывающие все callback'и дашборда"""
+    last_year = years[-1] if years else None
+    cases = [
+        (dashboard.update_kpi, ('/',)),
+        (dashboard.update_sector_structure, ('/',)),
+        (dashboard.update_top_partners, ('/',)),
+        (dashboard.update_structure_changes, ('/',)),
+    ]
+    for resolution in ('year', 'month'):
+        cases.append((dashboard.update_yearly_trend, ('/', resolution)))
+        cases.append((dashboard.update_russia_analysis, ('/', resolution)))
+    # Узкое окно и увеличенный участок графика
+    cases.append((dashboard.update_yearly_trend, ('/', 'year', {'xaxis.range[0]': 2005, 'xaxis.range[1]': 2012}, 400)))
+    for flow in ('E', 'I'):
+        cases.append((dashboard.update_top_commodities, (flow,)))
+        cases.append((dashboard.update_partner_commodity_heatmap, (last_year, flow, 20)))
+    for flow in ('all', 'E', 'I'):
+        cases.append((dashboard.update_region_chart, (flow,)))
+        cases.append((dashboard.update_geography_map, (None, flow)))
+    for kind in ('partners', 'commodities'):
+        for metric in ('cagr', 'yoy', 'volatility'):
+            cases.append((dashboard.update_growth, (kind, 'all', metric, 'top', None)))
+    for query in ('гер', 'DEU', '85'):
+        cases.append((dashboard.search_drilldown, (query, None)))
+        for item in search.search(query, limit=1):
+            cases.append((dashboard.update_drilldown_trend, (f"{item['kind']}:{item['code']}",)))
+    for kind in ('partners', 'commodities'):
+        for sort_by in ([], [{'column_id': 'name', 'direction': 'asc'}],
+                        [{'column_id': 'balance', 'direction': 'desc'}, {'column_id': 'total', 'direction': 'asc'}]):
+            for page in (0, 3):
+                cases.append((dashboard.update_data_table, (kind, page, 20, sort_by)))
+    for partner in list(mirror_partners)[:2] or [None]:
+        for flow in ('E', 'I'):
+            cases.append((dashboard.update_mirror, (partner, last_year, flow)))
+    return cases
+
+
+def fingerprint(data):
+    """Хэш содержимого таблиц и агрегатов снимка"""
+    digest = hashlib.sha256()
+    frames = [data.trade_df, data.countries_df, data.commodities_df]
+    frames += [data.aggregates[name] for name in sorted(data.aggregates)]
+    for value in frames:
+        if isinstance(value, (pd.DataFrame, pd.Series)):
+            digest.update(pd.util.hash_pandas_object(value, index=True).to_numpy().tobytes())
+            columns = value.columns if isinstance(value, pd.DataFrame) else [value.name]
+            digest.update(repr(list(columns)).encode('utf-8'))
+        else:
+            digest.update(repr(value).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def check_lazy_properties(data, threads):
+    """Ленивые индексы свежей копии снимка, запрошенные всеми потоками сразу"""
+    fresh = dataclasses.replace(data)
+    barrier = threading.Barrier(threads)
+
+    def build(name):
+        barrier.wait()
+        return id(getattr(fresh, name))
+
+    rebuilt = []
+    for name in LAZY_PROPERTIES:
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            if len(set(pool.map(build, [name] * threads))) != 1:
+                rebuilt.append(name)
+    return rebuilt
+
+
+def run(threads, rounds):
+    data = dashboard.store.get()
+    before = fingerprint(data)
+    cases = callback_cases(dashboard.data_years(), data.search, data.mirror.partners)
+
+    # Эталон - последовательные вызовы
+    expected = {index: to_json_plotly(callback(*args)) for index, (callback, args) in enumerate(cases)}
+
+    mismatches = []
+    lock = threading.Lock()
+
+    def call(index):
+        callback, args = cases[index]
+        result = to_json_plotly(callback(*args))
+        if result != expected[index]:
+            with lock:
+                mismatches.append(f"{callback.__name__}{args}")
+
+    jobs = [index for _ in range(rounds) for index in range(len(cases))]
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        # list() пробрасывает исключения из потоков
+        list(pool.map(call, jobs))
+
+    problems = []
+    if mismatches:
+        problems.append(f"результаты отличаются от последовательных: {sorted(set(mismatches))}")
+    if fingerprint(data) != before:
+        problems.append("данные снимка изменились во время обработки запросов")
+    rebuilt = check_lazy_properties(data, threads)
+    if rebuilt:
+        problems.append(f"ленивые индексы построены повторно: {rebuilt}")
+
+    print(f"Вызовов: {len(jobs)} в {threads} потоках, callback'ов: {len(cases)}")
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print("✅ Callback'и потокобезопасны: результаты совпадают, данные не изменились")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Параллельный вызов всех callback'ов дашборда")
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=10, help="сколько раз вызвать каждый callback")
+    args = parser.parse_args()
+    sys.exit(0 if run(args.threads, args.rounds) else 1)
+
+
+if __name__ == "__main__":
+    main()
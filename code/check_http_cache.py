@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка ETag/304 для JSON с данными, которые раздаются по GET.
+
+Для каждого файла из STATIC_DATA_FILES делает GET, повторяет его с полученным
+ETag в If-None-Match, как это делает браузер, и ожидает ответ 304.
+Код возврата 1, если какой-то файл не получил ETag или 304.
+
+Пример:
+    python code/check_http_cache.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Фоновые задачи и общий кэш не нужны: проверяется только HTTP-слой
+os.environ.setdefault('DASHBOARD_BACKGROUND_LOAD', '0')
+os.environ['DASHBOARD_BACKGROUND_CALLBACKS'] = '0'
+os.environ['DASHBOARD_RESULT_CACHE'] = '0'
+
+import dashboard
+
+
+def run():
+    client = dashboard.server.test_client()
+    problems = []
+    for url, path in dashboard.STATIC_DATA_FILES.items():
+        if not os.path.isfile(path):
+            print(f"⏭️ {url}: файла {path} нет")
+            continue
+        first = client.get(url)
+        etag = first.headers.get('ETag')
+        if first.status_code != 200 or not etag:
+            problems.append(f"{url}: нет ETag (статус {first.status_code})")
+            continue
+        second = client.get(url, headers={'If-None-Match': etag})
+        if second.status_code != 304:
+            problems.append(f"{url}: повторный запрос вернул {second.status_code}, а не 304")
+        else:
+            print(f"✅ {url}: 304 по ETag {etag}")
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    return not problems
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
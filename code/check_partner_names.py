@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Проверка названий партнеров: load_data против прежнего разрешения через словарь и Series.map.
+
+Эталон повторяет исходную подготовку: название из countries.csv по коду, 'Прочие регионы'
+для неизвестных кодов, фильтр 'Неизвестно', затем замены 842 -> США и 579 -> Норвегия.
+Отличие одно: повторная строка заголовка в countries.csv отбрасывается, и коды
+сравниваются как числа. Код возврата 1, если строки или названия не совпадают.
+
+Пример:
+    python code/check_partner_names.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from data_store import load_data
+
+
+def baseline_names(trade, countries):
+    """partnerName по исходному алгоритму: map по словарю, fillna, фильтр, замены"""
+    countries = countries.assign(id=pd.to_numeric(countries['id'], errors='coerce')).dropna(subset=['id'])
+    country_mapping = dict(zip(countries['id'].astype(int), countries['text']))
+
+    names = trade['partnerCode'].map(country_mapping).fillna('Прочие регионы')
+    names = names[names != 'Неизвестно']
+    codes = trade['partnerCode'].loc[names.index]
+    names = names.where(codes != 842, 'США')
+    names = names.where(codes != 579, 'Норвегия')
+    return names
+
+
+def run():
+    trade_df, countries_df, _ = load_data()
+    expected = baseline_names(pd.read_csv('trade.csv'), pd.read_csv('countries.csv'))
+
+    problems = []
+    if not trade_df.index.equals(expected.index):
+        problems.append(f"разные строки: {len(trade_df)} против {len(expected)} в эталоне")
+    else:
+        actual = trade_df['partnerName'].astype(str).to_numpy()
+        differs = actual != expected.astype(str).to_numpy()
+        if differs.any():
+            pairs = pd.DataFrame({'partnerCode': trade_df['partnerCode'].to_numpy()[differs],
+                                  'baseline': expected.to_numpy()[differs], 'actual': actual[differs]})
+            problems.append(f"названия отличаются в {differs.sum()} строках:\n"
+                            f"{pairs.drop_duplicates().head(20).to_string(index=False)}")
+
+    for problem in problems:
+        print(f"❌ {problem}")
+    if not problems:
+        print(f"✅ Названия партнеров совпадают с эталоном: {len(trade_df)} строк, "
+              f"{trade_df['partnerName'].nunique()} партнеров")
+    return not problems
+
+
+if __name__ == "__main__":
+    sys.exit(0 if run() else 1)
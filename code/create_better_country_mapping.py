@@ -4,18 +4,21 @@
 Создаем улучшенный мапинг стран с использованием стандартных ISO кодов
 """
 
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 
-def create_comprehensive_country_mapping():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lookups import mapping_lookup
+
+def create_comprehensive_country_mapping(trade_data):
     """Создаем полный мапинг стран"""
     
     print("=== СОЗДАНИЕ УЛУЧШЕННОГО МАПИНГА СТРАН ===")
     
-    # Загружаем данные
-    trade_data = pd.read_csv('/workspace/data/final_trade_data.csv')
-    countries_original = pd.read_csv('/workspace/user_input_files/countries.csv')
-    
     # Получаем все уникальные коды стран из торговых данных
     unique_partner_codes = sorted(trade_data['partnerCode'].unique())
     print(f"Всего уникальных кодов стран в торговых данных: {len(unique_partner_codes)}")
@@ -124,9 +127,6 @@ def create_comprehensive_country_mapping():
     # Создаем DataFrame
     mapping_df = pd.DataFrame(final_mapping)
     
-    # Сохраняем
-    mapping_df.to_csv('/workspace/data/country_mapping_enhanced.csv', index=False)
-    
     print(f"Создан улучшенный мапинг: {len(mapping_df)} стран")
     print("\nРаспределение по регионам:")
     region_counts = mapping_df['world_part'].value_counts()
@@ -137,32 +137,21 @@ def create_comprehensive_country_mapping():
     
     return mapping_df
 
-def create_final_dataset_with_fixed_countries():
+def create_final_dataset_with_fixed_countries(trade_data, enhanced_mapping):
     """Создаем финальный датасет с исправленными странами"""
     
     print("\n=== СОЗДАНИЕ ФИНАЛЬНОГО ДАТАСЕТА ===")
     
-    # Загружаем данные
-    trade_data = pd.read_csv('/workspace/data/final_trade_data.csv')
-    enhanced_mapping = pd.read_csv('/workspace/data/country_mapping_enhanced.csv')
-    
     # Удаляем старые колонки стран
     trade_data = trade_data.drop(['country_name', 'world_part'], axis=1, errors='ignore')
     
-    # Присоединяем новый мапинг
-    trade_final = trade_data.merge(
-        enhanced_mapping,
-        on='partnerCode',
-        how='left'
-    )
+    # Присоединяем новый мапинг take по плотному справочнику
+    trade_final = trade_data.assign(**mapping_lookup(enhanced_mapping).resolve(trade_data['partnerCode']))
     
     # Заполняем пропуски
     trade_final['country_name'] = trade_final['country_name'].fillna('Неизвестная страна')
     trade_final['world_part'] = trade_final['world_part'].fillna('Прочие регионы')
     
-    # Сохраняем
-    trade_final.to_csv('/workspace/data/trade_data_fixed.csv', index=False)
-    
     print(f"Финальный датасет: {len(trade_final)} записей")
     print(f"Уникальных стран: {trade_final['country_name'].nunique()}")
     
@@ -177,5 +166,6 @@ def create_final_dataset_with_fixed_countries():
     return trade_final
 
 if __name__ == "__main__":
-    mapping = create_comprehensive_country_mapping()
-    final_data = create_final_dataset_with_fixed_countries()
+    # country_mapping_enhanced.csv и trade_data_fixed.csv строятся стадиями общего конвейера
+    from pipeline import main
+    main(['--only', 'enhanced_mapping', '--only', 'trade_data_fixed'])
@@ -4,18 +4,22 @@
 Более детальное исследование связей в данных и подготовка данных для дашборда
 """
 
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 
-def investigate_country_codes():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lookups import commodity_lookup, country_lookup
+from quality import TradeProfiler
+
+def investigate_country_codes(trade, countries):
     """Исследуем коды стран и их связи"""
     
     print("=== ИССЛЕДОВАНИЕ КОДОВ СТРАН ===")
     
-    # Загружаем данные
-    countries = pd.read_csv('/workspace/user_input_files/countries.csv')
-    trade = pd.read_csv('/workspace/user_input_files/trade.csv')
-    
     print(f"Unique partner codes in trade: {len(trade['partnerCode'].unique())}")
     print(f"Sample partner codes: {sorted(trade['partnerCode'].unique())[:20]}")
     
@@ -46,14 +50,11 @@ def investigate_country_codes():
     
     return trade, countries
 
-def investigate_commodity_codes():
+def investigate_commodity_codes(trade, commodities):
     """Исследуем коды товаров"""
     
     print("\n=== ИССЛЕДОВАНИЕ КОДОВ ТОВАРОВ ===")
     
-    commodities = pd.read_csv('/workspace/user_input_files/commodities.csv')
-    trade = pd.read_csv('/workspace/user_input_files/trade.csv')
-    
     print(f"Commodity codes in trade: {sorted(trade['cmdCode'].unique())[:20]}")
     print(f"Commodity ids: {sorted(commodities['id'].unique())[:20]}")
     
@@ -71,86 +72,56 @@ def investigate_commodity_codes():
     
     return trade, commodities
 
-def analyze_data_completeness():
-    """Анализируем полноту данных"""
+def analyze_data_completeness(trade):
+    """Анализируем полноту данных (все проверки - за один проход профилировщика)"""
     
     print("\n=== АНАЛИЗ ПОЛНОТЫ ДАННЫХ ===")
     
-    trade = pd.read_csv('/workspace/user_input_files/trade.csv')
+    profiler = TradeProfiler()
+    profiler.update(trade)
+    report = profiler.report()
     
-    print(f"Total trade records: {len(trade)}")
-    print(f"Period range: {trade['period'].min()} - {trade['period'].max()}")
-    print(f"Flow codes: {trade['flowCode'].unique()}")
+    print(f"Total trade records: {report['rows']}")
+    years = pd.DataFrame(report['years']).set_index('period')
+    if len(years):
+        print(f"Period range: {years.index.min()} - {years.index.max()}")
+    print(f"Flow codes: {list(report['flows'])}")
     
     # Анализируем по годам
-    yearly_stats = trade.groupby('period').agg({
-        'primaryValue': ['count', 'sum'],
-        'partnerCode': 'nunique',
-        'cmdCode': 'nunique'
-    }).round(2)
-    
     print("\nГодовая статистика:")
-    print(yearly_stats)
+    print(years.round(2))
     
     # Проверяем на нули и отрицательные значения
+    values = report['values']
     print(f"\nЗначения торговли:")
-    print(f"Zero values: {(trade['primaryValue'] == 0).sum()}")
-    print(f"Negative values: {(trade['primaryValue'] < 0).sum()}")
-    print(f"Min value: {trade['primaryValue'].min()}")
-    print(f"Max value: {trade['primaryValue'].max()}")
+    print(f"Zero values: {values['zero']}")
+    print(f"Negative values: {report['rules']['negative_value']}")
+    print(f"Min value: {values['min']}")
+    print(f"Max value: {values['max']}")
     
     return trade
 
-def create_master_dataset():
-    """Создаем основной объединенный датасет"""
-    
-    print("\n=== СОЗДАНИЕ ОСНОВНОГО ДАТАСЕТА ===")
-    
-    # Загружаем данные
-    trade = pd.read_csv('/workspace/user_input_files/trade.csv')
-    countries = pd.read_csv('/workspace/user_input_files/countries.csv')
-    commodities = pd.read_csv('/workspace/user_input_files/commodities.csv')
-    
-    # Проверяем связи снова
-    trade_partners = set(trade['partnerCode'].unique())
-    country_ids = set(countries['id'].unique())
-    common_countries = trade_partners.intersection(country_ids)
-    
-    print(f"Countries that can be linked: {len(common_countries)}")
-    
-    # Объединяем данные
-    # Товары
-    trade_with_commodities = trade.merge(
-        commodities, 
-        left_on='cmdCode', 
-        right_on='id', 
-        how='left',
-        suffixes=('', '_commodity')
-    )
-    
-    print(f"After commodity merge: {len(trade_with_commodities)} records")
-    print(f"Records with commodity info: {trade_with_commodities['text'].notna().sum()}")
-    
-    # Страны - только те, что есть в пересечении
-    if len(common_countries) > 0:
-        trade_full = trade_with_commodities.merge(
-            countries[['id', 'text', 'reporterCodeIsoAlpha3', 'world_part']], 
-            left_on='partnerCode', 
-            right_on='id', 
-            how='left',
-            suffixes=('', '_country')
-        )
-        
-        print(f"After country merge: {len(trade_full)} records")
-        print(f"Records with country info: {trade_full['text_country'].notna().sum()}")
+def enrich_master(trade, countries, commodities, link_countries=True):
+    """Присоединяем к торговым записям товары и (если есть связи) страны"""
+    
+    # Товары - take по плотному справочнику (колонки как после merge по id)
+    trade_full = trade.assign(**commodity_lookup(commodities).resolve(
+        trade['cmdCode'], ['id', 'name', 'sector'], names={'name': 'text'}
+    ))
+    
+    # Страны - только если коды стран связываются со справочником
+    if link_countries:
+        country_codes = country_lookup(countries)
+        slots = country_codes.slots(trade['partnerCode'])
+        trade_full['id_country'] = trade['partnerCode'].where(country_codes.known.take(slots))
+        trade_full['text_country'] = country_codes.take(None, 'name', slots)
+        trade_full['reporterCodeIsoAlpha3'] = country_codes.take(None, 'iso3', slots)
+        trade_full['world_part'] = country_codes.take(None, 'world_part', slots)
     else:
         # Если нет прямых связей, создаем датасет без стран
-        trade_full = trade_with_commodities.copy()
         trade_full['text_country'] = 'Unknown Country'
         trade_full['world_part'] = 'Unknown'
         trade_full['reporterCodeIsoAlpha3'] = None
-        
-        print("No direct country links found. Using placeholder values.")
     
     # Переименовываем колонки для ясности
     trade_full = trade_full.rename(columns={
@@ -169,10 +140,32 @@ def create_master_dataset():
         'M': 'Импорт'
     })
     
-    # Сохраняем
-    trade_full.to_csv('/workspace/data/master_trade_data.csv', index=False)
+    return trade_full
+
+def linkable_countries(partner_codes, countries):
+    """Сколько кодов партнеров есть в справочнике стран (id приводятся к числам)"""
+    partner_codes = pd.unique(np.asarray(partner_codes))
+    return int(country_lookup(countries).contains(partner_codes).sum())
+
+def create_master_dataset(trade, countries, commodities):
+    """Создаем основной объединенный датасет"""
+    
+    print("\n=== СОЗДАНИЕ ОСНОВНОГО ДАТАСЕТА ===")
+    
+    # Проверяем связи снова
+    common_countries = linkable_countries(trade['partnerCode'], countries)
     
-    print(f"\nMaster dataset saved: {len(trade_full)} records")
+    print(f"Countries that can be linked: {common_countries}")
+    
+    trade_full = enrich_master(trade, countries, commodities, link_countries=common_countries > 0)
+    
+    print(f"Records with commodity info: {trade_full['commodity_name'].notna().sum()}")
+    if common_countries > 0:
+        print(f"Records with country info: {trade_full['country_name'].notna().sum()}")
+    else:
+        print("No direct country links found. Using placeholder values.")
+    
+    print(f"\nMaster dataset: {len(trade_full)} records")
     print("Columns:", trade_full.columns.tolist())
     
     # Базовая статистика
@@ -185,15 +178,6 @@ def create_master_dataset():
     return trade_full
 
 if __name__ == "__main__":
-    # Создаем папку для данных
-    import os
-    os.makedirs('/workspace/data', exist_ok=True)
-    
-    trade, countries = investigate_country_codes()
-    trade, commodities = investigate_commodity_codes()
-    trade = analyze_data_completeness()
-    
-    master_data = create_master_dataset()
-    
-    print("\n=== ИССЛЕДОВАНИЕ ЗАВЕРШЕНО ===")
-    print("Master dataset создан: /workspace/data/master_trade_data.csv")
+    # Исследование и master_trade_data.csv строятся стадиями общего конвейера
+    from pipeline import main
+    main(['--only', 'master_dataset', '--reports'])
@@ -4,18 +4,21 @@
 Создание правильной связки между кодами стран в trade.csv и countries.csv
 """
 
+import os
+import sys
+
 import pandas as pd
 import numpy as np
 
-def create_country_mapping():
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lookups import commodity_lookup, mapping_lookup
+
+def create_country_mapping(trade, countries):
     """Создаем мапинг кодов стран"""
     
     print("=== СОЗДАНИЕ МАПИНГА СТРАН ===")
     
-    # Загружаем данные
-    trade = pd.read_csv('/workspace/user_input_files/trade.csv')
-    countries = pd.read_csv('/workspace/user_input_files/countries.csv')
-    
     # Получаем уникальные коды партнеров из торговых данных
     unique_partners = sorted(trade['partnerCode'].unique())
     print(f"Unique partner codes: {len(unique_partners)}")
@@ -115,49 +118,22 @@ def create_country_mapping():
         for code, name in country_mapping.items()
     ])
     
-    # Сохраняем мапинг
-    mapping_df.to_csv('/workspace/data/country_mapping.csv', index=False)
-    
     return mapping_df
 
-def create_final_dataset():
-    """Создаем финальный датасет с правильными связями"""
-    
-    print("\n=== СОЗДАНИЕ ФИНАЛЬНОГО ДАТАСЕТА ===")
-    
-    # Загружаем данные
-    trade = pd.read_csv('/workspace/user_input_files/trade.csv')
-    commodities = pd.read_csv('/workspace/user_input_files/commodities.csv')
-    
-    # Создаем или загружаем мапинг стран
-    try:
-        country_mapping = pd.read_csv('/workspace/data/country_mapping.csv')
-    except:
-        country_mapping = create_country_mapping()
-    
-    # Объединяем все данные
-    # Сначала товары
-    trade_with_commodities = trade.merge(
-        commodities, 
-        left_on='cmdCode', 
-        right_on='id', 
-        how='left',
-        suffixes=('', '_commodity')
+def enrich_trade(trade, commodities, country_mapping):
+    """Присоединяем к торговым записям товары и страны и оставляем нужные колонки"""
+    
+    # Товары и страны - векторизованный take по плотным справочникам вместо merge
+    trade_full = trade.assign(
+        **commodity_lookup(commodities).resolve(
+            trade['cmdCode'], ['name', 'sector'],
+            names={'name': 'commodity_name', 'sector': 'commodity_sector'}
+        ),
+        **mapping_lookup(country_mapping).resolve(trade['partnerCode'])
     )
     
-    # Потом страны
-    trade_full = trade_with_commodities.merge(
-        country_mapping,
-        on='partnerCode',
-        how='left'
-    )
-    
-    # Переименовываем и очищаем колонки
-    trade_full = trade_full.rename(columns={
-        'text': 'commodity_name',
-        'sector': 'commodity_sector',
-        'primaryValue': 'trade_value_usd'
-    })
+    # Переименовываем колонки
+    trade_full = trade_full.rename(columns={'primaryValue': 'trade_value_usd'})
     
     # Добавляем вычисляемые поля
     trade_full['trade_value_mln_usd'] = trade_full['trade_value_usd'] / 1_000_000
@@ -174,16 +150,20 @@ def create_final_dataset():
         'trade_value_usd', 'trade_value_mln_usd'
     ]
     
-    trade_final = trade_full[columns_to_keep].copy()
+    return trade_full[columns_to_keep].copy()
+
+def create_final_dataset(trade, commodities, country_mapping):
+    """Создаем финальный датасет с правильными связями"""
+    
+    print("\n=== СОЗДАНИЕ ФИНАЛЬНОГО ДАТАСЕТА ===")
+    
+    trade_final = enrich_trade(trade, commodities, country_mapping)
     
     # Проверяем результат
     print(f"Final dataset: {len(trade_final)} records")
     print(f"Countries with names: {trade_final['country_name'].notna().sum()}")
     print(f"Commodities with names: {trade_final['commodity_name'].notna().sum()}")
     
-    # Сохраняем финальный датасет
-    trade_final.to_csv('/workspace/data/final_trade_data.csv', index=False)
-    
     # Статистика
     print(f"\nФинальная статистика:")
     print(f"Годы: {trade_final['period'].min()} - {trade_final['period'].max()}")
@@ -204,17 +184,6 @@ def create_final_dataset():
     return trade_final
 
 if __name__ == "__main__":
-    # Создаем необходимые папки
-    import os
-    os.makedirs('/workspace/data', exist_ok=True)
-    
-    # Создаем мапинг стран
-    country_mapping = create_country_mapping()
-    
-    # Создаем финальный датасет
-    final_data = create_final_dataset()
-    
-    print("\n=== ПОДГОТОВКА ДАННЫХ ЗАВЕРШЕНА ===")
-    print("Файлы созданы:")
-    print("- /workspace/data/country_mapping.csv")
-    print("- /workspace/data/final_trade_data.csv")
+    # country_mapping.csv и final_trade_data.csv строятся стадиями общего конвейера
+    from pipeline import main
+    main(['--only', 'country_mapping', '--only', 'final_dataset'])
@@ -0,0 +1,418 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Нагрузочное тестирование дашборда под разными конфигурациями gunicorn.
+
+Для каждой конфигурации запускает app:server локально и воспроизводит сессию пользователя:
+загрузку страницы (макет, зависимости и первые вызовы всех серверных callback'ов),
+затем работу на вкладках - смену элементов управления с changedPropIds и поиск через /search.
+Фоновые callback'и опрашиваются, как это делает браузер (cacheKey/job каждые interval мс),
+пока не придет результат. Печатает запросы/с, p50/p95/p99 задержки отдельных запросов,
+p95 времени фоновых задач от запуска до результата и пиковую память процессов. Callback'и,
+которые сессия не вызывает (clientside, входы вне макета), перечисляются в отчете.
+
+Переключение вкладки dbc.Tabs к серверу не обращается: содержимое всех вкладок уже
+в макете, поэтому вкладка в сессии - это действия с ее элементами управления.
+
+Пример:
+    python code/load_test.py --clients 8 --duration 20 \\
+        --config workers=1,threads=1,worker_class=sync \\
+        --config workers=2,threads=4,worker_class=gthread
+"""
+
+import argparse
+import http.client
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+DEFAULT_CONFIGS = [
+    'workers=1,threads=1,worker_class=sync',
+    'workers=2,threads=1,worker_class=sync',
+    'workers=4,threads=1,worker_class=sync',
+    'workers=1,threads=4,worker_class=gthread',
+    'workers=2,threads=4,worker_class=gthread',
+]
+
+# Значения входов, которых нет в макете: их выставляет сам браузер
+BROWSER_INPUTS = {('url', 'pathname'): '/'}
+
+# Работа на вкладках после загрузки страницы: (вкладка, новые значения свойств)
+INTERACTIONS = [
+    ("Таблицы", {('data-table', 'page_current'): 1}),
+    ("Таблицы", {('data-table', 'sort_by'): [{'column_id': 'balance', 'direction': 'desc'}]}),
+    ("Рост", {('growth-metric', 'value'): 'yoy'}),
+    ("Партнеры × товары", {('heatmap-flow', 'value'): 'I'}),
+    ("География торговли", {('drilldown-search', 'search_value'): 'гер'}),
+]
+# Запрос поиска: /search и выбор первого найденного в поле поиска
+SEARCH_QUERY = 'гер'
+
+CONFIG_PATTERN = re.compile(r'<script id="_dash-config" type="application/json">(.*?)</script>', re.S)
+
+READY_TIMEOUT = 180
+
+
+def parse_config(text):
+    """'workers=2,threads=4,worker_class=gthread' -> словарь"""
+    config = {'workers': 1, 'threads': 1, 'worker_class': 'sync'}
+    for item in text.split(','):
+        key, value = item.split('=', 1)
+        config[key.strip()] = int(value) if key.strip() in ('workers', 'threads') else value.strip()
+    return config
+
+
+def config_label(config):
+    return f"{config['worker_class']} w={config['workers']} t={config['threads']}"
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(config, port, data_dir):
+    """Запускает gunicorn с заданной конфигурацией"""
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(config['workers']),
+        '--threads', str(config['threads']),
+        '--worker-class', config['worker_class'],
+        '--pythonpath', ROOT,
+        '--chdir', data_dir,
+        '--log-level', 'warning',
+        'app:server',
+    ]
+    # stderr - в файл: непрочитанный PIPE заполняется трассировками, и gunicorn блокируется
+    log = tempfile.TemporaryFile()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=log)
+    process.log = log
+    return process
+
+
+def server_log(process):
+    process.log.seek(0)
+    return process.log.read().decode('utf-8', 'replace')
+
+
+def request(connection, method, path, body=None):
+    """Один запрос; возвращает (статус, тело, задержка в мс)"""
+    headers = {'Content-Type': 'application/json'} if body is not None else {}
+    payload = json.dumps(body).encode('utf-8') if body is not None else None
+    start = time.perf_counter()
+    connection.request(method, path, body=payload, headers=headers)
+    response = connection.getresponse()
+    data = response.read()
+    return response.status, data, (time.perf_counter() - start) * 1000
+
+
+def wait_ready(port, process, timeout=READY_TIMEOUT):
+    """Ждем, пока /readyz не ответит 200"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"gunicorn завершился: {server_log(process)}")
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            status, _, _ = request(connection, 'GET', '/readyz')
+            connection.close()
+            if status == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("Сервер не стал готов вовремя")
+
+
+def layout_values(node, values):
+    """Собираем начальные значения свойств компонентов из JSON макета"""
+    if isinstance(node, list):
+        for child in node:
+            layout_values(child, values)
+    elif isinstance(node, dict):
+        props = node.get('props')
+        if isinstance(props, dict):
+            component_id = props.get('id')
+            if isinstance(component_id, str):
+                for name, value in props.items():
+                    values[(component_id, name)] = value
+                values.setdefault((component_id, None), True)
+            layout_values(props.get('children'), values)
+        else:
+            for value in node.values():
+                layout_values(value, values)
+
+
+def parse_outputs(output):
+    """'..a.children...b.figure..' -> [{'id': 'a', 'property': 'children'}, ...]"""
+    parts = output.strip('.').split('...') if output.startswith('..') else [output]
+    outputs = []
+    for part in parts:
+        component_id, prop = part.rsplit('.', 1)
+        outputs.append({'id': component_id, 'property': prop})
+    return outputs
+
+
+def callback_body(dependency, values, changed=()):
+    """Тело запроса _dash-update-component или None, если входа нет в макете"""
+    inputs = []
+    for item in dependency['inputs']:
+        key = (item['id'], item['property'])
+        if (item['id'], None) not in values and key not in values:
+            return None
+        inputs.append({'id': item['id'], 'property': item['property'], 'value': values.get(key)})
+    outputs = parse_outputs(dependency['output'])
+    body = {
+        'output': dependency['output'],
+        'outputs': outputs if len(outputs) > 1 else outputs[0],
+        'inputs': inputs,
+        'changedPropIds': [f"{component_id}.{prop}" for component_id, prop in changed],
+    }
+    if dependency.get('state'):
+        body['state'] = [
+            {'id': item['id'], 'property': item['property'],
+             'value': values.get((item['id'], item['property']))}
+            for item in dependency['state']
+        ]
+    return body
+
+
+def callback_step(dependency, body):
+    """Шаг сессии: вызов callback'а; для фоновых - с интервалом опроса"""
+    background = dependency.get('background')
+    interval = background.get('interval', 1000) / 1000 if background else None
+    return ('CALLBACK', dependency['output'], body, interval)
+
+
+def build_session(port):
+    """Шаги сессии и пропущенные callback'и: [(output, причина)]"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    _, layout, _ = request(connection, 'GET', '/_dash-layout')
+    _, dependencies, _ = request(connection, 'GET', '/_dash-dependencies')
+    _, found, _ = request(connection, 'GET', f'/search?q={quote(SEARCH_QUERY)}&limit=1')
+    connection.close()
+    dependencies = json.loads(dependencies)
+
+    values = dict(BROWSER_INPUTS)
+    layout_values(json.loads(layout), values)
+
+    # Загрузка страницы: первый вызов каждого серверного callback'а
+    steps = [('GET', '/_dash-layout'), ('GET', '/_dash-dependencies')]
+    skipped = []
+    for dependency in dependencies:
+        if dependency.get('clientside_function'):
+            skipped.append((dependency['output'], "clientside, выполняется в браузере"))
+            continue
+        body = callback_body(dependency, values)
+        if body is None:
+            missing = [f"{item['id']}.{item['property']}" for item in dependency['inputs']
+                       if (item['id'], None) not in values and (item['id'], item['property']) not in values]
+            skipped.append((dependency['output'], f"входов нет в макете: {', '.join(missing)}"))
+            continue
+        steps.append(callback_step(dependency, body))
+
+    # Работа на вкладках: callback'и, зависящие от измененных свойств
+    interactions = list(INTERACTIONS)
+    found = json.loads(found).get('results', [])
+    if found:
+        steps.append(('GET', f'/search?q={quote(SEARCH_QUERY)}'))
+        interactions.append(("География торговли",
+                             {('drilldown-search', 'value'): f"{found[0]['kind']}:{found[0]['code']}"}))
+    for _, changes in interactions:
+        values.update(changes)
+        for dependency in dependencies:
+            inputs = {(item['id'], item['property']) for item in dependency['inputs']}
+            if dependency.get('clientside_function') or not inputs & set(changes):
+                continue
+            body = callback_body(dependency, values, changed=list(inputs & set(changes)))
+            if body is not None:
+                steps.append(callback_step(dependency, body))
+    return steps, skipped
+
+
+def page_end_id(html):
+    """Токен загрузки страницы из _dash-config: Dash привязывает к нему задачи фоновых callback'ов"""
+    match = CONFIG_PATTERN.search(html.decode('utf-8', 'replace'))
+    return json.loads(match.group(1)).get('end_id', '') if match else ''
+
+
+def run_callback(connection, end_id, body, interval, stop, latencies, jobs):
+    """Вызов callback'а; фоновый опрашивается до результата. Возвращает статус"""
+    path = f'/_dash-update-component?endId={quote(end_id)}'
+    status, data, latency = request(connection, 'POST', path, body)
+    latencies.append(latency)
+    if interval is None or status != 200:
+        return status
+    started = time.perf_counter() - latency / 1000
+    answer = json.loads(data)
+    if 'response' in answer or 'cacheKey' not in answer:
+        return status
+
+    # Как браузер: те же входы без значений и подписанные cacheKey/job
+    poll_body = dict(body, inputs=[dict(item, value=None) for item in body['inputs']],
+                     state=[dict(item, value=None) for item in body.get('state', [])])
+    poll_path = f"{path}&cacheKey={quote(answer['cacheKey'])}&job={quote(str(answer['job']))}"
+    while not stop.is_set():
+        time.sleep(interval)
+        status, data, latency = request(connection, 'POST', poll_path, poll_body)
+        latencies.append(latency)
+        if status != 200 or 'response' in json.loads(data):
+            break
+    jobs.append((time.perf_counter() - started) * 1000)
+    return status
+
+
+def process_tree_rss(root_pid):
+    """Суммарная RSS (МБ) процесса gunicorn и его воркеров по /proc"""
+    pids = {root_pid}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        if ppid == root_pid:
+            pids.add(int(entry))
+
+    total_kb = 0
+    for pid in pids:
+        try:
+            with open(f'/proc/{pid}/status') as f:
+                for line in f:
+                    if line.startswith('VmRSS:'):
+                        total_kb += int(line.split()[1])
+        except OSError:
+            continue
+    return total_kb / 1024
+
+
+def client_loop(port, steps, stop, latencies, jobs, errors):
+    """Один клиент: повторяет сессию, пока не выйдет время"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    while not stop.is_set():
+        try:
+            status, html, latency = request(connection, 'GET', '/')
+            latencies.append(latency)
+            end_id = page_end_id(html)
+        except (OSError, http.client.HTTPException):
+            errors.append('/')
+            connection.close()
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+            continue
+        for step in steps:
+            if stop.is_set():
+                break
+            name = step[1]
+            try:
+                if step[0] == 'GET':
+                    status, _, latency = request(connection, 'GET', step[1])
+                    latencies.append(latency)
+                else:
+                    _, _, body, interval = step
+                    status = run_callback(connection, end_id, body, interval, stop, latencies, jobs)
+            except (OSError, http.client.HTTPException, ValueError):
+                errors.append(name)
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                continue
+            if status >= 400:
+                errors.append(name)
+    connection.close()
+
+
+def run_config(config, clients, duration, data_dir):
+    """Прогон одной конфигурации; возвращает строку отчета"""
+    port = free_port()
+    process = start_server(config, port, data_dir)
+    try:
+        wait_ready(port, process)
+        steps, skipped = build_session(port)
+
+        stop = threading.Event()
+        latencies, jobs, errors = [], [], []
+        threads = [
+            threading.Thread(target=client_loop, args=(port, steps, stop, latencies, jobs, errors))
+            for _ in range(clients)
+        ]
+        peak_rss = process_tree_rss(process.pid)
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        while time.perf_counter() - start < duration:
+            time.sleep(0.5)
+            peak_rss = max(peak_rss, process_tree_rss(process.pid))
+        stop.set()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+        process.log.close()
+
+    values = np.array(latencies) if latencies else np.zeros(1)
+    return {
+        'config': config_label(config),
+        'requests': len(latencies),
+        'callbacks': sum(1 for step in steps if step[0] == 'CALLBACK'),
+        'skipped': skipped,
+        'jobs': len(jobs),
+        'job_p95': np.percentile(jobs, 95) if jobs else float('nan'),
+        'rps': len(latencies) / elapsed,
+        'p50': np.percentile(values, 50),
+        'p95': np.percentile(values, 95),
+        'p99': np.percentile(values, 99),
+        'errors': len(errors),
+        'rss_mb': peak_rss,
+    }
+
+
+def print_report(results):
+    print(f"\n{'конфигурация':<28}{'запросы':>9}{'req/s':>9}{'p50, мс':>9}{'p95, мс':>9}"
+          f"{'p99, мс':>9}{'задачи':>8}{'задачи p95':>12}{'ошибки':>8}{'RSS, МБ':>9}")
+    for row in results:
+        print(f"{row['config']:<28}{row['requests']:>9}{row['rps']:>9.1f}{row['p50']:>9.1f}"
+              f"{row['p95']:>9.1f}{row['p99']:>9.1f}{row['jobs']:>8}{row['job_p95']:>12.0f}"
+              f"{row['errors']:>8}{row['rss_mb']:>9.0f}")
+    if results and results[0]['skipped']:
+        print("\nНе вызываются в сессии:")
+        for output, reason in results[0]['skipped']:
+            print(f"    {output}: {reason}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Нагрузочный тест app:server под gunicorn")
+    parser.add_argument('--config', action='append',
+                        help="workers=N,threads=N,worker_class=sync|gthread|gevent (можно несколько)")
+    parser.add_argument('--clients', type=int, default=8, help="параллельных клиентов")
+    parser.add_argument('--duration', type=float, default=20, help="секунд на конфигурацию")
+    parser.add_argument('--data-dir', default=os.getcwd(), help="каталог с trade.csv и справочниками")
+    args = parser.parse_args()
+
+    results = []
+    for text in args.config or DEFAULT_CONFIGS:
+        config = parse_config(text)
+        print(f"=== {config_label(config)}: {args.clients} клиентов, {args.duration:.0f} с ===")
+        result = run_config(config, args.clients, args.duration, args.data_dir)
+        print(f"    {result['callbacks']} вызовов callback'ов за сессию, {result['rps']:.1f} req/s")
+        results.append(result)
+    print_report(results)
+
+
+if __name__ == "__main__":
+    main()
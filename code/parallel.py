@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Параллельная обработка датасета по годам в пуле процессов.
+
+trade.csv заранее разложен по партициям period=YYYY (или period=YYYY/month=MM). Каждая партиция обогащается
+(финальный и основной датасеты) и частично агрегируется в отдельном процессе,
+а частичные агрегаты объединяются в фиксированном порядке партиций,
+поэтому результат не зависит от того, какой процесс закончил первым.
+"""
+
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from data_investigation import enrich_master, linkable_countries
+from fix_country_mapping import enrich_trade
+from streaming import (default_format, list_partitions, normalize_types, partition_path,
+                       read_partition, write_frame)
+
+# Частичные агрегаты: имя -> (ключи группировки, колонка значения)
+AGGREGATES = {
+    'partner_totals': (['period', 'flowCode', 'partnerCode', 'country_name'], 'trade_value_mln_usd'),
+    'commodity_totals': (['period', 'flowCode', 'cmdCode', 'commodity_name'], 'trade_value_mln_usd'),
+}
+
+# Справочники, загруженные в каждом процессе пула один раз
+_lookups = {}
+
+
+def _init_worker(countries_path, commodities_path, country_mapping_path, link_countries):
+    _lookups['countries'] = pd.read_csv(countries_path)
+    _lookups['commodities'] = pd.read_csv(commodities_path)
+    _lookups['country_mapping'] = pd.read_csv(country_mapping_path)
+    _lookups['link_countries'] = link_countries
+
+
+def yearly_stats(final):
+    """Годовая статистика одной партиции (как в analyze_data_completeness)"""
+    return pd.DataFrame({
+        'period': [final['period'].iloc[0]],
+        'records': [len(final)],
+        'trade_value_usd': [final['trade_value_usd'].sum()],
+        'partners': [final['partnerCode'].nunique()],
+        'commodities': [final['cmdCode'].nunique()],
+    })
+
+
+def process_partition(task):
+    """Обогащает одну партицию, пишет результат и возвращает частичные агрегаты"""
+    period, paths, final_dir, master_dir, fmt = task
+    trade = read_partition(paths, value=period)
+
+    final = enrich_trade(trade, _lookups['commodities'], _lookups['country_mapping'])
+    master = enrich_master(trade, _lookups['countries'], _lookups['commodities'],
+                           _lookups['link_countries'])
+
+    for directory, frame in ((final_dir, final), (master_dir, master)):
+        partition_dir = os.path.join(directory, partition_path(period))
+        os.makedirs(partition_dir, exist_ok=True)
+        write_frame(normalize_types(frame), os.path.join(partition_dir, f"part-00000.{fmt}"))
+
+    partials = {
+        name: final.groupby(keys, dropna=False)[value].sum().reset_index()
+        for name, (keys, value) in AGGREGATES.items()
+    }
+    partials['yearly_stats'] = yearly_stats(final)
+    return period, partials
+
+
+def merge_partials(results):
+    """Детерминированное объединение: партиции по порядку, затем группировка с сортировкой"""
+    results = sorted(results, key=lambda item: item[0])
+    merged = {}
+    for name in list(AGGREGATES) + ['yearly_stats']:
+        frame = pd.concat([partials[name] for _, partials in results], ignore_index=True)
+        if name in AGGREGATES:
+            keys, value = AGGREGATES[name]
+            frame = frame.groupby(keys, dropna=False, sort=True)[value].sum().reset_index()
+        merged[name] = frame
+    return merged
+
+
+def _replace_dir(tmp_dir, output_dir):
+    shutil.rmtree(output_dir, ignore_errors=True)
+    os.replace(tmp_dir, output_dir)
+
+
+def parallel_enrich(trade_parts_dir, countries_path, commodities_path, country_mapping_path,
+                    final_dir, master_dir, aggregates_dir, workers=None):
+    """Обогащение и агрегирование всех партиций в пуле процессов"""
+    partitions = list_partitions(trade_parts_dir)
+    fmt = default_format()
+
+    # Связь со справочником стран определяем по всем кодам партнеров сразу, как create_master_dataset
+    countries = pd.read_csv(countries_path)
+    country_mapping = pd.read_csv(country_mapping_path)
+    link_countries = linkable_countries(country_mapping['partnerCode'], countries) > 0
+
+    tmp_dirs = {path: path.rstrip(os.sep) + '.tmp' for path in (final_dir, master_dir, aggregates_dir)}
+    for tmp_dir in tmp_dirs.values():
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+    tasks = [
+        (period, paths, tmp_dirs[final_dir], tmp_dirs[master_dir], fmt)
+        for period, paths in partitions.items()
+    ]
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(
+        max_workers=min(workers, max(len(tasks), 1)),
+        initializer=_init_worker,
+        initargs=(countries_path, commodities_path, country_mapping_path, link_countries)
+    ) as pool:
+        results = list(pool.map(process_partition, tasks))
+
+    merged = merge_partials(results)
+    for name, frame in merged.items():
+        frame.to_csv(os.path.join(tmp_dirs[aggregates_dir], f"{name}.csv"), index=False)
+
+    for path, tmp_dir in tmp_dirs.items():
+        _replace_dir(tmp_dir, path)
+
+    print(f"Обработано партиций: {len(tasks)} в {workers} процессах -> {final_dir}, {master_dir}")
+    return merged
@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Единый ETL-конвейер подготовки данных вместо разрозненных запусков скриптов code/*.py.
+
+Стадии объявлены со входами и выходами. Каждый CSV читается не больше одного раза за прогон,
+а стадия пропускается, если не изменились ни ее входы (по хэшу содержимого), ни код.
+
+Пример:
+    python code/pipeline.py --input-dir . --output-dir data
+    python code/pipeline.py --only trade_data_fixed --reports
+    python code/pipeline.py --stream --chunksize 500000
+    python code/pipeline.py --parallel --workers 8
+"""
+
+import argparse
+import hashlib
+import inspect
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analyze_data_issues
+import create_better_country_mapping
+import data_investigation
+import fix_country_mapping
+import lookups
+import parallel
+import quality
+import regions
+import streaming
+
+# Исходные файлы (лежат во входном каталоге)
+SOURCES = {
+    'trade': 'trade.csv',
+    'countries': 'countries.csv',
+    'commodities': 'commodities.csv',
+}
+
+# Промежуточные и итоговые файлы (пишутся в выходной каталог)
+ARTIFACTS = {
+    'country_mapping': 'country_mapping.csv',
+    'final_trade_data': 'final_trade_data.csv',
+    'master_trade_data': 'master_trade_data.csv',
+    'country_mapping_fixed': 'country_mapping_fixed.csv',
+    'country_mapping_enhanced': 'country_mapping_enhanced.csv',
+    'trade_data_fixed': 'trade_data_fixed.csv',
+    'region_aggregates': 'region_aggregates.json',
+    # Партиционированные каталоги потокового режима
+    'final_trade_parts': 'final_trade_data',
+    'master_trade_parts': 'master_trade_data',
+    # Параллельный режим: исходник по годам и объединенные агрегаты
+    'trade_parts': 'trade_by_period',
+    'trade_aggregates': 'aggregates',
+    # Проверка качества trade.csv: годные строки, отчет и карантин
+    'trade_valid': 'trade_valid.csv',
+    'quality_report': 'quality_report.json',
+    'trade_quarantine': 'trade_quarantine.csv',
+}
+
+CACHE_FILE = '.pipeline_cache.json'
+
+
+@dataclass
+class Stage:
+    """Стадия конвейера: функция от входных таблиц, возвращающая выходную таблицу.
+
+    Потоковые стадии (paths=True) получают пути ко входам и выходам и пишут сами;
+    code - дополнительные модули, изменение которых тоже сбрасывает кэш стадии.
+    """
+    name: str
+    run: object
+    inputs: list
+    outputs: list = field(default_factory=list)
+    report: bool = False
+    paths: bool = False
+    code: list = field(default_factory=list)
+
+
+def investigate_sources(trade, countries, commodities):
+    """Отчет по исходным данным: связи кодов и полнота"""
+    data_investigation.investigate_country_codes(trade, countries)
+    data_investigation.investigate_commodity_codes(trade, commodities)
+    data_investigation.analyze_data_completeness(trade)
+
+
+STAGES = [
+    Stage('country_mapping', fix_country_mapping.create_country_mapping,
+          inputs=['trade', 'countries'], outputs=['country_mapping']),
+    Stage('final_dataset', fix_country_mapping.create_final_dataset,
+          inputs=['trade', 'commodities', 'country_mapping'], outputs=['final_trade_data']),
+    Stage('master_dataset', data_investigation.create_master_dataset,
+          inputs=['trade', 'countries', 'commodities'], outputs=['master_trade_data']),
+    Stage('fixed_mapping', analyze_data_issues.fix_country_mapping,
+          inputs=['country_mapping', 'countries'], outputs=['country_mapping_fixed']),
+    Stage('enhanced_mapping', create_better_country_mapping.create_comprehensive_country_mapping,
+          inputs=['final_trade_data'], outputs=['country_mapping_enhanced']),
+    Stage('trade_data_fixed', create_better_country_mapping.create_final_dataset_with_fixed_countries,
+          inputs=['final_trade_data', 'country_mapping_enhanced'], outputs=['trade_data_fixed']),
+    Stage('region_aggregates', regions.build_region_json,
+          inputs=['trade_data_fixed'], outputs=['region_aggregates'], paths=True),
+    Stage('investigate', investigate_sources,
+          inputs=['trade', 'countries', 'commodities'], report=True),
+    Stage('analyze_issues', analyze_data_issues.analyze_current_issues,
+          inputs=['final_trade_data', 'country_mapping', 'countries'], report=True),
+    Stage('quality', quality.profile_trade,
+          inputs=['trade', 'countries', 'commodities'], report=True),
+]
+
+
+# Потоковый режим: trade.csv читается частями, результат - партиционированные каталоги
+STREAM_STAGES = [
+    Stage('validate_trade', streaming.stream_validate_trade,
+          inputs=['trade', 'countries', 'commodities'],
+          outputs=['trade_valid', 'quality_report', 'trade_quarantine'],
+          paths=True, code=[quality]),
+    Stage('country_mapping', streaming.stream_country_mapping,
+          inputs=['trade_valid', 'countries'], outputs=['country_mapping'],
+          paths=True, code=[fix_country_mapping]),
+    Stage('final_dataset', streaming.stream_final_dataset,
+          inputs=['trade_valid', 'commodities', 'country_mapping'], outputs=['final_trade_parts'],
+          paths=True, code=[fix_country_mapping]),
+    Stage('master_dataset', streaming.stream_master_dataset,
+          inputs=['trade_valid', 'countries', 'commodities'], outputs=['master_trade_parts'],
+          paths=True, code=[data_investigation]),
+    Stage('fixed_mapping', analyze_data_issues.fix_country_mapping,
+          inputs=['country_mapping', 'countries'], outputs=['country_mapping_fixed']),
+]
+
+# Параллельный режим: trade.csv раскладывается по годам, годы обрабатываются в пуле процессов
+PARALLEL_STAGES = [
+    Stage('partition_trade', streaming.stream_partition_trade,
+          inputs=['trade', 'countries', 'commodities'],
+          outputs=['trade_parts', 'quality_report', 'trade_quarantine'],
+          paths=True, code=[quality]),
+    Stage('country_mapping', streaming.stream_country_mapping,
+          inputs=['trade_parts', 'countries'], outputs=['country_mapping'],
+          paths=True, code=[fix_country_mapping]),
+    Stage('final_dataset', parallel.parallel_enrich,
+          inputs=['trade_parts', 'countries', 'commodities', 'country_mapping'],
+          outputs=['final_trade_parts', 'master_trade_parts', 'trade_aggregates'],
+          paths=True, code=[fix_country_mapping, data_investigation, streaming]),
+    STREAM_STAGES[-1],
+]
+
+
+def code_hash(stage):
+    """Хэш исходного кода модуля функции стадии, дополнительных модулей и общих справочников"""
+    digest = hashlib.sha256()
+    for obj in [stage.run, lookups] + stage.code:
+        with open(inspect.getsourcefile(obj), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+class Pipeline:
+    """Прогон стадий с кэшем по содержимому входов и коду"""
+
+    def __init__(self, input_dir='.', output_dir='data', cache_path=None, force=False, stages=STAGES,
+                 chunksize=streaming.CHUNKSIZE, workers=None):
+        self.input_dir = input_dir
+        self.output_dir = output_dir
+        self.cache_path = cache_path or os.path.join(output_dir, CACHE_FILE)
+        self.force = force
+        self.stages = stages
+        self.chunksize = chunksize
+        self.workers = workers
+        self.frames = {}
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.cache_path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {}
+        manifest.setdefault('files', {})
+        manifest.setdefault('stages', {})
+        return manifest
+
+    def _save_manifest(self):
+        os.makedirs(os.path.dirname(self.cache_path) or '.', exist_ok=True)
+        with open(self.cache_path, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+
+    def path(self, name):
+        if name in SOURCES:
+            return os.path.join(self.input_dir, SOURCES[name])
+        return os.path.join(self.output_dir, ARTIFACTS[name])
+
+    def read(self, name):
+        """Читает таблицу один раз за прогон"""
+        if name not in self.frames:
+            self.frames[name] = pd.read_csv(self.path(name))
+        return self.frames[name]
+
+    def write(self, name, frame):
+        os.makedirs(self.output_dir, exist_ok=True)
+        frame.to_csv(self.path(name), index=False)
+        self.frames[name] = frame
+
+    def options(self, stage):
+        """Настройки прогона, которые принимает функция потоковой стадии"""
+        accepted = inspect.signature(stage.run).parameters
+        options = {'chunksize': self.chunksize, 'workers': self.workers}
+        return {name: value for name, value in options.items() if name in accepted}
+
+    def path_hash(self, path):
+        """Хэш файла или каталога (по хэшам всех файлов в нем)"""
+        if not os.path.isdir(path):
+            return self.file_hash(path)
+        digest = hashlib.sha256()
+        for directory, _, files in sorted(os.walk(path)):
+            for name in sorted(files):
+                file_path = os.path.join(directory, name)
+                digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+                digest.update(self.file_hash(file_path).encode('utf-8'))
+        return digest.hexdigest()
+
+    def file_hash(self, path):
+        """Хэш содержимого файла; пересчитывается только при изменении размера или времени"""
+        stat = os.stat(path)
+        key = os.path.abspath(path)
+        cached = self.manifest['files'].get(key)
+        if cached and cached[:2] == [stat.st_size, stat.st_mtime_ns]:
+            return cached[2]
+
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        self.manifest['files'][key] = [stat.st_size, stat.st_mtime_ns, digest.hexdigest()]
+        return digest.hexdigest()
+
+    def stage_key(self, stage):
+        """Ключ кэша стадии: код + содержимое всех входов"""
+        digest = hashlib.sha256(stage.name.encode('utf-8'))
+        digest.update(code_hash(stage).encode('utf-8'))
+        for name in stage.inputs:
+            digest.update(name.encode('utf-8'))
+            digest.update(self.path_hash(self.path(name)).encode('utf-8'))
+        return digest.hexdigest()
+
+    def is_fresh(self, stage, key):
+        if self.force or stage.report:
+            return False
+        if self.manifest['stages'].get(stage.name) != key:
+            return False
+        return all(os.path.exists(self.path(name)) for name in stage.outputs)
+
+    def select(self, targets=None, reports=False):
+        """Стадии для прогона: цели и все стадии, от которых они зависят"""
+        if not targets:
+            return [stage for stage in self.stages if reports or not stage.report]
+
+        producers = {output: stage for stage in self.stages for output in stage.outputs}
+        needed = set()
+        pending = list(targets)
+        if reports:
+            pending.extend(stage.name for stage in self.stages if stage.report)
+        while pending:
+            name = pending.pop()
+            if name in needed:
+                continue
+            needed.add(name)
+            stage = next(stage for stage in self.stages if stage.name == name)
+            pending.extend(producers[item].name for item in stage.inputs if item in producers)
+        return [stage for stage in self.stages if stage.name in needed]
+
+    def run(self, targets=None, reports=False):
+        """Прогоняет выбранные стадии по порядку объявления"""
+        summary = []
+        for stage in self.select(targets, reports):
+            key = self.stage_key(stage)
+            if self.is_fresh(stage, key):
+                summary.append((stage.name, 'кэш', 0.0))
+                continue
+
+            start = time.perf_counter()
+            if stage.paths:
+                os.makedirs(self.output_dir, exist_ok=True)
+                stage.run(*[self.path(name) for name in stage.inputs + stage.outputs],
+                          **self.options(stage))
+                for name in stage.outputs:
+                    self.frames.pop(name, None)
+            else:
+                result = stage.run(*[self.read(name) for name in stage.inputs])
+                if stage.outputs:
+                    self.write(stage.outputs[0], result)
+            if stage.outputs:
+                self.manifest['stages'][stage.name] = key
+                self._save_manifest()
+            summary.append((stage.name, 'выполнена', time.perf_counter() - start))
+
+        print("\n=== КОНВЕЙЕР ===")
+        for name, status, elapsed in summary:
+            print(f"  {name:<20} {status:<10} {elapsed:6.2f} с")
+        return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ETL-конвейер данных дашборда")
+    parser.add_argument('--input-dir', default='.', help="каталог с trade.csv, countries.csv, commodities.csv")
+    parser.add_argument('--output-dir', default='data', help="каталог для промежуточных и итоговых файлов")
+    parser.add_argument('--cache', default=None, help="файл кэша стадий (по умолчанию в выходном каталоге)")
+    parser.add_argument('--only', action='append', help="прогнать только эту стадию и ее зависимости")
+    parser.add_argument('--reports', action='store_true', help="также напечатать аналитические отчеты")
+    parser.add_argument('--force', action='store_true', help="игнорировать кэш")
+    parser.add_argument('--stream', action='store_true',
+                        help="читать trade.csv частями и писать партиционированные каталоги")
+    parser.add_argument('--chunksize', type=int, default=streaming.CHUNKSIZE,
+                        help="строк trade.csv в одной части в потоковом режиме")
+    parser.add_argument('--parallel', action='store_true',
+                        help="обрабатывать годы параллельно в пуле процессов")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="процессов в параллельном режиме (по умолчанию - все ядра)")
+    args = parser.parse_args(argv)
+
+    if args.parallel or args.stream:
+        # Партиции пишутся в Parquet: без pyarrow останавливаемся до первой стадии
+        streaming.default_format()
+    if args.parallel:
+        stages = PARALLEL_STAGES
+    elif args.stream:
+        stages = STREAM_STAGES
+    else:
+        stages = STAGES
+    pipeline = Pipeline(args.input_dir, args.output_dir, args.cache, args.force, stages,
+                        args.chunksize, args.workers)
+    return pipeline.run(args.only, args.reports)
+
+
+if __name__ == "__main__":
+    main()
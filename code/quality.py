@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Профилирование качества торговых данных за один проход по каждой части.
+
+Все проверки (пропуски, нули, отрицательные значения, min/max, статистика по годам,
+коды без справочника) считаются векторно по одной части и накапливаются,
+поэтому для отчета не нужно перечитывать файл. Строки, не прошедшие правила
+отбраковки, отделяются сразу и могут быть отправлены в карантин.
+"""
+
+import json
+import os
+import sys
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lookups import commodity_lookup, country_lookup, to_codes
+
+VALUE_COLUMN = 'primaryValue'
+CODE_COLUMNS = ['period', 'partnerCode', 'cmdCode']
+
+# Правила отбраковки строк: имя -> описание (порядок задает причину в карантине)
+QUARANTINE_RULES = {
+    'missing_key': "пустой или нечисловой ключ (period, flowCode, partnerCode, cmdCode)",
+    'missing_value': "пустое или нечисловое значение primaryValue",
+    'negative_value': "отрицательное значение primaryValue",
+}
+
+# Колонка с причиной отбраковки в файле карантина
+ISSUE_COLUMN = 'quality_issue'
+
+# Сколько самых частых кодов без справочника показывать в отчете
+TOP_UNMAPPED = 20
+
+# Сдвиг для составного ключа (год, код) в одном int64
+_KEY_SHIFT = 32
+
+
+class TradeProfiler:
+    """Накопительный профиль trade.csv: update() на каждую часть, report() в конце"""
+
+    def __init__(self, countries=None, commodities=None):
+        self.countries = country_lookup(countries) if countries is not None else None
+        self.commodities = commodity_lookup(commodities) if commodities is not None else None
+
+        self.rows = 0
+        self.quarantined = 0
+        self.rules = dict.fromkeys(QUARANTINE_RULES, 0)
+        self.zero_values = 0
+        self.total_value = 0.0
+        self.min_value = np.inf
+        self.max_value = -np.inf
+        self.flows = Counter()
+        self.year_records = Counter()
+        self.year_values = Counter()
+        self.year_partners = set()
+        self.year_commodities = set()
+        self.unmapped_partners = Counter()
+        self.unmapped_commodities = Counter()
+
+    def update(self, chunk):
+        """Проверяет часть за один проход; возвращает (годные строки, отбракованные строки)"""
+        period, partner, commodity = (to_codes(chunk[column]) for column in CODE_COLUMNS)
+        value = to_codes(chunk[VALUE_COLUMN])
+        flow = chunk['flowCode']
+
+        failed = {
+            'missing_key': (np.isnan(period) | np.isnan(partner) | np.isnan(commodity)
+                            | flow.isna().to_numpy()),
+            'missing_value': np.isnan(value),
+            'negative_value': value < 0,
+        }
+        rejected = np.zeros(len(chunk), dtype=bool)
+        for name, mask in failed.items():
+            self.rules[name] += int(mask.sum())
+            rejected |= mask
+        valid = ~rejected
+
+        self.rows += len(chunk)
+        self.quarantined += int(rejected.sum())
+        self._profile(period[valid].astype(np.int64), partner[valid].astype(np.int64),
+                      commodity[valid].astype(np.int64), value[valid], flow[valid])
+
+        bad = chunk[rejected]
+        if len(bad):
+            # Причина - первое сработавшее правило
+            reasons = np.select([failed[name][rejected] for name in QUARANTINE_RULES],
+                                list(QUARANTINE_RULES), default='')
+            bad = bad.assign(**{ISSUE_COLUMN: reasons})
+        return _restore_codes(chunk[valid]), bad
+
+    def _profile(self, period, partner, commodity, value, flow):
+        if not len(value):
+            return
+        self.zero_values += int((value == 0).sum())
+        self.total_value += float(value.sum())
+        self.min_value = min(self.min_value, float(value.min()))
+        self.max_value = max(self.max_value, float(value.max()))
+        self.flows.update(flow.value_counts().to_dict())
+
+        years, inverse = np.unique(period, return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(years))
+        sums = np.bincount(inverse, weights=value, minlength=len(years))
+        for year, count, total in zip(years.tolist(), counts.tolist(), sums.tolist()):
+            self.year_records[year] += count
+            self.year_values[year] += total
+
+        # nunique по годам: уникальные пары (год, код) в части, затем объединение
+        self.year_partners.update(np.unique((period << _KEY_SHIFT) | partner).tolist())
+        self.year_commodities.update(np.unique((period << _KEY_SHIFT) | commodity).tolist())
+
+        for lookup, codes, counter in ((self.countries, partner, self.unmapped_partners),
+                                       (self.commodities, commodity, self.unmapped_commodities)):
+            if lookup is None:
+                continue
+            unknown = codes[~lookup.contains(codes)]
+            if len(unknown):
+                found, found_counts = np.unique(unknown, return_counts=True)
+                counter.update(dict(zip(found.tolist(), found_counts.tolist())))
+
+    @staticmethod
+    def _per_year(keys):
+        return Counter(key >> _KEY_SHIFT for key in keys)
+
+    @staticmethod
+    def _unmapped(counter):
+        return {
+            'codes': len(counter),
+            'records': sum(counter.values()),
+            'top': [[code, count] for code, count in counter.most_common(TOP_UNMAPPED)],
+        }
+
+    def report(self):
+        """Отчет в виде словаря, пригодного для JSON"""
+        partners = self._per_year(self.year_partners)
+        commodities = self._per_year(self.year_commodities)
+        has_values = self.rows > self.quarantined
+        report = {
+            'rows': self.rows,
+            'valid_rows': self.rows - self.quarantined,
+            'quarantined_rows': self.quarantined,
+            'rules': dict(self.rules),
+            'values': {
+                'total': self.total_value,
+                'zero': self.zero_values,
+                'min': self.min_value if has_values else None,
+                'max': self.max_value if has_values else None,
+            },
+            'flows': dict(sorted(self.flows.items())),
+            'years': [
+                {
+                    'period': year,
+                    'records': self.year_records[year],
+                    'value': self.year_values[year],
+                    'partners': partners[year],
+                    'commodities': commodities[year],
+                }
+                for year in sorted(self.year_records)
+            ],
+        }
+        if self.countries is not None:
+            report['unmapped_partners'] = self._unmapped(self.unmapped_partners)
+        if self.commodities is not None:
+            report['unmapped_commodities'] = self._unmapped(self.unmapped_commodities)
+        return report
+
+
+def _restore_codes(frame):
+    """Пропуск в части делает колонку кода float - у годных строк возвращаем целые коды"""
+    codes = {
+        column: 'int64' for column in CODE_COLUMNS
+        if column in frame.columns and pd.api.types.is_float_dtype(frame[column])
+    }
+    return frame.astype(codes) if codes else frame
+
+
+def write_report(report, path):
+    """Сохраняет отчет атомарно: читатель не увидит недописанный JSON"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class CsvAppender:
+    """Дописывает части в один CSV через временный файл"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tmp_path = path + '.tmp'
+        self.rows = 0
+        self._header = True
+
+    def __enter__(self):
+        open(self.tmp_path, 'w').close()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            os.remove(self.tmp_path)
+            return False
+        os.replace(self.tmp_path, self.path)
+        return False
+
+    def write(self, frame):
+        if not len(frame) and not self._header:
+            return
+        frame.to_csv(self.tmp_path, mode='a', header=self._header, index=False)
+        self._header = False
+        self.rows += len(frame)
+
+
+def print_report(report):
+    """Краткая сводка профиля в консоль"""
+    print("\n=== ПРОФИЛЬ КАЧЕСТВА ДАННЫХ ===")
+    print(f"Строк: {report['rows']}, годных: {report['valid_rows']}, "
+          f"в карантине: {report['quarantined_rows']}")
+    for name, count in report['rules'].items():
+        if count:
+            print(f"  {name}: {count} ({QUARANTINE_RULES[name]})")
+    values = report['values']
+    print(f"Нулевых значений: {values['zero']}, min: {values['min']}, max: {values['max']}")
+    for key in ('unmapped_partners', 'unmapped_commodities'):
+        if key in report:
+            print(f"{key}: {report[key]['codes']} кодов, {report[key]['records']} записей")
+
+
+def profile_trade(trade, countries, commodities):
+    """Отчет конвейера: профиль trade.csv, уже загруженного в память"""
+    profiler = TradeProfiler(countries, commodities)
+    profiler.update(trade)
+    report = profiler.report()
+    print_report(report)
+    return report
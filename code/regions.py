@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Агрегаты по регионам мира (world_part) для статической версии дашборда.
+
+Регион × страна × год × поток группируется по строкам датасета один раз,
+все остальные срезы (итоги регионов, регион × год × поток, страны региона)
+сворачиваются из этой небольшой таблицы, а не из всех торговых записей.
+Результат - data/region_aggregates.json рядом с trade_data.json.
+"""
+
+import json
+import os
+
+import pandas as pd
+
+# Названия потоков для обоих вариантов кодов (X/M и E/I)
+FLOW_NAMES = {
+    'X': 'Экспорт',
+    'E': 'Экспорт',
+    'M': 'Импорт',
+    'I': 'Импорт',
+}
+
+UNKNOWN_REGION = 'Прочие регионы'
+VALUE_COLUMN = 'trade_value_mln_usd'
+COLUMNS = ['period', 'flowCode', 'country_name', 'world_part', VALUE_COLUMN]
+
+# Сколько стран региона сохранять для раскрытия в статической версии
+TOP_COUNTRIES = 15
+
+
+def region_aggregates(trade):
+    """Срезы по регионам из датасета с колонками period, flowCode, country_name, world_part"""
+    trade = trade.assign(
+        world_part=trade['world_part'].fillna(UNKNOWN_REGION),
+        flow_name=trade['flowCode'].map(FLOW_NAMES),
+    )
+    base = (
+        trade.groupby(['world_part', 'country_name', 'period', 'flow_name'])[VALUE_COLUMN]
+        .sum()
+        .reset_index()
+    )
+
+    region_flow = base.groupby(['world_part', 'flow_name'])[VALUE_COLUMN].sum().reset_index()
+    region_totals = (
+        region_flow.groupby('world_part')[VALUE_COLUMN].sum()
+        .sort_values(ascending=False)
+        .reset_index()
+    )
+    region_year_flow = (
+        base.groupby(['period', 'world_part', 'flow_name'])[VALUE_COLUMN].sum().reset_index()
+    )
+    countries = (
+        base.groupby(['world_part', 'country_name', 'flow_name'])[VALUE_COLUMN].sum().reset_index()
+    )
+    country_totals = countries.groupby(['world_part', 'country_name'])[VALUE_COLUMN].sum()
+    top = (
+        country_totals.sort_values(ascending=False)
+        .groupby(level='world_part', sort=False)
+        .head(TOP_COUNTRIES)
+        .index
+    )
+    region_countries = (
+        countries.set_index(['world_part', 'country_name'])
+        .loc[lambda frame: frame.index.isin(top)]
+        .reset_index()
+    )
+
+    return {
+        'region_totals': region_totals,
+        'region_flow': region_flow,
+        'region_year_flow': region_year_flow,
+        'region_countries': region_countries,
+    }
+
+
+def build_region_json(trade_path, output_path):
+    """Стадия конвейера: region_aggregates.json из trade_data_fixed.csv"""
+    trade = pd.read_csv(trade_path, usecols=COLUMNS)
+    aggregates = region_aggregates(trade)
+    payload = {name: frame.to_dict(orient='records') for name, frame in aggregates.items()}
+
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp_path, output_path)
+
+    print(f"Регионов: {len(aggregates['region_totals'])} -> {output_path}")
+    return payload
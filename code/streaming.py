@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Потоковая обработка trade.csv по частям для файлов, которые не помещаются в память.
+
+Каждая часть обогащается товарами и странами по маленьким справочникам в памяти
+и сразу дописывается в партиционированный каталог period=YYYY/part-NNNNN.parquet
+(месячные периоды Comtrade YYYYMM - в period=YYYY/month=MM/part-NNNNN.parquet),
+поэтому пиковая память зависит от размера части, а не от размера файла.
+Parquet пишется через pyarrow; без него прогон останавливается сразу, а не пишет другой формат.
+Перед обработкой trade.csv проходит проверку качества (quality.py) за тот же один проход.
+"""
+
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from data_investigation import enrich_master, linkable_countries
+from fix_country_mapping import create_country_mapping, enrich_trade
+from quality import CsvAppender, TradeProfiler, print_report, write_report
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:
+    pyarrow = None
+
+CHUNKSIZE = 200_000
+PARTITION_COLUMN = 'period'
+MONTH_PREFIX = 'month='
+
+# Период больше - месяц в формате YYYYMM
+MAX_YEAR = 9999
+
+
+def default_format():
+    """Формат партиций - Parquet; CSV только если его явно передали в PartitionedWriter"""
+    if pyarrow is None:
+        raise RuntimeError("Для партиций Parquet нужен pyarrow: pip install -r requirements.txt")
+    return 'parquet'
+
+
+def iter_trade_chunks(path, chunksize=CHUNKSIZE, usecols=None):
+    """Читает trade.csv частями по chunksize строк; каталог партиций - по одному файлу"""
+    if os.path.isdir(path):
+        return _iter_partition_files(path, usecols)
+    return pd.read_csv(path, chunksize=chunksize, usecols=usecols)
+
+
+def _iter_partition_files(directory, usecols=None):
+    for paths in list_partitions(directory).values():
+        for path in paths:
+            if path.endswith('.parquet'):
+                yield pd.read_parquet(path, columns=usecols)
+            else:
+                yield pd.read_csv(path, usecols=usecols)
+
+
+class PartitionedWriter:
+    """Дописывает части в каталоги по значению колонки партиционирования.
+
+    Пишет во временный каталог и подменяет итоговый только после успешного завершения,
+    чтобы прерванный прогон не оставил половину датасета.
+    """
+
+    def __init__(self, output_dir, partition_column=PARTITION_COLUMN, fmt=None):
+        self.output_dir = output_dir
+        self.partition_column = partition_column
+        self.fmt = fmt or default_format()
+        self.tmp_dir = output_dir.rstrip(os.sep) + '.tmp'
+        self.part = 0
+        self.rows = 0
+
+    def __enter__(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        os.makedirs(self.tmp_dir)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            return False
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+        os.replace(self.tmp_dir, self.output_dir)
+        return False
+
+    def write(self, frame):
+        """Раскладывает часть по партициям и сохраняет каждую отдельным файлом"""
+        frame = normalize_types(frame)
+        for value, partition in frame.groupby(self.partition_column, sort=True):
+            directory = os.path.join(self.tmp_dir, partition_path(value, self.partition_column))
+            os.makedirs(directory, exist_ok=True)
+            write_frame(partition, os.path.join(directory, f"part-{self.part:05d}.{self.fmt}"))
+        self.part += 1
+        self.rows += len(frame)
+
+
+def write_frame(frame, path):
+    """Сохраняет часть в формате, заданном расширением файла"""
+    if path.endswith('.parquet'):
+        frame.to_parquet(path, index=False)
+    else:
+        frame.to_csv(path, index=False)
+
+
+def normalize_types(frame):
+    """Одинаковые типы во всех частях: строковая колонка, пустая в одной части, не станет float"""
+    frame = frame.copy()
+    for column in frame.columns:
+        if not pd.api.types.is_numeric_dtype(frame[column]):
+            frame[column] = frame[column].astype('string')
+    return frame
+
+
+def partition_path(value, partition_column=PARTITION_COLUMN):
+    """Каталог партиции относительно корня: period=YYYY или period=YYYY/month=MM"""
+    if partition_column == PARTITION_COLUMN and isinstance(value, (int, np.integer)) and value > MAX_YEAR:
+        return os.path.join(f"{partition_column}={value // 100}", f"{MONTH_PREFIX}{value % 100:02d}")
+    return f"{partition_column}={value}"
+
+
+def _partition_files(part_dir):
+    return [os.path.join(part_dir, part) for part in sorted(os.listdir(part_dir))]
+
+
+def list_partitions(directory, partition_column=PARTITION_COLUMN):
+    """Значения партиций и их файлы: {2001: [путь, ...], ...}; месяцы - {200101: [...], ...}"""
+    partitions = {}
+    prefix = f"{partition_column}="
+    for name in sorted(os.listdir(directory)):
+        if not name.startswith(prefix):
+            continue
+        value = name[len(prefix):]
+        value = int(value) if value.lstrip('-').isdigit() else value
+        part_dir = os.path.join(directory, name)
+        months = [entry for entry in sorted(os.listdir(part_dir)) if entry.startswith(MONTH_PREFIX)]
+        if months and isinstance(value, int):
+            for month in months:
+                partitions[value * 100 + int(month[len(MONTH_PREFIX):])] = _partition_files(os.path.join(part_dir, month))
+        else:
+            partitions[value] = _partition_files(part_dir)
+    return partitions
+
+
+def read_partition(paths, partition_column=PARTITION_COLUMN, value=None):
+    """Читает все файлы одной партиции в DataFrame"""
+    frames = [
+        pd.read_parquet(path) if path.endswith('.parquet') else pd.read_csv(path)
+        for path in paths
+    ]
+    frame = pd.concat(frames, ignore_index=True)
+    if value is not None and partition_column not in frame.columns:
+        frame[partition_column] = value
+    return frame
+
+
+def unique_partner_codes(trade_path, chunksize=CHUNKSIZE):
+    """Уникальные коды партнеров за один проход только по колонке partnerCode"""
+    codes = set()
+    for chunk in iter_trade_chunks(trade_path, chunksize, usecols=['partnerCode']):
+        codes.update(chunk['partnerCode'].unique().tolist())
+    return sorted(codes)
+
+
+def gate_trade(trade_path, countries_path, commodities_path, writer, report_path, quarantine_path,
+               chunksize=CHUNKSIZE):
+    """Один проход по trade.csv: профиль качества, годные строки в writer, остальные в карантин"""
+    profiler = TradeProfiler(pd.read_csv(countries_path), pd.read_csv(commodities_path))
+    with writer, CsvAppender(quarantine_path) as quarantine:
+        for chunk in iter_trade_chunks(trade_path, chunksize):
+            valid, rejected = profiler.update(chunk)
+            writer.write(valid)
+            quarantine.write(rejected)
+
+    report = profiler.report()
+    write_report(report, report_path)
+    print_report(report)
+    return report
+
+
+def stream_validate_trade(trade_path, countries_path, commodities_path, valid_path, report_path,
+                          quarantine_path, chunksize=CHUNKSIZE):
+    """Проверенный trade.csv одним файлом - вход остальных потоковых стадий"""
+    return gate_trade(trade_path, countries_path, commodities_path, CsvAppender(valid_path),
+                      report_path, quarantine_path, chunksize)
+
+
+def stream_partition_trade(trade_path, countries_path, commodities_path, output_dir, report_path,
+                           quarantine_path, chunksize=CHUNKSIZE):
+    """Проверяет trade.csv и раскладывает годные строки по годам - вход параллельной обработки"""
+    writer = PartitionedWriter(output_dir)
+    report = gate_trade(trade_path, countries_path, commodities_path, writer,
+                        report_path, quarantine_path, chunksize)
+    print(f"Trade: {writer.rows} records, {writer.part} частей -> {output_dir}")
+    return report
+
+
+def stream_country_mapping(trade_path, countries_path, output_path, chunksize=CHUNKSIZE):
+    """country_mapping.csv без загрузки всего trade.csv: нужны только коды партнеров"""
+    partners = pd.DataFrame({'partnerCode': unique_partner_codes(trade_path, chunksize)})
+    countries = pd.read_csv(countries_path)
+    mapping = create_country_mapping(partners, countries)
+    mapping.to_csv(output_path, index=False)
+    return mapping
+
+
+def stream_final_dataset(trade_path, commodities_path, country_mapping_path, output_dir,
+                         chunksize=CHUNKSIZE):
+    """Финальный датасет по частям в партиционированный каталог"""
+    commodities = pd.read_csv(commodities_path)
+    country_mapping = pd.read_csv(country_mapping_path)
+
+    with PartitionedWriter(output_dir) as writer:
+        for chunk in iter_trade_chunks(trade_path, chunksize):
+            writer.write(enrich_trade(chunk, commodities, country_mapping))
+
+    print(f"Final dataset: {writer.rows} records, {writer.part} частей -> {output_dir}")
+    return writer.rows
+
+
+def stream_master_dataset(trade_path, countries_path, commodities_path, output_dir,
+                          chunksize=CHUNKSIZE):
+    """Основной датасет по частям в партиционированный каталог"""
+    countries = pd.read_csv(countries_path)
+    commodities = pd.read_csv(commodities_path)
+
+    # Как и в create_master_dataset, страны присоединяем только если коды связываются
+    link_countries = linkable_countries(unique_partner_codes(trade_path, chunksize), countries) > 0
+
+    with PartitionedWriter(output_dir) as writer:
+        for chunk in iter_trade_chunks(trade_path, chunksize):
+            writer.write(enrich_master(chunk, countries, commodities, link_countries))
+
+    print(f"Master dataset: {writer.rows} records, {writer.part} частей -> {output_dir}")
+    return writer.rows
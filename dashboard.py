@@ -2,46 +2,33 @@
 # -*- coding: utf-8 -*-
 
 import dash
-from dash import dcc, html, Input, Output, callback
-import plotly.express as px
-import plotly.graph_objects as go
+from dash import dcc, html, dash_table, Input, Output, State, callback
+from dash.dash_table.Format import Format, Scheme
+from dash.exceptions import PreventUpdate
+from flask import jsonify
 import pandas as pd
 import numpy as np
 from dash_bootstrap_components import themes
 import dash_bootstrap_components as dbc
 
-# Загрузка данных
-def load_data():
-    # Загружаем основные данные
-    trade_df = pd.read_csv('trade.csv')
-    countries_df = pd.read_csv('countries.csv')
-    commodities_df = pd.read_csv('commodities.csv')
-    
-    # Переименовываем колонки для удобства
-    trade_df = trade_df.rename(columns={
-        'period': 'year',
-        'reporterCode': 'reporterCode',
-        'flowCode': 'flow',
-        'partnerCode': 'partnerCode',
-        'cmdCode': 'commodityCode',
-        'primaryValue': 'value'
-    })
-    
-    # Создаем маппинг стран
-    country_mapping = dict(zip(countries_df['id'], countries_df['text']))
-    
-    # Обрабатываем данные
-    trade_df['partnerName'] = trade_df['partnerCode'].map(country_mapping)
-    trade_df['partnerName'] = trade_df['partnerName'].fillna('Прочие регионы')
-    
-    # Убираем категорию "Неизвестно"
-    trade_df = trade_df[trade_df['partnerName'] != 'Неизвестно']
-    
-    # Заменяем коды стран на названия
-    trade_df.loc[trade_df['partnerCode'] == 842, 'partnerName'] = 'США'
-    trade_df.loc[trade_df['partnerCode'] == 579, 'partnerName'] = 'Норвегия'
-    
-    return trade_df, countries_df, commodities_df
+from background import background_callback, create_manager
+from data_store import DataStore, background_load_enabled
+from export import install_export
+import figures
+from growth import METRICS as GROWTH_METRICS
+from http_cache import install_http_cache
+from memory_cache import registry as cache_registry
+from paged_tables import COLUMNS as TABLE_COLUMNS, DEFAULT_PAGE_SIZE, KINDS as TABLE_KINDS, TEXT_COLUMNS
+from profiler import install_profiler
+from result_cache import create_result_cache, shared_result
+from search_index import KINDS as SEARCH_KINDS, install_search
+from snapshot import load_or_prepare
+from serialization import COMPRESS, compact_figure, install as install_serialization
+
+STATIC_DATA_FILES = {
+    '/data/trade_data.json': 'data/trade_data.json',
+    '/data/region_aggregates.json': 'data/region_aggregates.json',
+}
 
 # Функция форматирования чисел
 def format_number(value):
@@ -71,137 +58,486 @@ def format_tooltip(value):
     else:
         return f"{value:.0f} млн USD"
 
-# Загружаем данные
-trade_df, countries_df, commodities_df = load_data()
+# Загружаем данные: в фоне, чтобы сервер сразу отвечал на запросы,
+# и из снимка, если исходники и код подготовки не менялись
+store = DataStore(loader=load_or_prepare)
+if background_load_enabled():
+    store.start_background()
+else:
+    store.load()
 
 # Создаем Dash приложение
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.SANDSTONE, "/assets/custom.css"])
+# Сжатие ответов - встроенный в Dash flask-compress (DASHBOARD_COMPRESS=1)
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.SANDSTONE, "/assets/custom.css"], compress=COMPRESS)
 server = app.server
 
+# Быстрая сериализация ответов (DASHBOARD_FAST_JSON=1)
+install_serialization(app)
+
+def store_version():
+    return store.version
+
+# Тяжелые callback'и выполняются в отдельных процессах, результаты - в diskcache по версии данных
+background_manager = create_manager(store_version)
+
+# Результаты остальных callback'ов общие для всех воркеров: после рестарта фигуру считает один из них
+result_cache = create_result_cache()
+
+# JSON с данными - по GET с ETag и ответами 304
+install_http_cache(server, STATIC_DATA_FILES)
+install_export(server, store)
+install_search(server, store)
+
+# Выборочное профилирование медленных callback'ов (DASHBOARD_PROFILE=1)
+install_profiler(server)
+
+# Проверки живости и готовности для балансировщика
+@server.route('/healthz')
+def healthz():
+    return jsonify(status='ok')
+
+@server.route('/readyz')
+def readyz():
+    if store.ready:
+        return jsonify(status='ready', version=store.version)
+    if store.error:
+        return jsonify(status='error', error=store.error), 503
+    return jsonify(status='loading'), 503
+
+# Память кэшей воркера: занято байт, попадания и вытеснения по каждому кэшу
+@server.route('/cachez')
+def cachez():
+    return jsonify(cache_registry.stats())
+
+# Легкий макет, который показывается, пока данные загружаются
+def loading_layout():
+    return [
+        html.Div([
+            dbc.Spinner(color="primary"),
+            html.H4("Загрузка данных...", className="mt-3")
+        ], id="loading-message", className="text-center mt-5"),
+        dcc.Interval(id='loading-poll', interval=1000)
+    ]
+
 # Макет приложения
-app.layout = dbc.Container([
-    dcc.Location(id='url', refresh=False),
-    # Заголовок
-    dbc.Row([
-        dbc.Col([
-            html.H1("🇫🇮 Дашборд внешней торговли Финляндии", 
-                   className="text-center mb-4"),
-            html.Hr()
-        ])
-    ]),
+def build_layout():
+    return dbc.Container([
+        dcc.Location(id='url', refresh=False),
+        # Ширина окна браузера: по ней прореживаются длинные ряды
+        dcc.Store(id='viewport-width'),
+        # Заголовок
+        dbc.Row([
+            dbc.Col([
+                html.H1("🇫🇮 Дашборд внешней торговли Финляндии", 
+                       className="text-center mb-4"),
+                html.Hr()
+            ])
+        ]),
     
-    # KPI карточки
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Общий товарооборот", className="card-title"),
-                    html.H2(id="total-trade", className="text-primary")
+        # KPI карточки
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Общий товарооборот", className="card-title"),
+                        html.H2(id="total-trade", className="text-primary")
+                    ])
                 ])
-            ])
-        ], width=3),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Торговое сальдо 2023", className="card-title"),
-                    html.H2(id="trade-balance", className="text-success")
+            ], width=3),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Торговое сальдо 2023", className="card-title"),
+                        html.H2(id="trade-balance", className="text-success")
+                    ])
                 ])
-            ])
-        ], width=3),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Топ партнер", className="card-title"),
-                    html.H2(id="top-partner", className="text-info")
+            ], width=3),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Топ партнер", className="card-title"),
+                        html.H2(id="top-partner", className="text-info")
+                    ])
                 ])
-            ])
-        ], width=3),
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H4("Период", className="card-title"),
-                    html.H2("2000-2023", className="text-warning")
+            ], width=3),
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H4("Период", className="card-title"),
+                        html.H2("2000-2023", className="text-warning")
+                    ])
                 ])
-            ])
-        ], width=3)
-    ], className="mb-4"),
-    
-    # Вкладки
-    dbc.Tabs([
-        # Вкладка 1: Динамика по годам
-        dbc.Tab([
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="yearly-trend")
+            ], width=3)
+        ], className="mb-4"),
+    
+        # Вкладки
+        dbc.Tabs([
+            # Вкладка 1: Динамика по годам
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        resolution_selector("yearly-resolution"),
+                        dcc.Graph(id="yearly-trend")
+                    ])
                 ])
-            ])
-        ], label="Динамика по годам"),
+            ], label="Динамика по годам"),
         
-        # Вкладка 2: ТОП-10 товарных групп
-        dbc.Tab([
-            dbc.Row([
-                dbc.Col([
-                    dcc.RadioItems(
-                        id="commodity-type",
-                        options=[
-                            {"label": "Экспорт", "value": "E"},
-                            {"label": "Импорт", "value": "I"}
-                        ],
-                        value="E",
-                        inline=True,
-                        className="mb-3"
-                    ),
-                    dcc.Graph(id="top-commodities")
+            # Вкладка 2: ТОП-10 товарных групп
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        dcc.RadioItems(
+                            id="commodity-type",
+                            options=[
+                                {"label": "Экспорт", "value": "E"},
+                                {"label": "Импорт", "value": "I"}
+                            ],
+                            value="E",
+                            inline=True,
+                            className="mb-3"
+                        ),
+                        dcc.Graph(id="top-commodities")
+                    ])
                 ])
-            ])
-        ], label="ТОП-10 товарных групп"),
+            ], label="ТОП-10 товарных групп"),
         
-        # Вкладка 3: Структура по секторам
-        dbc.Tab([
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="sector-structure")
+            # Вкладка 3: Структура по секторам
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(id="sector-structure")
+                    ])
                 ])
-            ])
-        ], label="Структура по секторам"),
+            ], label="Структура по секторам"),
         
-        # Вкладка 4: География торговли
-        dbc.Tab([
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="geography-map")
+            # Вкладка 4: География торговли
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        dcc.RadioItems(
+                            id="region-flow",
+                            options=[
+                                {"label": "Товарооборот", "value": "all"},
+                                {"label": "Экспорт", "value": "E"},
+                                {"label": "Импорт", "value": "I"}
+                            ],
+                            value="all",
+                            inline=True,
+                            className="mb-3"
+                        )
+                    ], width=6),
+                    dbc.Col([
+                        dcc.Dropdown(
+                            id="geography-region",
+                            placeholder="Все регионы (нажмите на регион для раскрытия)",
+                            clearable=True,
+                            className="mb-3"
+                        )
+                    ], width=6)
+                ]),
+                dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(id="region-chart")
+                    ], width=5),
+                    dbc.Col([
+                        dcc.Graph(id="geography-map")
+                    ], width=7)
+                ]),
+                dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(id="region-trend")
+                    ])
+                ]),
+                dbc.Row([
+                    dbc.Col([
+                        dcc.Dropdown(
+                            id="drilldown-search",
+                            placeholder="Партнер или товарная группа: название, код, ISO3",
+                            options=[],
+                            search_order="original",
+                            className="mb-3"
+                        )
+                    ], width=6)
+                ]),
+                dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(id="drilldown-trend")
+                    ])
                 ])
-            ])
-        ], label="География торговли"),
+            ], label="География торговли"),
         
-        # Вкладка 5: ТОП-10 стран-партнеров
-        dbc.Tab([
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="top-partners")
+            # Вкладка 5: ТОП-10 стран-партнеров
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        dcc.Graph(id="top-partners")
+                    ])
                 ])
-            ])
-        ], label="ТОП-10 стран-партнеров"),
+            ], label="ТОП-10 стран-партнеров"),
         
-        # Вкладка 6: Российская Федерация
-        dbc.Tab([
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="russia-analysis")
+            # Вкладка 6: Российская Федерация
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        resolution_selector("russia-resolution"),
+                        dcc.Graph(id="russia-analysis")
+                    ])
                 ])
-            ])
-        ], label="Российская Федерация"),
+            ], label="Российская Федерация"),
         
-        # Вкладка 7: Изменения структуры
-        dbc.Tab([
-            dbc.Row([
-                dbc.Col([
-                    dcc.Graph(id="structure-changes")
+            # Вкладка 7: Изменения структуры
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        html.Progress(id="structure-progress", style={"visibility": "hidden"}, className="w-100"),
+                        dcc.Graph(id="structure-changes")
+                    ])
                 ])
-            ])
-        ], label="Изменения структуры")
+            ], label="Изменения структуры"),
+        
+            # Вкладка 8: Партнеры × товары
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        dcc.Dropdown(
+                            id="heatmap-year",
+                            options=[{"label": str(year), "value": year} for year in data_years()],
+                            value=(data_years() or [None])[-1],
+                            clearable=False,
+                            className="mb-3"
+                        )
+                    ], width=3),
+                    dbc.Col([
+                        dcc.RadioItems(
+                            id="heatmap-flow",
+                            options=[
+                                {"label": "Экспорт", "value": "E"},
+                                {"label": "Импорт", "value": "I"}
+                            ],
+                            value="E",
+                            inline=True,
+                            className="mb-3"
+                        )
+                    ], width=3),
+                    dbc.Col([
+                        dcc.Slider(
+                            id="heatmap-top",
+                            min=5, max=50, step=5, value=20,
+                            marks={k: str(k) for k in (5, 20, 35, 50)}
+                        )
+                    ], width=6)
+                ]),
+                dbc.Row([
+                    dbc.Col([
+                        html.Progress(id="heatmap-progress", style={"visibility": "hidden"}, className="w-100"),
+                        dcc.Graph(id="partner-commodity-heatmap")
+                    ])
+                ])
+            ], label="Партнеры × товары"),
+        
+            # Вкладка 9: Рост партнеров и товаров
+            dbc.Tab([
+                dbc.Row([
+                    dbc.Col([
+                        dcc.RadioItems(
+                            id="growth-kind",
+                            options=[
+                                {"label": "Партнеры", "value": "partners"},
+                                {"label": "Товарные группы", "value": "commodities"}
+                            ],
+                            value="partners",
+                            inline=True,
+                            className="mb-2"
+                        ),
+                        dcc.RadioItems(
+                            id="growth-flow",
+                            options=[
+                                {"label": "Товарооборот", "value": "all"},
+                                {"label": "Экспорт", "value": "E"},
+                                {"label": "Импорт", "value": "I"}
+                            ],
+                            value="all",
+                            inline=True,
+                            className="mb-2"
+                        )
+                    ], width=4),
+                    dbc.Col([
+                        dcc.Dropdown(
+                            id="growth-metric",
+                            options=[{"label": label, "value": metric} for metric, label in GROWTH_METRICS.items()],
+                            value="cagr",
+                            clearable=False,
+                            className="mb-2"
+                        ),
+                        dcc.RadioItems(
+                            id="growth-order",
+                            options=[
+                                {"label": "Лидеры", "value": "top"},
+                                {"label": "Аутсайдеры", "value": "bottom"}
+                            ],
+                            value="top",
+                            inline=True
+                        )
+                    ], width=4),
+                    dbc.Col([
+                        dcc.RangeSlider(
+                            id="growth-years",
+                            min=(data_years() or [2000])[0],
+                            max=(data_years() or [2023])[-1],
+                            step=1,
+                            value=[(data_years() or [2000])[0], (data_years() or [2023])[-1]],
+                            marks={year: str(year) for year in data_years()[::5]},
+                            allowCross=False
+                        )
+                    ], width=4)
+                ]),
+                dbc.Row([
+                    dbc.Col([
+                        html.Progress(id="growth-progress", style={"visibility": "hidden"}, className="w-100"),
+                        dcc.Graph(id="growth-chart")
+                    ], width=6),
+                    dbc.Col([
+                        dash_table.DataTable(
+                            id="growth-table",
+                            columns=[{"name": "Название", "id": "name"},
+                                     {"name": "Объем, млн USD", "id": "total", "type": "numeric",
+                                      "format": Format(precision=0, scheme=Scheme.fixed)}]
+                                    + [{"name": label, "id": metric, "type": "numeric",
+                                        "format": Format(precision=1, scheme=Scheme.fixed)}
+                                       for metric, label in GROWTH_METRICS.items()],
+                            sort_action="native",
+                            page_size=15,
+                            style_table={"overflowX": "auto"},
+                            style_cell={"textAlign": "left", "maxWidth": 260,
+                                        "overflow": "hidden", "textOverflow": "ellipsis"}
+                        )
+                    ], width=6)
+                ])
+            ], label="Рост"),
+
+            # Вкладка 10: Таблицы партнеров и товаров (страницы и сортировка на сервере)
+            dbc.Tab([
+                dcc.RadioItems(
+                    id="table-kind",
+                    options=[{"label": label, "value": kind} for kind, label in TABLE_KINDS.items()],
+                    value="partners",
+                    inline=True,
+                    className="mb-2"
+                ),
+                dash_table.DataTable(
+                    id="data-table",
+                    page_action="custom",
+                    page_current=0,
+                    page_size=DEFAULT_PAGE_SIZE,
+                    sort_action="custom",
+                    sort_mode="multi",
+                    sort_by=[],
+                    style_table={"overflowX": "auto"},
+                    style_cell={"textAlign": "left", "maxWidth": 360,
+                                "overflow": "hidden", "textOverflow": "ellipsis"}
+                )
+            ], label="Таблицы"),
+
+            # Вкладка 11: Зеркальная статистика
+            dbc.Tab(mirror_tab(), label="Зеркальная статистика")
+        ])
+    ], fluid=True)
+
+def mirror_partners():
+    """Партнеры, для которых загружены их собственные (зеркальные) отчеты"""
+    if not store.ready:
+        return {}
+    return store.get().mirror.partners
+
+def mirror_tab():
+    partners = mirror_partners()
+    controls = dbc.Row([
+        dbc.Col([
+            dcc.Dropdown(
+                id="mirror-partner",
+                options=[{"label": name, "value": code}
+                         for code, name in sorted(partners.items(), key=lambda item: item[1])],
+                value=next(iter(partners), None),
+                placeholder="Партнер",
+                clearable=False,
+                className="mb-3"
+            )
+        ], width=4),
+        dbc.Col([
+            dcc.Dropdown(
+                id="mirror-year",
+                options=[{"label": str(year), "value": year} for year in data_years()],
+                value=(data_years() or [None])[-1],
+                clearable=False,
+                className="mb-3"
+            )
+        ], width=3),
+        dbc.Col([
+            dcc.RadioItems(
+                id="mirror-flow",
+                options=[
+                    {"label": "Экспорт Финляндии / импорт партнера", "value": "E"},
+                    {"label": "Импорт Финляндии / экспорт партнера", "value": "I"}
+                ],
+                value="E",
+                inline=True,
+                className="mb-3"
+            )
+        ], width=5)
     ])
-], fluid=True)
+    notice = [] if partners else [dbc.Alert(
+        "Зеркальных данных нет: в trade.csv только отчеты Финляндии. Добавьте отчеты стран-партнеров "
+        "(reporterCode партнера, partnerCode 246), чтобы сравнить их с отчетами Финляндии.",
+        color="secondary"
+    )]
+    return notice + [controls, dbc.Row([
+        dbc.Col([dcc.Graph(id="mirror-years")], width=6),
+        dbc.Col([dcc.Graph(id="mirror-chapters")], width=6)
+    ])]
+
+def has_monthly_data():
+    """Есть ли в датасете месячные периоды"""
+    return store.ready and not store.get().aggregates['monthly'].empty
+
+def resolution_selector(component_id):
+    """Переключатель годы / месяцы; месяцы недоступны для годового датасета"""
+    return dcc.RadioItems(
+        id=component_id,
+        options=[
+            {"label": "По годам", "value": "year"},
+            {"label": "По месяцам", "value": "month", "disabled": not has_monthly_data()}
+        ],
+        value="year",
+        inline=True,
+        className="mb-2"
+    )
+
+def data_years():
+    """Годы датасета для элементов управления (пусто, пока данные не загружены)"""
+    if not store.ready:
+        return []
+    return sorted(int(year) for year in store.get().aggregates['yearly']['year'].unique())
+
+def serve_layout():
+    if store.ready:
+        return html.Div(build_layout(), id="page-content")
+    return html.Div(loading_layout(), id="page-content")
+
+app.layout = serve_layout
+# Для проверки callback'ов Dash нужен полный макет, даже пока идет загрузка
+app.validation_layout = html.Div([html.Div(loading_layout(), id="page-content"), build_layout()])
+
+# Когда данные загрузятся, заменяем макет загрузки на дашборд
+@app.callback(
+    Output("page-content", "children"),
+    [Input("loading-poll", "n_intervals")]
+)
+def swap_loading_layout(n_intervals):
+    if store.ready:
+        return build_layout()
+    if store.error:
+        return dbc.Alert(f"Ошибка загрузки данных: {store.error}", color="danger", className="mt-5")
+    raise PreventUpdate
 
 # Callback для KPI карточек
 @app.callback(
@@ -210,12 +546,16 @@ app.layout = dbc.Container([
      Output("top-partner", "children")],
     [Input("url", "pathname")]
 )
+@shared_result(result_cache, store_version)
 def update_kpi(pathname):
+    aggregates = store.get().aggregates
+
     # Общий товарооборот
-    total_trade = trade_df['value'].sum()
+    total_trade = aggregates['total_trade']
     
     # Торговое сальдо 2023
-    recent_data = trade_df[trade_df['year'] == 2023]
+    yearly_data = aggregates['yearly']
+    recent_data = yearly_data[yearly_data['year'] == 2023]
     if not recent_data.empty:
         exports = recent_data[recent_data['flow'] == 'E']['value'].sum()
         imports = recent_data[recent_data['flow'] == 'I']['value'].sum()
@@ -229,40 +569,71 @@ def update_kpi(pathname):
         balance_text = "N/A"
     
     # Топ партнер
-    partner_totals = trade_df.groupby('partnerName')['value'].sum().sort_values(ascending=False)
+    partner_totals = aggregates['partner_totals'].sort_values(ascending=False)
     top_partner = partner_totals.index[0] if not partner_totals.empty else "N/A"
     
     return f"{format_number(total_trade)} млн USD", balance_text, top_partner
 
 # Callback для динамики по годам
+app.clientside_callback(
+    "function(pathname) { return window.innerWidth; }",
+    Output("viewport-width", "data"),
+    Input("url", "pathname")
+)
+
+def trend_detail(resolution, width, relayout):
+    """Предел точек и видимое окно ряда; uirevision сохраняет увеличение при обновлении фигуры"""
+    # Перерисовываем только при смене диапазона оси x: autosize при первой отрисовке и прочие
+    # события relayout (dragmode, оси y) фигуру не меняют
+    if relayout is not None and 'xaxis.autorange' not in relayout and figures.relayout_range(relayout) is None:
+        raise PreventUpdate
+    return {'limit': figures.max_points(width), 'x_range': figures.relayout_range(relayout),
+            'uirevision': resolution}
+
 @app.callback(
     Output("yearly-trend", "figure"),
-    [Input("url", "pathname")]
+    [Input("url", "pathname"),
+     Input("yearly-resolution", "value"),
+     Input("yearly-trend", "relayoutData")],
+    State("viewport-width", "data")
 )
-def update_yearly_trend(pathname):
-    yearly_data = trade_df.groupby(['year', 'flow'])['value'].sum().reset_index()
+@shared_result(result_cache, store_version)
+def update_yearly_trend(pathname, resolution="year", relayout=None, width=None):
+    aggregates = store.get().aggregates
+    detail = trend_detail(resolution, width, relayout)
     
     # Переименовываем потоки для лучшего отображения
     flow_mapping = {'E': 'Экспорт', 'I': 'Импорт'}
-    yearly_data['flow'] = yearly_data['flow'].map(flow_mapping)
     
-    fig = px.line(yearly_data, x='year', y='value', color='flow',
-                  title="Динамика экспорта и импорта по годам",
-                  labels={'value': 'Объем торговли (млн USD)', 'year': 'Год', 'flow': 'Тип потока'})
+    if resolution == "month" and not aggregates['monthly'].empty:
+        # Месячный ряд посчитан при загрузке, здесь только отрисовка
+        monthly = aggregates['monthly']
+        fig = figures.line_figure(figures.month_values(monthly['year'], monthly['month']), monthly['value'],
+                                  monthly['flow'].map(flow_mapping),
+                                  title="Динамика экспорта и импорта по месяцам",
+                                  x_title=figures.MONTH_TITLE, legend_title='Тип потока', **detail)
+        return compact_figure(fig)
     
-    fig.update_traces(hovertemplate='%{y:,.0f} млн USD<extra></extra>')
-    fig.update_layout(template="plotly_white")
+    yearly_data = aggregates['yearly']
+    fig = figures.line_figure(yearly_data['year'], yearly_data['value'], yearly_data['flow'].map(flow_mapping),
+                              title="Динамика экспорта и импорта по годам",
+                              legend_title='Тип потока', **detail)
     
-    return fig
+    return compact_figure(fig)
 
 # Callback для ТОП-10 товарных групп
 @app.callback(
     Output("top-commodities", "figure"),
     [Input("commodity-type", "value")]
 )
+@shared_result(result_cache, store_version)
 def update_top_commodities(commodity_type):
-    commodity_data = trade_df[trade_df['flow'] == commodity_type].groupby('commodityCode')['value'].sum().reset_index()
-    commodity_data = commodity_data.merge(commodities_df, left_on='commodityCode', right_on='id', how='left')
+    data = store.get()
+    commodity_flow = data.aggregates['commodity_flow']
+    commodity_data = commodity_flow[commodity_flow['flow'] == commodity_type][['commodityCode', 'value']]
+    commodity_data = commodity_data.assign(
+        text=data.commodities.take(commodity_data['commodityCode'], 'name')
+    )
     commodity_data = commodity_data.nlargest(10, 'value')
     
     # Обрезаем названия до 30 символов
@@ -272,65 +643,168 @@ def update_top_commodities(commodity_type):
     
     flow_name = "Экспорт" if commodity_type == "E" else "Импорт"
     
-    fig = px.bar(commodity_data, x='value', y='short_name', orientation='h',
-                 title=f"ТОП-10 товарных групп ({flow_name})",
-                 labels={'value': 'Объем торговли (млн USD)', 'short_name': 'Товарная группа'})
-    
-    fig.update_traces(hovertemplate='%{y}<br>%{x:,.0f} млн USD<extra></extra>')
-    fig.update_layout(template="plotly_white")
+    fig = figures.bar_figure(commodity_data['value'], commodity_data['short_name'],
+                             title=f"ТОП-10 товарных групп ({flow_name})",
+                             label_title='Товарная группа')
     
-    return fig
+    return compact_figure(fig)
 
 # Callback для структуры по секторам
 @app.callback(
     Output("sector-structure", "figure"),
     [Input("url", "pathname")]
 )
+@shared_result(result_cache, store_version)
 def update_sector_structure(pathname):
-    # Группируем по первым цифрам кода товара (сектора)
-    trade_df['sector'] = trade_df['commodityCode'].astype(str).str[:2]
-    sector_data = trade_df.groupby('sector')['value'].sum().reset_index()
+    # Суммы по первым цифрам кода товара (сектора) посчитаны при загрузке
+    sector_data = store.get().aggregates['sector_totals']
     sector_data = sector_data.nlargest(10, 'value')
     
-    fig = px.pie(sector_data, values='value', names='sector',
-                 title="Структура торговли по секторам")
+    fig = figures.pie_figure(sector_data['value'], sector_data['sector'],
+                             title="Структура торговли по секторам",
+                             hovertemplate='Сектор %{label}<br>%{value:,.0f} млн USD (%{percent:.1%})<extra></extra>')
+    
+    return compact_figure(fig)
+
+# Callback для регионов: итоги и динамика берутся из готовых агрегатов
+@app.callback(
+    [Output("region-chart", "figure"),
+     Output("region-trend", "figure"),
+     Output("geography-region", "options")],
+    [Input("region-flow", "value")]
+)
+@shared_result(result_cache, store_version)
+def update_region_chart(flow):
+    aggregates = store.get().aggregates
+    if flow == "all":
+        region_data = aggregates['region_totals'].reset_index()
+        region_trend = aggregates['region_year_flow'].groupby(['year', 'world_part'], observed=True)['value'].sum().reset_index()
+    else:
+        region_flow = aggregates['region_flow']
+        region_data = region_flow[region_flow['flow'] == flow].sort_values('value', ascending=False)
+        region_year_flow = aggregates['region_year_flow']
+        region_trend = region_year_flow[region_year_flow['flow'] == flow]
+    
+    fig = figures.bar_figure(region_data['value'], region_data['world_part'],
+                             title="Торговля по регионам", label_title='Регион',
+                             yaxis={'categoryorder': 'total ascending'})
     
-    fig.update_traces(hovertemplate='Сектор %{label}<br>%{value:,.0f} млн USD (%{percent:.1%})<extra></extra>')
-    fig.update_layout(template="plotly_white")
+    trend = figures.line_figure(region_trend['year'], region_trend['value'], region_trend['world_part'],
+                                title="Динамика по регионам", legend_title='Регион')
     
-    return fig
+    options = [{"label": region, "value": region} for region in aggregates['region_totals'].index]
+    return compact_figure(fig), compact_figure(trend), options
+
+# Нажатие на регион раскрывает его страны
+@app.callback(
+    Output("geography-region", "value"),
+    [Input("region-chart", "clickData")]
+)
+def select_region(click_data):
+    if not click_data:
+        raise PreventUpdate
+    return click_data['points'][0]['y']
 
 # Callback для географии торговли
 @app.callback(
     Output("geography-map", "figure"),
-    [Input("url", "pathname")]
+    [Input("geography-region", "value"),
+     Input("region-flow", "value")]
 )
-def update_geography_map(pathname):
-    # Группируем по регионам
-    geography_data = trade_df.groupby('partnerName')['value'].sum().reset_index()
+@shared_result(result_cache, store_version)
+def update_geography_map(region=None, flow="all"):
+    aggregates = store.get().aggregates
+    if not region and flow == "all":
+        # ТОП-15 партнеров в целом
+        geography_data = aggregates['partner_totals'].reset_index()
+        title = "География торговли (ТОП-15 партнеров)"
+    else:
+        # Страны региона из таблицы регион x страна x поток
+        geography_data = aggregates['region_partner_flow']
+        if region:
+            geography_data = geography_data[geography_data['world_part'] == region]
+        if flow != "all":
+            geography_data = geography_data[geography_data['flow'] == flow]
+        geography_data = geography_data.groupby('partnerName', observed=True)['value'].sum().reset_index()
+        title = f"{region or 'Все регионы'}: ТОП-15 партнеров"
     geography_data = geography_data.nlargest(15, 'value')
     
-    fig = px.bar(geography_data, x='value', y='partnerName', orientation='h',
-                 title="География торговли (ТОП-15 партнеров)",
-                 labels={'value': 'Объем торговли (млн USD)', 'partnerName': 'Страна/Регион'})
+    fig = figures.bar_figure(geography_data['value'], geography_data['partnerName'],
+                             title=title, label_title='Страна/Регион')
+    
+    return compact_figure(fig)
+
+def search_option(item):
+    kind_name = SEARCH_KINDS[item['kind']].lower()
+    return {"label": f"{item['label']} ({kind_name}, {item['code']})", "value": f"{item['kind']}:{item['code']}"}
+
+# Поиск по индексу на сервере: варианты приходят по мере ввода
+@app.callback(
+    Output("drilldown-search", "options"),
+    [Input("drilldown-search", "search_value")],
+    [State("drilldown-search", "value")]
+)
+def search_drilldown(search_value, value):
+    if not search_value:
+        raise PreventUpdate
+    index = store.get().search
+    options = [search_option(item) for item in index.search(search_value)]
+    
+    # Выбранный вариант остается в списке, иначе Dropdown его сбросит
+    if value and value not in {option["value"] for option in options}:
+        kind, code = value.split(":", 1)
+        selected = index.find(kind, int(code))
+        if selected is not None:
+            options.insert(0, search_option(selected))
+    
+    # Совпадения по ISO3, коду или без учета ё браузер сам бы отфильтровал - подставляем запрос
+    for option in options:
+        option["search"] = f"{option['label']} {search_value}"
+    return options
+
+# Динамика по выбранному в поиске партнеру или товарной группе
+@app.callback(
+    Output("drilldown-trend", "figure"),
+    [Input("drilldown-search", "value")]
+)
+@shared_result(result_cache, store_version)
+def update_drilldown_trend(value):
+    if not value:
+        raise PreventUpdate
+    kind, code = value.split(":", 1)
+    data = store.get()
+    item = data.search.find(kind, int(code))
+    if item is None:
+        raise PreventUpdate
+    
+    if kind == "partner":
+        frame = data.aggregates['partner_year_flow']
+        frame = frame[frame['partnerName'] == item['label']]
+    else:
+        frame = data.aggregates['commodity_year_flow']
+        frame = frame[frame['commodityCode'] == item['code']]
     
-    fig.update_traces(hovertemplate='%{y}<br>%{x:,.0f} млн USD<extra></extra>')
-    fig.update_layout(template="plotly_white")
+    flow_mapping = {'E': 'Экспорт', 'I': 'Импорт'}
+    fig = figures.line_figure(frame['year'], frame['value'], frame['flow'].map(flow_mapping),
+                              title=f"{item['label']}: экспорт и импорт по годам",
+                              legend_title='Тип потока')
     
-    return fig
+    return compact_figure(fig)
 
 # Callback для ТОП-10 стран-партнеров
 @app.callback(
     Output("top-partners", "figure"),
     [Input("url", "pathname")]
 )
+@shared_result(result_cache, store_version)
 def update_top_partners(pathname):
     # Агрегируем данные за 2019-2023
     recent_years = [2019, 2020, 2021, 2022, 2023]
-    recent_data = trade_df[trade_df['year'].isin(recent_years)]
+    partner_year_flow = store.get().aggregates['partner_year_flow']
+    recent_data = partner_year_flow[partner_year_flow['year'].isin(recent_years)]
     
     # Группируем по партнерам и типам потоков
-    partner_data = recent_data.groupby(['partnerName', 'flow'])['value'].sum().reset_index()
+    partner_data = recent_data.groupby(['partnerName', 'flow'], observed=True)['value'].sum().reset_index()
     
     # Создаем сводную таблицу
     pivot_data = partner_data.pivot(index='partnerName', columns='flow', values='value').fillna(0)
@@ -340,84 +814,83 @@ def update_top_partners(pathname):
     # Топ-10 по общему объему
     top_partners = pivot_data.nlargest(10, 'total').reset_index()
     
-    # Создаем график
-    fig = go.Figure()
-    
-    # Добавляем бары для экспорта и импорта
-    fig.add_trace(go.Bar(
-        name='Экспорт',
-        x=top_partners['partnerName'],
-        y=top_partners['E'],
-        marker_color='lightblue'
-    ))
-    
-    fig.add_trace(go.Bar(
-        name='Импорт',
-        x=top_partners['partnerName'],
-        y=top_partners['I'],
-        marker_color='lightcoral'
-    ))
+    # Создаем график: бары экспорта и импорта и линия сальдо
+    partners = figures.values(top_partners['partnerName'])
+    colors = np.where(top_partners['balance'].to_numpy() > 0, 'green', 'red').tolist()
+    traces = [
+        {'type': 'bar', 'name': 'Экспорт', 'x': partners, 'y': figures.values(top_partners['E']),
+         'marker': {'color': 'lightblue'}, 'hovertemplate': figures.HOVER_Y_VALUE},
+        {'type': 'bar', 'name': 'Импорт', 'x': partners, 'y': figures.values(top_partners['I']),
+         'marker': {'color': 'lightcoral'}, 'hovertemplate': figures.HOVER_Y_VALUE},
+        {'type': 'scatter', 'name': 'Сальдо', 'x': partners, 'y': figures.values(top_partners['balance']),
+         'mode': 'markers+lines', 'marker': {'color': colors, 'size': 10},
+         'line': {'color': 'yellow', 'width': 2}, 'hovertemplate': figures.HOVER_Y_VALUE},
+    ]
     
-    # Добавляем линию сальдо
-    colors = ['green' if x > 0 else 'red' for x in top_partners['balance']]
-    fig.add_trace(go.Scatter(
-        name='Сальдо',
-        x=top_partners['partnerName'],
-        y=top_partners['balance'],
-        mode='markers+lines',
-        marker=dict(color=colors, size=10),
-        line=dict(color='yellow', width=2)
+    fig = figures.figure(traces, figures.layout(
+        "ТОП-10 стран-партнеров (2019-2023)", "Страна", figures.VALUE_TITLE, barmode='group'
     ))
     
-    fig.update_layout(
-        title="ТОП-10 стран-партнеров (2019-2023)",
-        barmode='group',
-        template="plotly_white",
-        xaxis_title="Страна",
-        yaxis_title="Объем торговли (млн USD)"
-    )
-    
-    fig.update_traces(hovertemplate='%{y:,.0f} млн USD<extra></extra>')
-    
-    return fig
+    return compact_figure(fig)
 
 # Callback для анализа России
 @app.callback(
     Output("russia-analysis", "figure"),
-    [Input("url", "pathname")]
+    [Input("url", "pathname"),
+     Input("russia-resolution", "value"),
+     Input("russia-analysis", "relayoutData")],
+    State("viewport-width", "data")
 )
-def update_russia_analysis(pathname):
-    # Данные по России
-    russia_data = trade_df[trade_df['partnerName'] == 'Россия'].groupby(['year', 'flow'])['value'].sum().reset_index()
+@shared_result(result_cache, store_version)
+def update_russia_analysis(pathname, resolution="year", relayout=None, width=None):
+    aggregates = store.get().aggregates
+    detail = trend_detail(resolution, width, relayout)
     
     # Переименовываем потоки
     flow_mapping = {'E': 'Экспорт', 'I': 'Импорт'}
-    russia_data['flow'] = russia_data['flow'].map(flow_mapping)
     
-    fig = px.line(russia_data, x='year', y='value', color='flow',
-                  title="Торговля с Российской Федерацией",
-                  labels={'value': 'Объем торговли (млн USD)', 'year': 'Год', 'flow': 'Тип потока'})
+    if resolution == "month" and not aggregates['monthly'].empty:
+        partner_month_flow = aggregates['partner_month_flow']
+        russia_data = partner_month_flow[partner_month_flow['partnerName'] == 'Россия']
+        fig = figures.line_figure(figures.month_values(russia_data['year'], russia_data['month']),
+                                  russia_data['value'], russia_data['flow'].map(flow_mapping),
+                                  title="Торговля с Российской Федерацией по месяцам",
+                                  x_title=figures.MONTH_TITLE, legend_title='Тип потока', **detail)
+        return compact_figure(fig)
+    
+    # Данные по России
+    partner_year_flow = aggregates['partner_year_flow']
+    russia_data = partner_year_flow[partner_year_flow['partnerName'] == 'Россия']
     
-    fig.update_traces(hovertemplate='%{y:,.0f} млн USD<extra></extra>')
-    fig.update_layout(template="plotly_white")
+    fig = figures.line_figure(russia_data['year'], russia_data['value'], russia_data['flow'].map(flow_mapping),
+                              title="Торговля с Российской Федерацией",
+                              legend_title='Тип потока', **detail)
     
-    return fig
+    return compact_figure(fig)
 
-# Callback для изменений структуры
-@app.callback(
+# Callback для изменений структуры (фоновый)
+@background_callback(
+    app, background_manager,
     Output("structure-changes", "figure"),
-    [Input("url", "pathname")]
+    [Input("url", "pathname")],
+    progress=[Output("structure-progress", "value"), Output("structure-progress", "max")],
+    running=[(Output("structure-progress", "style"), {"visibility": "visible"}, {"visibility": "hidden"})]
 )
-def update_structure_changes(pathname):
+def update_structure_changes(set_progress, pathname):
     # Сравниваем 2013 и 2023 годы
     years = [2013, 2023]
-    structure_data = trade_df[trade_df['year'].isin(years)]
+    set_progress((0, 3))
+    data = store.get()
+    commodity_year = data.aggregates['commodity_year']
     
-    # Группируем по товарным группам
-    commodity_changes = structure_data.groupby(['year', 'commodityCode'])['value'].sum().reset_index()
-    commodity_changes = commodity_changes.merge(commodities_df, left_on='commodityCode', right_on='id', how='left')
+    # Суммы по товарным группам за эти годы
+    commodity_changes = commodity_year[commodity_year['year'].isin(years)]
+    commodity_changes = commodity_changes.assign(
+        text=data.commodities.take(commodity_changes['commodityCode'], 'name')
+    )
     
     # Создаем сводную таблицу
+    set_progress((1, 3))
     pivot_changes = commodity_changes.pivot(index='text', columns='year', values='value').fillna(0)
     pivot_changes['change'] = ((pivot_changes[2023] - pivot_changes[2013]) / pivot_changes[2013] * 100)
     
@@ -434,28 +907,180 @@ def update_structure_changes(pathname):
     )
     
     # Создаем график
-    fig = go.Figure()
+    set_progress((2, 3))
+    change = top_changes['change'].to_numpy()
+    trace = {
+        'type': 'bar',
+        'x': figures.values(top_changes['short_name']),
+        'y': change,
+        'marker': {'color': np.where(change > 0, 'green', 'red').tolist()},
+        'text': [f"{x:+.1f} п.п." for x in change],
+        'textposition': 'auto',
+        'hovertemplate': '%{x}<br>%{y:+.1f} п.п.<extra></extra>'
+    }
+    
+    fig = figures.figure([trace], figures.layout(
+        "Изменения структуры торговли (2013-2023)", "Товарная группа", "Изменение доли (% п.п.)"
+    ))
+    
+    return compact_figure(fig)
+
+# Тепловая карта партнер × товар по разреженной матрице выбранного года и потока (фоновая)
+@background_callback(
+    app, background_manager,
+    Output("partner-commodity-heatmap", "figure"),
+    [Input("heatmap-year", "value"),
+     Input("heatmap-flow", "value"),
+     Input("heatmap-top", "value")],
+    progress=[Output("heatmap-progress", "value"), Output("heatmap-progress", "max")],
+    running=[(Output("heatmap-progress", "style"), {"visibility": "visible"}, {"visibility": "hidden"})]
+)
+def update_partner_commodity_heatmap(set_progress, year, flow, top):
+    set_progress((0, 2))
+    data = store.get()
+    partners, commodity_codes, values = data.partner_commodity.heatmap((year, flow), top, top)
+    set_progress((1, 2))
+    commodity_names = [
+        name if isinstance(name, str) else str(code)
+        for code, name in zip(commodity_codes, data.commodities.take(commodity_codes, 'name'))
+    ]
+    short_names = [name[:30] + '...' if len(name) > 30 else name for name in commodity_names]
+    
+    trace = {
+        'type': 'heatmap',
+        'z': values,
+        'x': short_names,
+        'y': partners,
+        'customdata': [commodity_names] * len(partners),
+        'colorscale': 'Viridis',
+        'hovertemplate': '%{y}<br>%{customdata}<br>%{z:,.1f} млн USD<extra></extra>'
+    }
     
-    colors = ['green' if x > 0 else 'red' for x in top_changes['change']]
+    flow_name = "Экспорт" if flow == "E" else "Импорт"
+    fig = figures.figure([trace], figures.layout(
+        f"Партнеры × товарные группы ({flow_name}, {year}): ТОП-{top}",
+        height=700, yaxis={'autorange': 'reversed'}
+    ))
+    
+    return compact_figure(fig)
+
+# Рейтинг роста: показатели считаются векторно по всем рядам и кэшируются в версии данных (фоновый)
+@background_callback(
+    app, background_manager,
+    [Output("growth-chart", "figure"),
+     Output("growth-table", "data")],
+    [Input("growth-kind", "value"),
+     Input("growth-flow", "value"),
+     Input("growth-metric", "value"),
+     Input("growth-order", "value"),
+     Input("growth-years", "value")],
+    progress=[Output("growth-progress", "value"), Output("growth-progress", "max")],
+    running=[(Output("growth-progress", "style"), {"visibility": "visible"}, {"visibility": "hidden"})]
+)
+def update_growth(set_progress, kind, flow, metric, order, years):
+    set_progress((0, 2))
+    growth = store.get().growth
+    start_year, end_year = years or (None, None)
+    ranking = growth.ranking(metric, kind, flow, start_year, end_year, n=15,
+                             ascending=(order == "bottom"))
     
-    fig.add_trace(go.Bar(
-        x=top_changes['short_name'],
-        y=top_changes['change'],
-        marker_color=colors,
-        text=[f"{x:+.1f} п.п." for x in top_changes['change']],
-        textposition='auto'
+    ranking = ranking.assign(short_name=ranking['name'].astype(str).apply(
+        lambda x: x[:30] + '...' if len(x) > 30 else x
     ))
+    direction = "лидеры" if order == "top" else "аутсайдеры"
+    fig = figures.bar_figure(ranking[metric], ranking['short_name'],
+                             title=f"{GROWTH_METRICS[metric]}: {direction} ({start_year}-{end_year})",
+                             value_title=GROWTH_METRICS[metric], label_title='',
+                             hovertemplate='%{y}<br>%{x:,.1f}<extra></extra>',
+                             yaxis={'categoryorder': 'total descending' if order == "bottom" else 'total ascending'})
+    
+    set_progress((1, 2))
+    table = growth.metrics(kind, flow, start_year, end_year)
+    columns = ['name', 'total'] + list(GROWTH_METRICS)
+    records = table[columns].round(2).replace([np.inf, -np.inf], np.nan)
+    return compact_figure(fig), records.astype(object).where(records.notna(), None).to_dict('records')
+
+def table_column(column):
+    if column in TEXT_COLUMNS:
+        return {"name": TABLE_COLUMNS[column], "id": column}
+    precision = 1 if column == 'share' else 0
+    return {"name": TABLE_COLUMNS[column], "id": column, "type": "numeric",
+            "format": Format(precision=precision, scheme=Scheme.fixed, group=True).to_plotly_json()}
+
+# При смене таблицы - первая страница и порядок по умолчанию
+@app.callback(
+    [Output("data-table", "page_current"),
+     Output("data-table", "sort_by")],
+    Input("table-kind", "value"),
+    prevent_initial_call=True
+)
+def reset_data_table(kind):
+    return 0, []
+
+# Только видимая страница: сортировка - по кэшированной перестановке строк
+@app.callback(
+    [Output("data-table", "data"),
+     Output("data-table", "columns"),
+     Output("data-table", "page_count")],
+    [Input("table-kind", "value"),
+     Input("data-table", "page_current"),
+     Input("data-table", "page_size"),
+     Input("data-table", "sort_by")]
+)
+@shared_result(result_cache, store_version)
+def update_data_table(kind, page_current, page_size, sort_by):
+    table = store.get().tables.get(kind)
+    if table is None:
+        raise PreventUpdate
+    records, page_count = table.page(page_current, page_size, sort_by)
+    return records, [table_column(column) for column in table.columns], page_count
+
+# Зеркальная статистика: сопоставление построено один раз, здесь - отрезок по партнеру и году
+@app.callback(
+    [Output("mirror-years", "figure"),
+     Output("mirror-chapters", "figure")],
+    [Input("mirror-partner", "value"),
+     Input("mirror-year", "value"),
+     Input("mirror-flow", "value")]
+)
+@shared_result(result_cache, store_version)
+def update_mirror(partner, year, flow):
+    data = store.get()
+    mirror = data.mirror
+    if partner not in mirror.partners:
+        empty = compact_figure(figures.figure([], figures.layout("Нет зеркальных данных для сравнения")))
+        return empty, empty
     
-    fig.update_layout(
-        title="Изменения структуры торговли (2013-2023)",
-        template="plotly_white",
-        xaxis_title="Товарная группа",
-        yaxis_title="Изменение доли (% п.п.)"
+    name = mirror.partners[partner]
+    own, other = ("Экспорт Финляндии", f"Импорт ({name})") if flow == "E" else ("Импорт Финляндии", f"Экспорт ({name})")
+    yearly = mirror.yearly(partner, flow)
+    years_fig = figures.line_figure(
+        np.concatenate([yearly['year'], yearly['year']]),
+        np.concatenate([yearly['reported'], yearly['mirror']]),
+        [own] * len(yearly) + [other] * len(yearly),
+        title=f"Отчет Финляндии и зеркальный отчет: {name}",
+        legend_title='Источник'
     )
     
-    fig.update_traces(hovertemplate='%{x}<br>%{y:+.1f} п.п.<extra></extra>')
+    chapters = mirror.chapters(partner, year, flow).head(15)
+    chapter_names = data.commodities.take(chapters['chapter'], 'name')
+    labels = [
+        (name[:30] + '...' if len(name) > 30 else name) if isinstance(name, str) else str(code)
+        for code, name in zip(chapters['chapter'], chapter_names)
+    ]
+    # Относительное расхождение - в подсказке и подписи столбца
+    pct = chapters['discrepancy_pct'].replace([np.inf, -np.inf], np.nan).to_numpy()
+    chapters_fig = figures.bar_figure(
+        chapters['discrepancy'], labels,
+        title=f"Крупнейшие расхождения по главам ({year})",
+        value_title='Расхождение (млн USD)', label_title='',
+        hovertemplate='%{y}<br>%{x:+,.1f} млн USD (%{customdata:+.1f}% к зеркальному отчету)<extra></extra>',
+        customdata=pct,
+        text=['' if np.isnan(value) else f"{value:+.0f}%" for value in pct],
+        yaxis={'autorange': 'reversed'}
+    )
     
-    return fig
+    return compact_figure(years_fig), compact_figure(chapters_fig)
 
 if __name__ == '__main__':
     app.run(debug=True, port=8050, host='0.0.0.0') 
\ No newline at end of file
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Загрузка и подготовка данных дашборда, в том числе в фоновом потоке
+"""
+
+import logging
+import os
+import threading
+from collections.abc import Mapping
+from dataclasses import dataclass, field
+from functools import cached_property
+from types import MappingProxyType
+
+import numpy as np
+import pandas as pd
+
+from growth import GrowthAnalytics
+from http_cache import file_fingerprint
+from lookups import commodity_lookup, country_lookup, hs_chapter, override_partner_names
+from memory_cache import registry
+from paged_tables import build_tables
+from reconciliation import HOME_REPORTER, build_mirror_index, chapter_flows
+from search_index import build_search_index
+from sparse_store import PartnerCommodityStore
+
+logger = logging.getLogger(__name__)
+
+# Исходные файлы датасета - от их содержимого зависит версия данных
+DATA_FILES = ['trade.csv', 'countries.csv', 'commodities.csv']
+
+# Период больше - месяц в формате YYYYMM
+MAX_YEAR = 9999
+
+# Ожидание данных внутри callback'а, если они запрошены до окончания загрузки
+WAIT_TIMEOUT = 300
+
+
+class locked_cached_property(cached_property):
+    """cached_property, который строится один раз, даже если его запросили несколько потоков сразу"""
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        cache = instance.__dict__
+        if self.attrname not in cache:
+            with instance._lazy_lock:
+                if self.attrname not in cache:
+                    # Индекс учитывается в бюджете памяти воркера, но не вытесняется
+                    cache[self.attrname] = registry.pin(self.attrname, self.func(instance))
+        return cache[self.attrname]
+
+
+@dataclass(frozen=True)
+class TradeData:
+    """Подготовленные таблицы и агрегаты одной версии датасета.
+
+    Неизменяемый снимок: callback'и только читают его, поэтому один объект безопасно
+    делят потоки воркера (gthread). Новая версия данных - новый объект в DataStore.
+    """
+    trade_df: pd.DataFrame
+    countries_df: pd.DataFrame
+    commodities_df: pd.DataFrame
+    aggregates: Mapping = field(default_factory=dict)
+    version: str = ''
+    # RLock: ленивый индекс может строиться из другого (таблицы берут названия из справочника товаров)
+    _lazy_lock: threading.RLock = field(default_factory=threading.RLock, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        # Агрегаты только для чтения: случайная запись из callback'а упадет, а не испортит данные соседям
+        object.__setattr__(self, 'aggregates', MappingProxyType(dict(self.aggregates)))
+
+    @locked_cached_property
+    def commodities(self):
+        """Справочник товаров по коду, строится один раз на версию данных"""
+        return commodity_lookup(self.commodities_df)
+
+    @locked_cached_property
+    def partner_commodity(self):
+        """CSR-матрицы партнер × товар по году и потоку"""
+        return PartnerCommodityStore(self.aggregates['partner_commodity'])
+
+    @locked_cached_property
+    def growth(self):
+        """Показатели роста с кэшем в пределах этой версии данных"""
+        return GrowthAnalytics(self.aggregates, lambda codes: self.commodities.take(codes, 'name'), self.version)
+
+    @locked_cached_property
+    def search(self):
+        """Поисковый индекс по партнерам и товарным группам"""
+        return build_search_index(self.trade_df, self.countries_df, self.commodities_df, self.aggregates)
+
+    @locked_cached_property
+    def tables(self):
+        """Таблицы партнеров и товарных групп для постраничного вывода"""
+        return build_tables(self.aggregates, lambda codes: self.commodities.take(codes, 'name'), self.version)
+
+    @locked_cached_property
+    def mirror(self):
+        """Сопоставление отчетов с зеркальными отчетами партнеров"""
+        return build_mirror_index(self.aggregates, self.trade_df)
+
+
+def split_period(trade_df):
+    """Колонки year и month вместо period; month = 0 у годовых строк.
+
+    Если для года есть месячные строки, годовые строки того же года отбрасываются,
+    чтобы год не считался дважды: годовые итоги собираются из месяцев.
+    """
+    period = trade_df['period'].to_numpy(dtype=np.int64)
+    monthly = period > MAX_YEAR
+    year = np.where(monthly, period // 100, period)
+    month = np.where(monthly, period % 100, 0).astype(np.int8)
+    trade_df = trade_df.drop(columns='period')
+    trade_df.insert(0, 'month', month)
+    trade_df.insert(0, 'year', year)
+    if monthly.any() and not monthly.all():
+        covered = np.isin(year, np.unique(year[monthly]))
+        trade_df = trade_df[monthly | ~covered]
+    return trade_df
+
+
+# Загрузка данных
+def load_data():
+    # Загружаем основные данные
+    trade_df = pd.read_csv('trade.csv')
+    countries_df = pd.read_csv('countries.csv')
+    commodities_df = pd.read_csv('commodities.csv')
+
+    # Период Comtrade: год (2023) или месяц (202301) - раскладываем на год и месяц
+    trade_df = split_period(trade_df)
+
+    # Переименовываем колонки для удобства
+    trade_df = trade_df.rename(columns={
+        'reporterCode': 'reporterCode',
+        'flowCode': 'flow',
+        'partnerCode': 'partnerCode',
+        'cmdCode': 'commodityCode',
+        'primaryValue': 'value'
+    })
+
+    # Справочник стран по коду партнера
+    countries = country_lookup(countries_df)
+
+    # Названия партнеров одним проходом по массиву кодов
+    trade_df['partnerName'] = countries.take(trade_df['partnerCode'], 'name')
+    trade_df['partnerName'] = trade_df['partnerName'].fillna('Прочие регионы')
+    trade_df['world_part'] = countries.take(trade_df['partnerCode'], 'world_part')
+    trade_df['world_part'] = trade_df['world_part'].fillna('Прочие регионы')
+
+    # Убираем категорию "Неизвестно"
+    trade_df = trade_df[trade_df['partnerName'] != 'Неизвестно']
+
+    # Заменяем коды стран на названия
+    trade_df = trade_df.assign(
+        partnerName=override_partner_names(trade_df['partnerCode'], trade_df['partnerName'])
+    )
+
+    return trade_df, countries_df, commodities_df
+
+
+def build_aggregates(trade_df):
+    """Считаем агрегаты, которые нужны callback'ам, один раз при загрузке"""
+    aggregates = {}
+
+    aggregates['total_trade'] = trade_df['value'].sum()
+    aggregates['yearly'] = trade_df.groupby(['year', 'flow'])['value'].sum().reset_index()
+    aggregates['partner_totals'] = trade_df.groupby('partnerName')['value'].sum()
+    aggregates['partner_year_flow'] = (
+        trade_df.groupby(['year', 'partnerName', 'flow'])['value'].sum().reset_index()
+    )
+    aggregates['commodity_flow'] = (
+        trade_df.groupby(['flow', 'commodityCode'])['value'].sum().reset_index()
+    )
+    aggregates['commodity_year'] = (
+        trade_df.groupby(['year', 'commodityCode'])['value'].sum().reset_index()
+    )
+    aggregates['commodity_year_flow'] = (
+        trade_df.groupby(['year', 'flow', 'commodityCode'])['value'].sum().reset_index()
+    )
+
+    # Сектор - глава ТН ВЭД кода товара ('01'...'99')
+    chapter = pd.Series(hs_chapter(trade_df['commodityCode']), index=trade_df.index)
+    sector_totals = trade_df['value'].groupby(chapter).sum()
+    aggregates['sector_totals'] = pd.DataFrame({
+        'sector': [f"{int(code):02d}" for code in sector_totals.index],
+        'value': sector_totals.to_numpy(),
+    })
+
+    # Регионы: строки группируются один раз, остальные срезы - из небольшой таблицы регион x страна
+    region_partner_flow = (
+        trade_df.groupby(['world_part', 'partnerName', 'flow'])['value'].sum().reset_index()
+    )
+    aggregates['region_partner_flow'] = region_partner_flow
+    aggregates['region_flow'] = (
+        region_partner_flow.groupby(['world_part', 'flow'])['value'].sum().reset_index()
+    )
+    aggregates['region_totals'] = (
+        region_partner_flow.groupby('world_part')['value'].sum().sort_values(ascending=False)
+    )
+    aggregates['region_year_flow'] = (
+        trade_df.groupby(['year', 'world_part', 'flow'])['value'].sum().reset_index()
+    )
+
+    # Месячные ряды (пустые для годового датасета); годовые агрегаты выше - суммы по месяцам
+    monthly = trade_df[trade_df['month'] > 0]
+    aggregates['monthly'] = monthly.groupby(['year', 'month', 'flow'])['value'].sum().reset_index()
+    aggregates['partner_month_flow'] = (
+        monthly.groupby(['year', 'month', 'partnerName', 'flow'])['value'].sum().reset_index()
+    )
+
+    # Только ненулевые пары партнер-товар: из них строятся разреженные матрицы
+    aggregates['partner_commodity'] = (
+        trade_df.groupby(['year', 'flow', 'partnerName', 'commodityCode'])['value'].sum().reset_index()
+    )
+
+    return aggregates
+
+
+def warm_growth(data):
+    """Показатели роста за весь период - то, что вкладка «Рост» запрашивает при открытии"""
+    years = data.aggregates['yearly']['year']
+    if years.empty:
+        return
+    first_year, last_year = int(years.min()), int(years.max())
+    for kind in ('partners', 'commodities'):
+        data.growth.metrics(kind, 'all', first_year, last_year)
+
+
+def prepare_data():
+    """Полная подготовка: чтение CSV, обработка и агрегаты"""
+    trade_df, countries_df, commodities_df = load_data()
+    # Отчеты других стран нужны только для зеркальной статистики, остальное - по отчетам HOME_REPORTER
+    mirror_flows = chapter_flows(trade_df)
+    home = trade_df['reporterCode'] == HOME_REPORTER
+    if not home.all():
+        trade_df = trade_df[home]
+    aggregates = build_aggregates(trade_df)
+    aggregates['reporter_chapter_flow'] = mirror_flows
+    return TradeData(
+        trade_df=trade_df,
+        countries_df=countries_df,
+        commodities_df=commodities_df,
+        aggregates=aggregates,
+        version=file_fingerprint(DATA_FILES)
+    )
+
+
+class DataStore:
+    """Хранилище данных дашборда с синхронной или фоновой загрузкой"""
+
+    def __init__(self, loader=prepare_data):
+        self._loader = loader
+        self._data = None
+        self._error = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set() and self._data is not None
+
+    @property
+    def error(self):
+        return self._error
+
+    @property
+    def version(self):
+        return self._data.version if self._data is not None else None
+
+    def load(self):
+        """Загружает данные в текущем потоке"""
+        try:
+            self._data = self._loader()
+            registry.pin('aggregates', self._data.aggregates)
+            # Индекс поиска строится сразу, чтобы первый ввод в поиске не ждал его
+            self._data.search
+            # Матрицы и рост нужны фоновым callback'ам: задачи выполняются в дочерних процессах,
+            # которые получают построенное при fork, а свое теряют при выходе
+            self._data.partner_commodity
+            warm_growth(self._data)
+            logger.info("Данные загружены, версия %s", self._data.version)
+        except Exception as e:
+            self._error = f"{type(e).__name__}: {e}"
+            logger.exception("Ошибка загрузки данных")
+        finally:
+            self._ready.set()
+
+    def start_background(self):
+        """Запускает загрузку в фоновом потоке и сразу возвращает управление"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self.load, name='data-loader', daemon=True)
+            self._thread.start()
+        return self._thread
+
+    def wait(self, timeout=WAIT_TIMEOUT):
+        """Ждет окончания загрузки; возвращает True, если данные готовы"""
+        self._ready.wait(timeout)
+        return self.ready
+
+    def get(self, timeout=WAIT_TIMEOUT):
+        """Возвращает подготовленные данные, дожидаясь загрузки при необходимости"""
+        if not self.wait(timeout):
+            raise RuntimeError(self._error or "Данные еще не загружены")
+        return self._data
+
+
+def background_load_enabled():
+    """Фоновая загрузка включена по умолчанию; DASHBOARD_BACKGROUND_LOAD=0 отключает ее"""
+    return os.environ.get('DASHBOARD_BACKGROUND_LOAD', '1') == '1'
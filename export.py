@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Выгрузка строк trade_df по фильтрам в CSV или Parquet потоком.
+
+Отбор строк - векторные маски по колонкам, а ответ формируется генератором
+по частям: в памяти одновременно только одна часть, поэтому большая выгрузка
+не раздувает воркер. Длина ответа заранее неизвестна, и он отдается
+с chunked-кодированием.
+
+Пример:
+    /export?format=csv&year_from=2019&flow=E&partner=276&commodity=85
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+from flask import Response, jsonify, request, stream_with_context
+
+try:
+    import pyarrow
+    import pyarrow.parquet as pq
+except ImportError:
+    pyarrow = None
+
+# Строк в одной части ответа (в Parquet - в одной row group)
+EXPORT_CHUNK_ROWS = int(os.environ.get('DASHBOARD_EXPORT_CHUNK_ROWS', '50000'))
+
+FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+class ExportError(ValueError):
+    """Некорректные параметры выгрузки"""
+
+
+def _int_values(args, name):
+    try:
+        return [int(value) for value in args.getlist(name) if value != '']
+    except ValueError:
+        raise ExportError(f"Параметр {name} должен быть целым числом")
+
+
+def filter_mask(trade_df, args=None):
+    """Маска строк по параметрам запроса: year, year_from, year_to, flow, partner, commodity"""
+    args = args if args is not None else request.args
+    mask = np.ones(len(trade_df), dtype=bool)
+
+    years = _int_values(args, 'year')
+    if years:
+        mask &= trade_df['year'].isin(years).to_numpy()
+    for name, compare in (('year_from', np.greater_equal), ('year_to', np.less_equal)):
+        bound = _int_values(args, name)
+        if bound:
+            mask &= compare(trade_df['year'].to_numpy(), bound[0])
+
+    flows = args.getlist('flow')
+    if flows:
+        mask &= trade_df['flow'].isin(flows).to_numpy()
+
+    # Партнер - код или название
+    partners = args.getlist('partner')
+    if partners:
+        codes = [int(value) for value in partners if value.lstrip('-').isdigit()]
+        names = [value for value in partners if not value.lstrip('-').isdigit()]
+        mask &= (trade_df['partnerCode'].isin(codes) | trade_df['partnerName'].isin(names)).to_numpy()
+
+    commodities = _int_values(args, 'commodity')
+    if commodities:
+        mask &= trade_df['commodityCode'].isin(commodities).to_numpy()
+
+    return mask
+
+
+def iter_chunks(trade_df, positions, chunk_rows=EXPORT_CHUNK_ROWS):
+    for start in range(0, len(positions), chunk_rows):
+        yield trade_df.iloc[positions[start:start + chunk_rows]]
+
+
+def stream_csv(trade_df, positions, chunk_rows=EXPORT_CHUNK_ROWS):
+    """CSV по частям: заголовок, затем строки каждой части"""
+    yield trade_df.iloc[:0].to_csv(index=False).encode('utf-8')
+    for chunk in iter_chunks(trade_df, positions, chunk_rows):
+        yield chunk.to_csv(index=False, header=False).encode('utf-8')
+
+
+class _ChunkSink:
+    """Файлоподобный приемник: накопленные байты забираются после каждой row group"""
+
+    def __init__(self):
+        self.parts = []
+        self.closed = False
+        self.position = 0
+
+    def write(self, data):
+        data = bytes(data)
+        self.parts.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+
+def stream_parquet(trade_df, positions, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Parquet по row group: каждая часть пишется и сразу отдается клиенту"""
+    sink = _ChunkSink()
+    # Колонки category из снимка пишутся строками, как после подготовки из CSV
+    head = trade_df.iloc[:0]
+    head = head.astype({name: dtype.categories.dtype for name, dtype in head.dtypes.items()
+                        if isinstance(dtype, pd.CategoricalDtype)})
+    schema = pyarrow.Schema.from_pandas(head, preserve_index=False)
+    with pq.ParquetWriter(pyarrow.PythonFile(sink, mode='w'), schema) as writer:
+        for chunk in iter_chunks(trade_df, positions, chunk_rows):
+            writer.write_table(pyarrow.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            yield sink.drain()
+    # Футер файла пишется при закрытии
+    yield sink.drain()
+
+
+def install_export(server, store, url='/export'):
+    """Регистрирует маршрут выгрузки отфильтрованных строк"""
+
+    def export():
+        if not store.ready:
+            return jsonify(status='loading', error=store.error), 503
+
+        fmt = request.args.get('format', 'csv')
+        if fmt not in FORMATS:
+            return jsonify(error=f"Неизвестный формат {fmt}, доступны: {', '.join(FORMATS)}"), 400
+        if fmt == 'parquet' and pyarrow is None:
+            return jsonify(error="Parquet недоступен: не установлен pyarrow"), 400
+
+        trade_df = store.get().trade_df
+        try:
+            positions = np.flatnonzero(filter_mask(trade_df))
+        except ExportError as e:
+            return jsonify(error=str(e)), 400
+
+        stream = stream_csv if fmt == 'csv' else stream_parquet
+        response = Response(stream_with_context(stream(trade_df, positions)), content_type=FORMATS[fmt])
+        response.headers['Content-Disposition'] = f'attachment; filename="trade_export.{fmt}"'
+        response.headers['X-Export-Rows'] = str(len(positions))
+        response.headers['X-Data-Version'] = store.version or ''
+        return response
+
+    server.add_url_rule(url, endpoint='export', view_func=export)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Построение фигур дашборда сразу в виде словарей из массивов NumPy.
+
+plotly.express разбирает DataFrame и прогоняет каждое свойство через валидаторы
+graph_objects на каждом запросе. Здесь трассы и layout собираются как обычные
+словари, шаблон plotly_white разворачивается один раз при импорте и
+переиспользуется всеми фигурами. Результат - то, что Dash и так отправляет
+клиенту после to_plotly_json().
+
+Длинные ряды прореживаются на сервере (LTTB - сохраняет форму линии) до числа
+точек, которое соответствует ширине окна, а при большом числе точек трассы
+рисуются через WebGL. При увеличении участка графика ряд запрашивается заново
+для видимого окна, поэтому размер ответа не зависит от длины ряда.
+"""
+
+import math
+import os
+
+import numpy as np
+import pandas as pd
+import plotly.io as pio
+
+# Шаблон разворачивается один раз; фигуры ссылаются на него, поэтому изменять его нельзя
+TEMPLATE = pio.templates['plotly_white'].to_plotly_json()
+
+VALUE_TITLE = 'Объем торговли (млн USD)'
+YEAR_TITLE = 'Год'
+MONTH_TITLE = 'Месяц'
+
+# Не больше точек на трассу, чем пикселей по ширине окна, и не больше MAX_POINTS
+MAX_POINTS = int(os.environ.get('DASHBOARD_MAX_POINTS', '2000'))
+# Начиная с этого числа точек в фигуре линии рисуются через WebGL (scattergl)
+WEBGL_POINTS = int(os.environ.get('DASHBOARD_WEBGL_POINTS', '1000'))
+# Ширина окна округляется вверх до шага: меньше разных ключей в кэше результатов
+WIDTH_STEP = 200
+
+# Подсказки, общие для графиков дашборда
+HOVER_Y_VALUE = '%{y:,.0f} млн USD<extra></extra>'
+HOVER_BAR_H = '%{y}<br>%{x:,.0f} млн USD<extra></extra>'
+
+
+def values(array):
+    """Числа остаются массивом NumPy, подписи превращаются в список"""
+    array = np.asarray(array)
+    if array.dtype.kind in 'biuf':
+        return array
+    return array.tolist()
+
+
+def month_values(year, month):
+    """Подписи месяцев 'YYYY-MM' - ось дат plotly"""
+    year = np.asarray(year, dtype=np.int64)
+    month = np.asarray(month, dtype=np.int64)
+    return [f"{y:04d}-{m:02d}" for y, m in zip(year.tolist(), month.tolist())]
+
+
+def max_points(width=None):
+    """Предел точек на трассу для ширины окна в пикселях"""
+    if not width:
+        return MAX_POINTS
+    return min(math.ceil(width / WIDTH_STEP) * WIDTH_STEP, MAX_POINTS)
+
+
+def relayout_range(relayout, axis='xaxis'):
+    """Видимый диапазон оси из relayoutData; None - весь ряд"""
+    if not relayout or relayout.get(f'{axis}.autorange'):
+        return None
+    if f'{axis}.range[0]' in relayout and f'{axis}.range[1]' in relayout:
+        return relayout[f'{axis}.range[0]'], relayout[f'{axis}.range[1]']
+    bounds = relayout.get(f'{axis}.range')
+    if isinstance(bounds, (list, tuple)) and len(bounds) == 2:
+        return tuple(bounds)
+    return None
+
+
+def _visible(x, x_range):
+    """Маска точек в диапазоне; None, если диапазон не от этой оси (числа против дат)"""
+    low, high = x_range
+    if x.dtype.kind in 'biuf':
+        try:
+            low, high = float(low), float(high)
+        except (TypeError, ValueError):
+            return None
+    else:
+        # Даты ISO сравниваются как строки: '2005-03' < '2005-03-15 12:00'
+        x, low, high = x.astype(str), str(low), str(high)
+    return (x >= low) & (x <= high)
+
+
+def lttb(x, y, threshold):
+    """Индексы точек по Largest-Triangle-Three-Buckets: первая, последняя и по одной из каждой корзины"""
+    count = len(x)
+    if threshold >= count or threshold < 3:
+        return np.arange(count)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # threshold - 2 корзины между первой и последней точками
+    edges = np.linspace(1, count - 1, threshold - 1).astype(np.int64)
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0], selected[-1] = 0, count - 1
+    anchor = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_start, next_end = (edges[bucket + 1], edges[bucket + 2]) if bucket + 2 < len(edges) else (count - 1, count)
+        mean_x, mean_y = x[next_start:next_end].mean(), y[next_start:next_end].mean()
+        # Площадь треугольника (опорная точка, кандидат, среднее следующей корзины)
+        area = np.abs((x[anchor] - mean_x) * (y[start:end] - y[anchor])
+                      - (x[anchor] - x[start:end]) * (mean_y - y[anchor]))
+        anchor = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        selected[bucket + 1] = anchor
+    return selected
+
+
+def reduce_points(x, y, limit=None, x_range=None):
+    """Точки упорядоченного по x ряда в окне x_range (и по одной за краями), не больше limit"""
+    x, y = np.asarray(x), np.asarray(y)
+    if x_range is not None:
+        mask = _visible(x, x_range)
+        if mask is not None and mask.any():
+            rows = np.flatnonzero(mask)
+            window = slice(max(rows[0] - 1, 0), min(rows[-1] + 2, len(x)))
+            x, y = x[window], y[window]
+    if limit and len(x) > limit:
+        # Для подписей (месяцы) точки равномерны - достаточно их номеров
+        positions = x if x.dtype.kind in 'biuf' else np.arange(len(x))
+        keep = lttb(positions, y, limit)
+        x, y = x[keep], y[keep]
+    return x, y
+
+
+def _merge(target, extra):
+    for key, value in extra.items():
+        if isinstance(value, dict) and isinstance(target.get(key), dict):
+            target[key] = {**target[key], **value}
+        else:
+            target[key] = value
+    return target
+
+
+def layout(title, x_title=None, y_title=None, legend_title=None, **extra):
+    """Layout с заголовками и общим шаблоном; extra дополняет вложенные словари"""
+    result = {'template': TEMPLATE, 'title': {'text': title}, 'margin': {'t': 60}}
+    if x_title is not None:
+        result['xaxis'] = {'title': {'text': x_title}}
+    if y_title is not None:
+        result['yaxis'] = {'title': {'text': y_title}}
+    if legend_title is not None:
+        result['legend'] = {'title': {'text': legend_title}, 'tracegroupgap': 0}
+    return _merge(result, extra)
+
+
+def figure(traces, figure_layout):
+    return {'data': list(traces), 'layout': figure_layout}
+
+
+def line_traces(x, y, groups=None, hovertemplate=HOVER_Y_VALUE, limit=None, x_range=None):
+    """Линии по группам в порядке первого появления группы (как px.line с color=).
+
+    limit и x_range прореживают каждую линию (см. reduce_points); если точек в сумме
+    больше WEBGL_POINTS, трассы рисуются через WebGL.
+    """
+    x, y = np.asarray(x), np.asarray(y)
+    if groups is None:
+        x, y = reduce_points(x, y, limit, x_range)
+        traces = [{'type': 'scatter', 'mode': 'lines', 'x': values(x), 'y': values(y),
+                   'showlegend': False, 'hovertemplate': hovertemplate}]
+        return _webgl(traces)
+
+    codes, names = pd.factorize(np.asarray(groups))
+    order = np.argsort(codes, kind='stable')
+    bounds = np.searchsorted(codes[order], np.arange(len(names) + 1))
+    traces = []
+    for number, name in enumerate(names.tolist()):
+        rows = order[bounds[number]:bounds[number + 1]]
+        trace_x, trace_y = reduce_points(x[rows], y[rows], limit, x_range)
+        traces.append({
+            'type': 'scatter', 'mode': 'lines', 'name': name, 'legendgroup': name,
+            'showlegend': True, 'x': values(trace_x), 'y': values(trace_y),
+            'hovertemplate': hovertemplate,
+        })
+    return _webgl(traces)
+
+
+def _webgl(traces):
+    if sum(len(trace['x']) for trace in traces) > WEBGL_POINTS:
+        for trace in traces:
+            trace['type'] = 'scattergl'
+    return traces
+
+
+def line_figure(x, y, groups=None, title='', x_title=YEAR_TITLE, y_title=VALUE_TITLE,
+                legend_title=None, hovertemplate=HOVER_Y_VALUE, limit=None, x_range=None, **layout_extra):
+    """Аналог px.line(x=, y=, color=) с подсказкой и шаблоном plotly_white"""
+    return figure(
+        line_traces(x, y, groups, hovertemplate, limit, x_range),
+        layout(title, x_title, y_title, legend_title if groups is not None else None, **layout_extra),
+    )
+
+
+def bar_figure(bar_values, labels, title='', value_title=VALUE_TITLE, label_title=None,
+               orientation='h', hovertemplate=HOVER_BAR_H, customdata=None, text=None, **layout_extra):
+    """Аналог px.bar с одной трассой: горизонтальной (по умолчанию) или вертикальной.
+
+    customdata и text - значения для подсказки (%{customdata}) и подписи столбцов.
+    """
+    trace = {'type': 'bar', 'orientation': orientation, 'showlegend': False,
+             'textposition': 'auto', 'hovertemplate': hovertemplate}
+    if customdata is not None:
+        trace['customdata'] = values(customdata)
+    if text is not None:
+        trace['text'] = values(text)
+    if orientation == 'h':
+        trace.update(x=values(bar_values), y=values(labels))
+        figure_layout = layout(title, value_title, label_title, **layout_extra)
+    else:
+        trace.update(x=values(labels), y=values(bar_values))
+        figure_layout = layout(title, label_title, value_title, **layout_extra)
+    return figure([trace], figure_layout)
+
+
+def pie_figure(pie_values, labels, title='', hovertemplate=None):
+    """Аналог px.pie(values=, names=)"""
+    trace = {'type': 'pie', 'values': values(pie_values), 'labels': values(labels),
+             'domain': {'x': [0.0, 1.0], 'y': [0.0, 1.0]}, 'showlegend': True}
+    if hovertemplate is not None:
+        trace['hovertemplate'] = hovertemplate
+    return figure([trace], layout(title, legend={'tracegroupgap': 0}))
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Показатели роста (CAGR, изменение год к году, скользящее среднее, волатильность)
+для всех партнеров или товарных групп сразу.
+
+Ряды раскладываются в матрицу объект × год, и каждый показатель считается
+одной векторной операцией над всей матрицей вместо цикла по рядам.
+Результаты кэшируются внутри версии данных.
+"""
+
+import numpy as np
+import pandas as pd
+
+from memory_cache import registry
+
+# Окно скользящего среднего, лет
+ROLLING_WINDOW = 3
+
+# Доля от общего объема, ниже которой объект не попадает в рейтинги (CAGR на малой базе шумит)
+MIN_SHARE = 0.001
+
+METRICS = {
+    'cagr': "CAGR, %",
+    'yoy': "Изменение за последний год, %",
+    'rolling': f"Среднее за {ROLLING_WINDOW} года, млн USD",
+    'volatility': "Волатильность роста, п.п.",
+}
+
+
+def year_matrix(frame, entity_column, year_column='year', value_column='value'):
+    """Матрица объект × год (пропуски - нули), подписи строк и годы"""
+    entities, entity_codes = np.unique(frame[entity_column].to_numpy(), return_inverse=True)
+    years, year_codes = np.unique(frame[year_column].to_numpy(), return_inverse=True)
+    matrix = np.zeros((len(entities), len(years)))
+    np.add.at(matrix, (entity_codes, year_codes), frame[value_column].to_numpy())
+    return matrix, entities, years
+
+
+def growth_metrics(matrix, years):
+    """Все показатели по матрице объект × год за один векторный проход"""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        start, end = matrix[:, 0], matrix[:, -1]
+        periods = years[-1] - years[0]
+        cagr = np.where((start > 0) & (end > 0) & (periods > 0),
+                        (end / start) ** (1.0 / max(periods, 1)) - 1, np.nan)
+
+        previous = matrix[:, :-1]
+        changes = np.where(previous > 0, matrix[:, 1:] / previous - 1, np.nan)
+        yoy = changes[:, -1] if changes.shape[1] else np.full(len(matrix), np.nan)
+
+        # Волатильность - стандартное отклонение годовых изменений
+        valid = np.isfinite(changes)
+        counts = valid.sum(axis=1)
+        filled = np.where(valid, changes, 0.0)
+        mean = filled.sum(axis=1) / counts
+        variance = np.where(valid, (changes - mean[:, None]) ** 2, 0.0).sum(axis=1) / (counts - 1)
+        volatility = np.where(counts > 1, np.sqrt(variance), np.nan)
+
+    window = min(ROLLING_WINDOW, matrix.shape[1])
+    cumulative = np.cumsum(matrix, axis=1)
+    rolling = (cumulative[:, -1] - (cumulative[:, -window - 1] if matrix.shape[1] > window else 0)) / window
+
+    return pd.DataFrame({
+        'start_value': start,
+        'end_value': end,
+        'total': matrix.sum(axis=1),
+        'cagr': cagr * 100,
+        'yoy': yoy * 100,
+        'rolling': rolling,
+        'volatility': volatility * 100,
+    })
+
+
+class GrowthAnalytics:
+    """Показатели роста одной версии данных с кэшем по параметрам запроса"""
+
+    def __init__(self, aggregates, commodity_names=None, version='', cache=None):
+        self._aggregates = aggregates
+        self._commodity_names = commodity_names
+        self._version = version
+        # Таблицы показателей живут в общем бюджете памяти воркера
+        self._cache = cache if cache is not None else registry.cache('growth')
+
+    def _series(self, kind, flow):
+        if kind == 'partners':
+            frame = self._aggregates['partner_year_flow']
+            entity_column = 'partnerName'
+        else:
+            frame = self._aggregates['commodity_year_flow']
+            entity_column = 'commodityCode'
+        if flow != 'all':
+            frame = frame[frame['flow'] == flow]
+        return frame, entity_column
+
+    def metrics(self, kind='partners', flow='all', start_year=None, end_year=None):
+        """Таблица показателей по всем объектам за период [start_year, end_year]"""
+        key = (self._version, kind, flow, start_year, end_year)
+        return self._cache.get_or_compute(key, lambda: self._metrics(kind, flow, start_year, end_year))
+
+    def _metrics(self, kind, flow, start_year, end_year):
+        frame, entity_column = self._series(kind, flow)
+        if start_year is not None:
+            frame = frame[frame['year'] >= start_year]
+        if end_year is not None:
+            frame = frame[frame['year'] <= end_year]
+        if frame.empty:
+            result = pd.DataFrame(columns=['name'] + list(METRICS))
+        else:
+            matrix, entities, years = year_matrix(frame, entity_column)
+            result = growth_metrics(matrix, years)
+            if kind == 'partners' or self._commodity_names is None:
+                result.insert(0, 'name', entities)
+            else:
+                names = self._commodity_names(entities)
+                result.insert(0, 'name', [
+                    name if isinstance(name, str) else str(code) for code, name in zip(entities, names)
+                ])
+            result['share'] = result['total'] / result['total'].sum()
+        return result
+
+    def ranking(self, metric, kind='partners', flow='all', start_year=None, end_year=None,
+                n=10, ascending=False):
+        """Лучшие (или худшие) n объектов по показателю среди заметных по объему"""
+        table = self.metrics(kind, flow, start_year, end_year)
+        if table.empty:
+            return table
+        table = table[(table['share'] >= MIN_SHARE) & table[metric].notna()]
+        return table.sort_values(metric, ascending=ascending).head(n)
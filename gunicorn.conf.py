@@ -0,0 +1,24 @@
+# -*- coding: utf-8 -*-
+"""
+Конфигурация gunicorn по умолчанию (читается автоматически из рабочего каталога).
+
+Данные дашборда - неизменяемый снимок, общий для потоков воркера, поэтому
+поддерживаются потоковые воркеры: gthread (по умолчанию) и gevent, если он
+установлен. Потоки дают параллельные запросы без копии данных на каждый процесс.
+Проверка потокобезопасности callback'ов: python code/check_concurrency.py
+"""
+
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8050')}"
+
+workers = int(os.environ.get('DASHBOARD_WORKERS', '2'))
+worker_class = os.environ.get('DASHBOARD_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('DASHBOARD_THREADS', '4'))
+# Для gevent - число одновременных соединений на воркер
+worker_connections = int(os.environ.get('DASHBOARD_WORKER_CONNECTIONS', '100'))
+
+# Данные загружаются в фоновом потоке каждого воркера; preload переносит
+# загрузку в мастер, а потоки не переживают fork
+preload_app = False
+timeout = int(os.environ.get('DASHBOARD_WORKER_TIMEOUT', '120'))
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+HTTP-кэширование JSON с данными: ETag по содержимому файла, Cache-Control и ответы 304
+"""
+
+import hashlib
+import os
+
+from flask import abort, send_file
+
+CACHE_MAX_AGE = int(os.environ.get('DASHBOARD_CACHE_MAX_AGE', '0'))
+
+# Отпечатки статических файлов: путь -> ((mtime, размер), хэш)
+_fingerprints = {}
+
+
+def file_fingerprint(paths):
+    """Хэш содержимого файлов - версия датасета"""
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()[:16]
+
+
+def cache_control(max_age=CACHE_MAX_AGE):
+    """Значение Cache-Control: хранить можно, но перед использованием сверять ETag"""
+    return f"public, max-age={max_age}, must-revalidate"
+
+
+def install_http_cache(server, static_files=None):
+    """Раздает JSON с данными по GET с ETag по содержимому и Cache-Control.
+
+    static_files - словарь {URL: путь к файлу}. Ответы callback'ов не кэшируются:
+    это POST, а браузер и dash-renderer не отправляют для них If-None-Match и не
+    обрабатывают 304, поэтому повторные запросы callback'ов закрывает общий кэш результатов.
+    """
+    for url, path in (static_files or {}).items():
+        register_static_file(server, url, path)
+
+
+def register_static_file(server, url, path):
+    """Раздает файл с ETag по его содержимому и поддержкой условных запросов"""
+
+    def serve_static_file():
+        if not os.path.isfile(path):
+            abort(404)
+
+        # Пересчитываем хэш только если файл изменился
+        stat = os.stat(path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        cached = _fingerprints.get(path)
+        if cached is None or cached[0] != signature:
+            cached = _fingerprints[path] = (signature, file_fingerprint([path]))
+
+        response = send_file(
+            os.path.abspath(path),
+            etag=cached[1],
+            conditional=True,
+            max_age=CACHE_MAX_AGE
+        )
+        response.headers['Cache-Control'] = cache_control()
+        return response
+
+    server.add_url_rule(url, endpoint=f"static_file:{url}", view_func=serve_static_file)
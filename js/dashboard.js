@@ -1,5 +1,6 @@
 // Глобальные переменные для данных и графиков
 let tradeData = null;
+let regionAggregates = null;
 let charts = {};
 
 // Цветовая схема CYBORG
@@ -26,6 +27,7 @@ async function loadTradeData() {
         const response = await fetch('data/trade_data.json');
         tradeData = await response.json();
         console.log('Данные загружены:', tradeData);
+        regionAggregates = await loadRegionAggregates();
         
         // Инициализация всех компонентов
         initializeDashboard();
@@ -35,6 +37,16 @@ async function loadTradeData() {
     }
 }
 
+// Предрассчитанные агрегаты по регионам (необязательный файл конвейера)
+async function loadRegionAggregates() {
+    try {
+        const response = await fetch('data/region_aggregates.json');
+        return response.ok ? await response.json() : null;
+    } catch (error) {
+        return null;
+    }
+}
+
 // Инициализация дашборда
 function initializeDashboard() {
     updateKPICards();
@@ -395,7 +407,26 @@ function createGeographyChart() {
     updateGeographyChart('all');
 }
 
-function updateGeographyChart(flowType) {
+// Итоги регионов из region_aggregates.json без прохода по всем странам
+function precomputedRegionTotals(flowType) {
+    const regionData = {};
+    if (flowType === 'all') {
+        regionAggregates.region_totals.forEach(d => {
+            regionData[d.world_part] = d.trade_value_mln_usd;
+        });
+    } else {
+        const flowName = flowType === 'export' ? 'Экспорт' : 'Импорт';
+        regionAggregates.region_flow
+            .filter(d => d.flow_name === flowName)
+            .forEach(d => {
+                regionData[d.world_part] = d.trade_value_mln_usd;
+            });
+    }
+    return regionData;
+}
+
+// Итоги регионов по geography_data из trade_data.json
+function aggregateRegionTotals(flowType) {
     const geoData = tradeData.geography_data;
     let processedData;
     
@@ -434,6 +465,15 @@ function updateGeographyChart(flowType) {
         regionData[d.world_part] += d.total;
     });
     
+    return regionData;
+}
+
+function updateGeographyChart(flowType) {
+    // Готовые итоги регионов, если собран region_aggregates.json, иначе - агрегация по странам
+    const regionData = regionAggregates
+        ? precomputedRegionTotals(flowType)
+        : aggregateRegionTotals(flowType);
+    
     const regions = Object.keys(regionData);
     const values = Object.values(regionData);
     
@@ -809,10 +849,30 @@ function updateRegionsList(regionData) {
         <div class="country-card">
             <strong>${region}</strong><br>
             <span class="text-info">${formatNumber(value)} млн USD</span>
+            ${regionCountriesList(region)}
         </div>
     `).join('');
 }
 
+// Раскрытие региона: крупнейшие страны из region_aggregates.json
+function regionCountriesList(region) {
+    if (!regionAggregates) return '';
+    
+    const totals = {};
+    regionAggregates.region_countries
+        .filter(d => d.world_part === region)
+        .forEach(d => {
+            totals[d.country_name] = (totals[d.country_name] || 0) + d.trade_value_mln_usd;
+        });
+    const top = Object.entries(totals)
+        .sort(([,a], [,b]) => b - a)
+        .slice(0, 3);
+    
+    return top.length
+        ? `<br><small>${top.map(([country]) => country).join(', ')}</small>`
+        : '';
+}
+
 function populateStructureLists() {
     // Симуляция данных для новых и утративших значимость товаров
     const newItems = [
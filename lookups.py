@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Плотные таблицы поиска по числовым кодам стран и товаров.
+
+Справочник раскладывается в массивы NumPy, где позиция равна коду, поэтому
+названия для целой колонки кодов получаются одним векторизованным take
+вместо словаря с Series.map или merge по DataFrame. Последняя ячейка массива
+хранит значение по умолчанию: в нее попадают неизвестные и некорректные коды.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+# Названия партнеров, которые заменяются после разрешения кодов по справочнику
+PARTNER_OVERRIDES = {
+    842: 'США',
+    579: 'Норвегия',
+}
+
+
+def to_codes(values):
+    """Числовые коды из колонки любого типа; нечисловые значения становятся NaN"""
+    return pd.to_numeric(pd.Series(values, copy=False), errors='coerce').to_numpy(dtype='float64')
+
+
+def hs_chapter(values):
+    """Глава ТН ВЭД (первые две цифры) по коду любого уровня: 2, 4 или 6 знаков.
+
+    Коды читаются из CSV числами и теряют ведущий ноль (010121 -> 10121), поэтому
+    уровень кода - число его цифр, округленное вверх до четного. Нечисловые коды - NaN.
+    """
+    codes = to_codes(values)
+    valid = codes > 0
+    digits = np.floor(np.log10(np.where(valid, codes, 1))) + 1
+    level = digits + digits % 2
+    return np.where(valid, np.floor(codes / 10 ** (level - 2)), np.nan)
+
+
+class CodeLookup:
+    """Справочник в виде плотных массивов, индексированных кодом"""
+
+    def __init__(self, codes, columns, defaults=None):
+        defaults = defaults or {}
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) and codes.min() < 0:
+            raise ValueError("Коды справочника должны быть неотрицательными")
+
+        self.size = int(codes.max()) + 1 if len(codes) else 0
+        self.known = np.zeros(self.size + 1, dtype=bool)
+        self.known[codes] = True
+        self.columns = {}
+        self.dtypes = {}
+        for name, values in columns.items():
+            self._set_column(name, codes, values, defaults.get(name))
+
+    def _set_column(self, name, codes, values, default=None):
+        values = pd.Series(values, copy=False)
+        if pd.api.types.is_numeric_dtype(values) and default is None:
+            # Как после merge: целые с пропусками становятся float, без пропусков остаются целыми
+            array = np.full(self.size + 1, np.nan)
+            self.dtypes[name] = values.dtype
+        else:
+            array = np.full(self.size + 1, default, dtype=object)
+        array[codes] = values.to_numpy()
+        self.columns[name] = array
+
+    @classmethod
+    def from_frame(cls, frame, code_column, columns, defaults=None):
+        """Справочник из DataFrame: некорректные и повторные коды отбрасываются"""
+        codes = to_codes(frame[code_column])
+        valid = ~np.isnan(codes) & (codes >= 0)
+        frame = frame[valid].assign(**{code_column: codes[valid].astype(np.int64)})
+        frame = frame.drop_duplicates(code_column, keep='first')
+        return cls(
+            frame[code_column].to_numpy(),
+            {name: frame[source].to_numpy() for name, source in columns.items()},
+            defaults,
+        )
+
+    def slots(self, codes):
+        """Позиции в массивах для колонки кодов (неизвестные - последняя ячейка)"""
+        codes = to_codes(codes)
+        valid = ~np.isnan(codes) & (codes >= 0) & (codes < self.size)
+        slots = np.full(len(codes), self.size, dtype=np.intp)
+        slots[valid] = codes[valid].astype(np.intp)
+        return slots
+
+    def contains(self, codes):
+        return self.known.take(self.slots(codes))
+
+    def take(self, codes, column, slots=None):
+        """Значения одной колонки справочника для всех кодов сразу"""
+        if slots is None:
+            slots = self.slots(codes)
+        values = self.columns[column].take(slots)
+        dtype = self.dtypes.get(column)
+        if dtype is not None and not np.isnan(values).any():
+            values = values.astype(dtype)
+        return values
+
+    def resolve(self, codes, columns=None, names=None):
+        """Несколько колонок справочника как DataFrame в порядке кодов"""
+        slots = self.slots(codes)
+        columns = columns or list(self.columns)
+        names = names or {}
+        index = codes.index if isinstance(codes, pd.Series) else None
+        return pd.DataFrame(
+            {names.get(column, column): self.take(None, column, slots) for column in columns},
+            index=index,
+        )
+
+    def update(self, codes, columns):
+        """Перекрывает значения для указанных кодов, расширяя массивы при необходимости"""
+        codes = np.asarray(codes, dtype=np.int64)
+        if len(codes) and codes.max() >= self.size:
+            self._grow(int(codes.max()) + 1)
+        self.known[codes] = True
+        for name, values in columns.items():
+            self.columns[name][codes] = values
+        return self
+
+    def _grow(self, size):
+        for name, array in self.columns.items():
+            grown = np.full(size + 1, array[-1], dtype=array.dtype)
+            grown[:self.size] = array[:self.size]
+            self.columns[name] = grown
+        known = np.zeros(size + 1, dtype=bool)
+        known[:self.size] = self.known[:self.size]
+        self.known = known
+        self.size = size
+
+
+def country_lookup(countries):
+    """Справочник стран: name, iso3, world_part по коду партнера.
+
+    Идентификаторы приводятся к числам, поэтому повторная строка заголовка
+    в countries.csv не превращает всю колонку id в строки.
+    """
+    return CodeLookup.from_frame(
+        countries, 'id',
+        {'name': 'text', 'iso3': 'reporterCodeIsoAlpha3', 'world_part': 'world_part'},
+    )
+
+
+def override_partner_names(codes, names):
+    """Названия партнеров с заменами из PARTNER_OVERRIDES"""
+    codes = to_codes(codes)
+    names = np.array(names, dtype=object)
+    for code, name in PARTNER_OVERRIDES.items():
+        names[codes == code] = name
+    return names
+
+
+def mapping_lookup(country_mapping):
+    """Справочник из country_mapping.csv конвейера: country_name и world_part по partnerCode"""
+    return CodeLookup.from_frame(
+        country_mapping, 'partnerCode',
+        {'country_name': 'country_name', 'world_part': 'world_part'},
+    )
+
+
+def commodity_lookup(commodities):
+    """Справочник товаров: id, name, sector по коду товарной группы"""
+    return CodeLookup.from_frame(
+        commodities, 'id',
+        {'id': 'id', 'name': 'text', 'sector': 'sector'},
+    )
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общий бюджет памяти для всех кэшей внутри воркера.
+
+Каждый кэш (результаты callback'ов, показатели роста и т.п.) регистрируется в одном
+реестре, который знает примерный размер каждой записи в байтах. Когда сумма превышает
+бюджет (DASHBOARD_MEMORY_BUDGET_MB), вытесняются записи по GreedyDual-Size: приоритет
+записи - время ее вычисления на байт плюс "часы" реестра, которые растут при каждом
+вытеснении. Дешевые и большие записи уходят первыми, дорогие и маленькие живут дольше,
+а давно не использованные постепенно теряют преимущество (как в LRU).
+
+Агрегаты и индексы версии данных не вытесняются, но учитываются в занятой памяти.
+"""
+
+import heapq
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+MEMORY_BUDGET = int(float(os.environ.get('DASHBOARD_MEMORY_BUDGET_MB', '256')) * 1024 * 1024)
+
+# Минимальная стоимость записи, с: чтобы мгновенные результаты не получали нулевой приоритет
+MIN_COST = 1e-4
+
+# Куча перестраивается, когда устаревших элементов в ней больше, чем живых, во столько раз
+HEAP_SLACK = 4
+
+
+def approx_size(value, _seen=None):
+    """Примерный размер значения в байтах: DataFrame, массивы, фигуры-словари и вложенные контейнеры"""
+    if _seen is None:
+        _seen = set()
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(approx_size(item, _seen) for item in value.ravel())
+        return value.nbytes
+    if isinstance(value, Mapping):
+        return sys.getsizeof(value) + sum(
+            approx_size(key, _seen) + approx_size(item, _seen) for key, item in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sys.getsizeof(value) + sum(approx_size(item, _seen) for item in value)
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        return sys.getsizeof(value) + approx_size(vars(value), _seen)
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'cost', 'priority')
+
+    def __init__(self, value, size, cost):
+        self.value = value
+        self.size = size
+        self.cost = cost
+        self.priority = 0.0
+
+
+class MemoryCache:
+    """Именованный кэш, память которого учитывается в общем реестре"""
+
+    def __init__(self, registry, name):
+        self.name = name
+        self._registry = registry
+        self._entries = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def bytes(self):
+        return self._bytes
+
+    def get(self, key, default=None):
+        with self._registry.lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._registry.touch(self, key, entry)
+            return entry.value
+
+    def put(self, key, value, cost=0.0):
+        """Кладет значение; cost - сколько секунд стоило его получить"""
+        size = max(approx_size(value), 1)
+        with self._registry.lock:
+            self._remove(key)
+            if size > self._registry.budget:
+                # Запись больше всего бюджета не кэшируем
+                return value
+            entry = _Entry(value, size, max(cost, MIN_COST))
+            self._entries[key] = entry
+            self._bytes += size
+            self._registry.touch(self, key, entry)
+            self._registry.enforce()
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Значение из кэша или результат compute(), сохраненный с его стоимостью"""
+        with self._registry.lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self.hits += 1
+                self._registry.touch(self, key, entry)
+                return entry.value
+            self.misses += 1
+        start = time.perf_counter()
+        value = compute()
+        return self.put(key, value, time.perf_counter() - start)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+        return entry
+
+    def clear(self):
+        with self._registry.lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        requests = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self.bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / requests, 4) if requests else None,
+            'evictions': self.evictions,
+        }
+
+
+class CacheRegistry:
+    """Реестр кэшей воркера с общим бюджетом памяти и вытеснением GreedyDual-Size"""
+
+    def __init__(self, budget=MEMORY_BUDGET):
+        self.budget = budget
+        self.lock = threading.RLock()
+        self._caches = {}
+        self._pinned = {}
+        self._heap = []
+        self._clock = 0.0
+        self._order = itertools.count()
+
+    def cache(self, name):
+        """Кэш с указанным именем (создается при первом обращении)"""
+        with self.lock:
+            if name not in self._caches:
+                self._caches[name] = MemoryCache(self, name)
+            return self._caches[name]
+
+    def pin(self, name, value):
+        """Учитывает невытесняемое значение (агрегаты, индексы версии данных); то же имя заменяется"""
+        with self.lock:
+            # Ссылки на другие учтенные значения (например, индекс на агрегаты) не считаем дважды
+            shared = {ident for other, (_, ident) in self._pinned.items() if other != name}
+            self._pinned[name] = (approx_size(value, shared), id(value))
+            if self.pinned_bytes > self.budget:
+                logger.warning("Данные версии (%.0f МБ) больше бюджета памяти кэшей (%.0f МБ)",
+                               self.pinned_bytes / 2 ** 20, self.budget / 2 ** 20)
+            self.enforce()
+        return value
+
+    @property
+    def pinned_bytes(self):
+        return sum(size for size, _ in self._pinned.values())
+
+    @property
+    def used_bytes(self):
+        return self.pinned_bytes + sum(cache.bytes for cache in self._caches.values())
+
+    def touch(self, cache, key, entry):
+        """Обновляет приоритет записи после обращения к ней"""
+        entry.priority = self._clock + entry.cost / entry.size
+        heapq.heappush(self._heap, (entry.priority, next(self._order), cache.name, key))
+        live = sum(len(item) for item in self._caches.values())
+        if len(self._heap) > HEAP_SLACK * (live + 16):
+            self._rebuild_heap()
+
+    def _rebuild_heap(self):
+        self._heap = [
+            (entry.priority, next(self._order), cache.name, key)
+            for cache in self._caches.values()
+            for key, entry in cache._entries.items()
+        ]
+        heapq.heapify(self._heap)
+
+    def enforce(self):
+        """Вытесняет записи с наименьшим приоритетом, пока не уложимся в бюджет"""
+        used = self.used_bytes
+        while used > self.budget and self._heap:
+            priority, _, name, key = heapq.heappop(self._heap)
+            cache = self._caches[name]
+            entry = cache._entries.get(key)
+            if entry is None or entry.priority != priority:
+                # Устаревший элемент кучи: запись удалена или к ней уже обращались
+                continue
+            cache._remove(key)
+            cache.evictions += 1
+            used -= entry.size
+            self._clock = priority
+
+    def stats(self):
+        """Занятая память, попадания и вытеснения по каждому кэшу"""
+        with self.lock:
+            return {
+                'budget_bytes': self.budget,
+                'used_bytes': self.used_bytes,
+                'pinned_bytes': {name: size for name, (size, _) in self._pinned.items()},
+                'caches': {name: cache.stats() for name, cache in self._caches.items()},
+            }
+
+
+# Один реестр на процесс: все кэши воркера делят его бюджет
+registry = CacheRegistry()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Таблицы партнеров и товарных групп с постраничным выводом и сортировкой на сервере.
+
+Таблица строится один раз на версию данных из агрегатов. Для каждого ключа
+сортировки (столбцы и направления) один раз считается перестановка строк
+(argsort) и кэшируется в общем бюджете памяти, после чего страница - это срез
+перестановки и выборка строк по нему. В браузер уходит только видимая страница,
+поэтому размер ответа не зависит от числа партнеров и товаров.
+"""
+
+import math
+
+import numpy as np
+import pandas as pd
+
+from memory_cache import registry
+
+KINDS = {
+    'partners': "Партнеры",
+    'commodities': "Товарные группы",
+}
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 200
+
+# Подписи столбцов; числовые (кроме кодов) форматируются в DataTable
+COLUMNS = {
+    'code': "Код",
+    'name': "Название",
+    'export': "Экспорт, млн USD",
+    'import': "Импорт, млн USD",
+    'total': "Товарооборот, млн USD",
+    'balance': "Сальдо, млн USD",
+    'share': "Доля, %",
+}
+TEXT_COLUMNS = {'code', 'name'}
+
+
+def flow_table(frame, key_column):
+    """Экспорт, импорт, оборот, сальдо и доля по ключу; по убыванию оборота"""
+    flows = frame.pivot_table(index=key_column, columns='flow', values='value', aggfunc='sum', fill_value=0.0,
+                             observed=True)
+    flows = flows.reindex(columns=['E', 'I'], fill_value=0.0).astype(float)
+    table = pd.DataFrame({'export': flows['E'], 'import': flows['I']})
+    table['total'] = table['export'] + table['import']
+    table['balance'] = table['export'] - table['import']
+    grand_total = table['total'].sum()
+    table['share'] = table['total'] / grand_total * 100 if grand_total else 0.0
+    return table.sort_values('total', ascending=False, kind='stable')
+
+
+class PagedTable:
+    """Таблица с кэшем перестановок по ключу сортировки"""
+
+    def __init__(self, name, frame, version='', cache=None):
+        self.name = name
+        self.frame = frame.reset_index(drop=True)
+        self.version = version
+        self._cache = cache if cache is not None else registry.cache('table-order')
+
+    def __len__(self):
+        return len(self.frame)
+
+    @property
+    def columns(self):
+        return list(self.frame.columns)
+
+    def sort_key(self, sort_by):
+        """Ключ сортировки из sort_by DataTable; неизвестные столбцы пропускаются"""
+        return tuple(
+            (item['column_id'], item.get('direction') != 'desc')
+            for item in sort_by or []
+            if item.get('column_id') in self.frame.columns
+        )
+
+    def order(self, key):
+        """Перестановка строк для ключа сортировки (None - исходный порядок, по убыванию оборота)"""
+        if not key:
+            return None
+        cache_key = (self.version, self.name, key)
+        return self._cache.get_or_compute(cache_key, lambda: self._argsort(key))
+
+    def _argsort(self, key):
+        columns = [column for column, _ in key]
+        ascending = [ascending for _, ascending in key]
+        # Пропуски всегда в конце, равные значения сохраняют исходный порядок
+        ordered = self.frame[columns].sort_values(columns, ascending=ascending, kind='stable', na_position='last')
+        return ordered.index.to_numpy(dtype=np.int64)
+
+    def page(self, page_current=0, page_size=DEFAULT_PAGE_SIZE, sort_by=None):
+        """Строки страницы и число страниц"""
+        page_size = min(max(int(page_size or DEFAULT_PAGE_SIZE), 1), MAX_PAGE_SIZE)
+        page_count = max(math.ceil(len(self.frame) / page_size), 1)
+        page_current = min(max(int(page_current or 0), 0), page_count - 1)
+
+        start = page_current * page_size
+        order = self.order(self.sort_key(sort_by))
+        rows = np.arange(start, min(start + page_size, len(self.frame))) if order is None else order[start:start + page_size]
+        page = self.frame.take(rows)
+        return page.astype(object).where(page.notna(), None).to_dict('records'), page_count
+
+
+def build_tables(aggregates, commodity_names, version=''):
+    """Таблицы партнеров и товарных групп из агрегатов версии данных"""
+    partners = flow_table(aggregates['partner_year_flow'], 'partnerName')
+    partners = partners.rename_axis('name').reset_index()
+
+    commodities = flow_table(aggregates['commodity_flow'], 'commodityCode')
+    codes = commodities.index.to_numpy()
+    commodities = commodities.reset_index(drop=True)
+    commodities.insert(0, 'name', pd.Series(commodity_names(codes), dtype=object).fillna('').astype(str).to_numpy())
+    commodities.insert(0, 'code', codes)
+
+    numeric = ['export', 'import', 'total', 'balance', 'share']
+    return {
+        'partners': PagedTable('partners', partners.round({column: 2 for column in numeric}), version),
+        'commodities': PagedTable('commodities', commodities.round({column: 2 for column in numeric}), version),
+    }
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Выборочное профилирование запросов _dash-update-component в рабочем окружении.
+
+Профилируется доля запросов (DASHBOARD_PROFILE_RATE) и любой запрос, который
+выполняется дольше порога (DASHBOARD_PROFILE_SLOW_MS). Профилировщик не
+инструментирует код: один фоновый поток раз в несколько миллисекунд снимает стек
+потоков, которые обрабатывают отмеченные запросы. При заданном пороге стеки
+снимаются с начала каждого запроса, а в конце профиль сохраняется, только если
+запрос попал в выборку или оказался медленным: так в профиль попадает и та часть
+запроса, которая прошла до порога.
+
+Результат - файлы в формате collapsed stacks (flamegraph.pl, speedscope) с
+метаданными рядом: callback, входы, длительность. Старые файлы удаляются.
+"""
+
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+from flask import g, request
+
+logger = logging.getLogger(__name__)
+
+CALLBACK_PATH = '/_dash-update-component'
+
+PROFILE_ENABLED = os.environ.get('DASHBOARD_PROFILE', '0') == '1'
+PROFILE_RATE = float(os.environ.get('DASHBOARD_PROFILE_RATE', '0.01'))
+# Запросы дольше порога профилируются всегда (0 - только выборка)
+PROFILE_SLOW_MS = float(os.environ.get('DASHBOARD_PROFILE_SLOW_MS', '1000'))
+PROFILE_INTERVAL_MS = float(os.environ.get('DASHBOARD_PROFILE_INTERVAL_MS', '5'))
+PROFILE_DIR = os.environ.get('DASHBOARD_PROFILE_DIR', '.profiles')
+# Сколько профилей хранить: более старые удаляются
+PROFILE_KEEP = int(os.environ.get('DASHBOARD_PROFILE_KEEP', '200'))
+
+# Длина строки с входами callback'а в метаданных
+MAX_INPUTS_LENGTH = 2000
+
+
+def frame_name(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """Стек кадра от корня к вершине в виде 'a;b;c'"""
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class _Profile:
+    """Профиль одного запроса"""
+
+    def __init__(self, thread_id, sampled):
+        self.thread_id = thread_id
+        self.sampled = sampled
+        self.start = time.perf_counter()
+        self.stacks = Counter()
+
+
+class Sampler:
+    """Фоновый поток, снимающий стеки потоков с отмеченными запросами"""
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000, slow_after=PROFILE_SLOW_MS / 1000):
+        self.interval = interval
+        # Порог медленного запроса: решает, сохранять ли профиль, а не когда начинать сэмплирование
+        self.slow_after = slow_after
+        self._active = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self, sampled):
+        """Начинает профиль запроса в текущем потоке"""
+        profile = _Profile(threading.get_ident(), sampled)
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+        return profile
+
+    def stop(self, profile):
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+        return time.perf_counter() - profile.start
+
+    def keep(self, profile, duration):
+        """Сохранять ли профиль: запрос из выборки или медленнее порога"""
+        return profile.sampled or bool(self.slow_after) and duration >= self.slow_after
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while True:
+            # Стеки снимаются под блокировкой: после stop() профиль запроса больше не меняется
+            with self._lock:
+                active = list(self._active.values())
+                if not active:
+                    self._wakeup.clear()
+                frames = sys._current_frames() if active else {}
+                for profile in active:
+                    frame = frames.get(profile.thread_id)
+                    if frame is not None and profile.thread_id != own_id:
+                        profile.stacks[collapse(frame)] += 1
+                del frames
+            if not active:
+                # Нет запросов - спим до следующего
+                self._wakeup.wait()
+                continue
+            time.sleep(self.interval)
+
+
+def rotate(directory, keep=PROFILE_KEEP):
+    """Оставляет keep последних профилей (вместе с их метаданными)"""
+    profiles = sorted(
+        (entry for entry in os.scandir(directory) if entry.name.endswith('.collapsed')),
+        key=lambda entry: entry.stat().st_mtime
+    )
+    for entry in profiles[:max(len(profiles) - keep, 0)]:
+        for path in (entry.path, entry.path[:-len('.collapsed')] + '.json'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def write_profile(directory, profile, duration, meta, keep=PROFILE_KEEP):
+    """Пишет collapsed stacks и метаданные; возвращает путь к профилю"""
+    os.makedirs(directory, exist_ok=True)
+    now = time.time()
+    stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(now)) + f'.{int(now * 1000) % 1000:03d}'
+    output = str(meta.get('callback') or 'request').strip('.').replace('/', '_').replace('.', '-')[:80]
+    base = os.path.join(directory, f"{stamp}-{int(duration * 1000)}ms-{os.getpid()}-{output}")
+
+    with open(base + '.collapsed', 'w', encoding='utf-8') as f:
+        for stack, count in profile.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    with open(base + '.json', 'w', encoding='utf-8') as f:
+        json.dump(dict(meta, duration_ms=round(duration * 1000, 1), samples=sum(profile.stacks.values()),
+                       sampled=profile.sampled), f, ensure_ascii=False, indent=2)
+    rotate(directory, keep)
+    return base + '.collapsed'
+
+
+def request_meta():
+    """Callback и его входы из тела запроса Dash"""
+    payload = request.get_json(silent=True) or {}
+    inputs = json.dumps(
+        [payload.get('inputs'), payload.get('state')], ensure_ascii=False, default=str
+    )
+    return {
+        'callback': payload.get('output'),
+        'inputs': inputs[:MAX_INPUTS_LENGTH],
+        'path': request.full_path,
+    }
+
+
+def install_profiler(server, enabled=PROFILE_ENABLED, rate=PROFILE_RATE,
+                     directory=PROFILE_DIR, sampler=None):
+    """Подключает профилирование callback'ов; без DASHBOARD_PROFILE=1 ничего не делает"""
+    if not enabled:
+        return None
+    sampler = sampler or Sampler()
+    logger.info("Профилирование callback'ов: доля %.3f, порог %.0f мс, каталог %s",
+                rate, sampler.slow_after * 1000, directory)
+
+    @server.before_request
+    def start_profile():
+        if request.path != CALLBACK_PATH:
+            return None
+        sampled = random.random() < rate
+        if sampled or sampler.slow_after:
+            g.profile = sampler.start(sampled)
+        return None
+
+    @server.teardown_request
+    def finish_profile(exc):
+        profile = g.pop('profile', None)
+        if profile is None:
+            return
+        duration = sampler.stop(profile)
+        # Стеки быстрых запросов вне выборки просто отбрасываются
+        if not profile.stacks or not sampler.keep(profile, duration):
+            return
+        try:
+            write_profile(directory, profile, duration, request_meta())
+        except OSError:
+            logger.exception("Не удалось записать профиль в %s", directory)
+
+    return sampler
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Зеркальная статистика: экспорт Финляндии в страну X против импорта страны X
+из Финляндии (и наоборот) по годам и товарным главам.
+
+Строки всех отчитывающихся стран один раз сворачиваются до ключа
+(отчитывающаяся страна, партнер, год, глава, поток), и ключ кодируется одним
+целым числом (смешанная система счисления). Ключи сортируются, и зеркальная
+пара каждой строки находится векторным бинарным поиском по массиву ключей:
+у пары переставлены страны и поток, остальные части ключа те же. Сопоставление
+строится один раз на версию данных, запрос только вырезает отрезок по партнеру
+и году из упорядоченной по ключу таблицы.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from lookups import hs_chapter, to_codes
+
+# Отчитывающаяся страна дашборда (246 - Финляндия); остальные страны - источник зеркальных данных
+HOME_REPORTER = int(os.environ.get('DASHBOARD_REPORTER', '246'))
+
+FLOWS = ('E', 'I')
+
+# Основания частей ключа: коды стран Comtrade трехзначные, главы ТН ВЭД двузначные
+COUNTRY_BASE = 1000
+CHAPTER_BASE = 100
+
+KEY_COLUMNS = ['reporterCode', 'partnerCode', 'year', 'chapter', 'flow']
+
+
+def chapter_flows(trade_df, home=HOME_REPORTER):
+    """Строки, у которых может быть зеркальная пара, свернутые до глав.
+
+    Отчеты home о торговле со всеми партнерами и отчеты других стран о торговле с home.
+    """
+    reporter = to_codes(trade_df['reporterCode'])
+    partner = to_codes(trade_df['partnerCode'])
+    rows = ((reporter == home) | (partner == home)) & trade_df['flow'].isin(FLOWS).to_numpy()
+    rows &= (partner != reporter) & (partner < COUNTRY_BASE) & (reporter < COUNTRY_BASE)
+    # Глава ТН ВЭД кода товара любого уровня, как у секторов дашборда
+    chapter = hs_chapter(trade_df['commodityCode'])
+    rows &= ~np.isnan(chapter)
+    frame = trade_df[rows].assign(chapter=chapter[rows])
+    flows = frame.groupby(KEY_COLUMNS)['value'].sum().reset_index()
+    return flows.astype({'reporterCode': np.int64, 'partnerCode': np.int64, 'year': np.int64, 'chapter': np.int64})
+
+
+class MirrorIndex:
+    """Сопоставление отчетов home с зеркальными отчетами партнеров по составному ключу"""
+
+    def __init__(self, flows, home=HOME_REPORTER, partner_names=None):
+        self.home = home
+        years = flows['year'].to_numpy(dtype=np.int64)
+        self.base_year = int(years.min()) if len(years) else 0
+        self.year_span = int(years.max()) - self.base_year + 1 if len(years) else 1
+
+        reporter = flows['reporterCode'].to_numpy(dtype=np.int64)
+        partner = flows['partnerCode'].to_numpy(dtype=np.int64)
+        chapter = flows['chapter'].to_numpy(dtype=np.int64)
+        export = (flows['flow'].to_numpy() == 'E').astype(np.int64)
+        values = flows['value'].to_numpy(dtype=float)
+
+        # Ключи всех строк по возрастанию: после groupby они уникальны
+        keys = self.key(reporter, partner, years, chapter, export)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys, sorted_values = keys[order], values[order]
+
+        # Зеркальная пара: страны меняются местами, экспорт становится импортом
+        mirror_keys = self.key(partner, reporter, years, chapter, 1 - export)
+        position = np.minimum(np.searchsorted(sorted_keys, mirror_keys), max(len(sorted_keys) - 1, 0))
+        found = sorted_keys[position] == mirror_keys
+        mirror = np.where(found, sorted_values[position], np.nan)
+
+        # Строки home - с зеркалом или без; строки партнеров - только те, которых нет у home
+        own = reporter == home
+        other = ~own & ~found
+        table = pd.DataFrame({
+            'partnerCode': np.concatenate([partner[own], reporter[other]]),
+            'year': np.concatenate([years[own], years[other]]),
+            'chapter': np.concatenate([chapter[own], chapter[other]]),
+            'export': np.concatenate([export[own], 1 - export[other]]),
+            'reported': np.concatenate([values[own], np.full(other.sum(), np.nan)]),
+            'mirror': np.concatenate([mirror[own], values[other]]),
+        })
+        table['discrepancy'] = table['reported'] - table['mirror']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            table['discrepancy_pct'] = table['discrepancy'] / table['mirror'] * 100
+        table['flow'] = np.where(table['export'] == 1, 'E', 'I')
+
+        # Таблица упорядочена по ключу с точки зрения home: партнер и год - непрерывные отрезки
+        table_keys = self.key(home, table['partnerCode'].to_numpy(), table['year'].to_numpy(),
+                              table['chapter'].to_numpy(), table['export'].to_numpy())
+        order = np.argsort(table_keys, kind='stable')
+        self._keys = table_keys[order]
+        self.table = table.take(order).drop(columns='export').reset_index(drop=True)
+
+        partners = np.unique(self.table.loc[self.table['reported'].notna() & self.table['mirror'].notna(),
+                                            'partnerCode'].to_numpy())
+        names = partner_names(partners) if partner_names is not None and len(partners) else partners.astype(str)
+        self.partners = {code: str(name) or str(code) for code, name in zip(partners.tolist(), names)}
+
+    def key(self, reporter, partner, year, chapter, export):
+        """Составной ключ (страна, партнер, год, глава, поток) одним int64"""
+        key = np.asarray(reporter, dtype=np.int64) * COUNTRY_BASE + np.asarray(partner, dtype=np.int64)
+        key = key * self.year_span + (np.asarray(year, dtype=np.int64) - self.base_year)
+        key = key * CHAPTER_BASE + np.asarray(chapter, dtype=np.int64)
+        return key * 2 + np.asarray(export, dtype=np.int64)
+
+    @property
+    def years(self):
+        return sorted(self.table['year'].unique().tolist())
+
+    def _range(self, partner, first_year, last_year):
+        """Строки партнера за годы first_year..last_year: отрезок упорядоченной таблицы"""
+        first_year = min(max(first_year, self.base_year), self.base_year + self.year_span)
+        last_year = min(max(last_year, self.base_year - 1), self.base_year + self.year_span - 1)
+        low = self.key(self.home, partner, first_year, 0, 0)
+        high = self.key(self.home, partner, last_year + 1, 0, 0)
+        start, end = np.searchsorted(self._keys, [low, high])
+        return self.table.iloc[start:end]
+
+    def chapters(self, partner, year, flow):
+        """Главы одного года и потока с расхождениями, крупные расхождения первыми"""
+        rows = self._range(partner, year, year)
+        rows = rows[rows['flow'] == flow]
+        return rows.iloc[np.argsort(-rows['discrepancy'].abs().fillna(-1).to_numpy(), kind='stable')]
+
+    def yearly(self, partner, flow):
+        """Итоги по годам: отчет home, зеркальный отчет и расхождение (только сопоставленные главы)"""
+        rows = self._range(partner, self.base_year, self.base_year + self.year_span - 1)
+        rows = rows[(rows['flow'] == flow) & rows['reported'].notna() & rows['mirror'].notna()]
+        totals = rows.groupby('year')[['reported', 'mirror']].sum()
+        totals['discrepancy'] = totals['reported'] - totals['mirror']
+        return totals.reset_index()
+
+
+def build_mirror_index(aggregates, trade_df, home=HOME_REPORTER):
+    """Индекс версии данных; названия партнеров - из торговых данных home"""
+    names = trade_df[['partnerCode', 'partnerName']].drop_duplicates('partnerCode')
+    names = pd.Series(names['partnerName'].to_numpy(), index=to_codes(names['partnerCode']))
+    return MirrorIndex(aggregates['reporter_chapter_flow'], home,
+                       lambda codes: names.reindex(np.asarray(codes, dtype=float)).fillna('').to_numpy())
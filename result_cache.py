@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Общий для всех воркеров кэш результатов callback'ов с single-flight блокировкой.
+
+Результат хранится в diskcache (SQLite в локальном каталоге) по ключу из имени
+callback'а, значений входов и версии данных, поэтому его видят все воркеры
+gunicorn на машине. Отсутствующую запись считает только один воркер: он ставит
+блокировку атомарным add, остальные ждут появления результата, а не считают
+то же самое параллельно. Поверх общего кэша результаты держатся и в памяти воркера
+в пределах общего бюджета (memory_cache). Без diskcache остается только этот уровень.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from memory_cache import registry
+
+try:
+    import diskcache
+except ImportError:
+    diskcache = None
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_ENABLED = os.environ.get('DASHBOARD_RESULT_CACHE', '1') == '1'
+RESULT_CACHE_DIR = os.environ.get('DASHBOARD_RESULT_CACHE_DIR', os.path.join('.cache', 'results'))
+# Сколько секунд хранить результат, к которому никто не обращался
+RESULT_CACHE_EXPIRE = int(os.environ.get('DASHBOARD_RESULT_CACHE_EXPIRE', '3600'))
+# Сколько ждать чужого вычисления, прежде чем считать самому (и срок жизни блокировки)
+LOCK_TIMEOUT = 60
+POLL_INTERVAL = 0.05
+
+LOCK_PREFIX = 'lock:'
+_MISSING = object()
+
+
+def result_key(name, args, version):
+    """Ключ результата: имя callback'а, значения входов и версия данных"""
+    payload = json.dumps([name, args, version], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+class SharedResultCache:
+    """Кэш результатов в diskcache, общий для процессов на одной машине"""
+
+    def __init__(self, directory=RESULT_CACHE_DIR, expire=RESULT_CACHE_EXPIRE,
+                 lock_timeout=LOCK_TIMEOUT, poll_interval=POLL_INTERVAL):
+        self.cache = diskcache.Cache(directory)
+        self.expire = expire
+        self.lock_timeout = lock_timeout
+        self.poll_interval = poll_interval
+
+    def get_or_compute(self, key, compute):
+        """Значение из кэша; если его нет - считает один процесс, остальные ждут"""
+        value = self.cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        lock_key = LOCK_PREFIX + key
+        # Метка владельца: снять можно только свою блокировку
+        token = f"{os.getpid()}:{threading.get_ident()}:{uuid.uuid4().hex}"
+        deadline = time.monotonic() + self.lock_timeout
+        while not self.cache.add(lock_key, token, expire=self.lock_timeout):
+            # Ключ уже считает другой воркер
+            time.sleep(self.poll_interval)
+            value = self.cache.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if time.monotonic() > deadline:
+                logger.warning("Не дождались результата %s, считаем сами", key)
+                return compute()
+
+        try:
+            # Пока ждали блокировку, результат мог появиться
+            value = self.cache.get(key, _MISSING)
+            if value is _MISSING:
+                value = compute()
+                self.cache.set(key, value, expire=self.expire)
+            return value
+        finally:
+            self._release(lock_key, token)
+
+    def _release(self, lock_key, token):
+        """Снимает блокировку, если она все еще наша.
+
+        Если вычисление шло дольше lock_timeout, блокировка истекла и ее мог взять
+        другой воркер - удалять ее нельзя, иначе тот же ключ начнет считать третий.
+        """
+        with self.cache.transact():
+            if self.cache.get(lock_key) == token:
+                self.cache.delete(lock_key)
+
+    def clear(self):
+        self.cache.clear()
+
+
+def create_result_cache():
+    """Общий кэш результатов или None, если он выключен или нет diskcache"""
+    if not RESULT_CACHE_ENABLED:
+        return None
+    if diskcache is None:
+        logger.warning("Общий кэш результатов недоступен: не установлен diskcache")
+        return None
+    logger.info("Общий кэш результатов: diskcache в %s", RESULT_CACHE_DIR)
+    return SharedResultCache()
+
+
+def shared_result(cache, version_getter):
+    """Декоратор callback'а: результат берется из памяти воркера или общего кэша по входам и версии данных"""
+    memory = registry.cache('callbacks')
+
+    def decorator(func):
+        if not RESULT_CACHE_ENABLED:
+            return func
+
+        @functools.wraps(func)
+        def wrapper(*args):
+            version = version_getter()
+            if version is None:
+                # Данные еще не загружены - кэшировать нечего
+                return func(*args)
+            key = result_key(f"{func.__module__}.{func.__qualname__}", args, version)
+            if cache is None:
+                return memory.get_or_compute(key, lambda: func(*args))
+            return memory.get_or_compute(key, lambda: cache.get_or_compute(key, lambda: func(*args)))
+
+        return wrapper
+
+    return decorator
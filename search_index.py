@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Поиск партнеров и товарных групп по началу слова, коду и ISO3.
+
+Индекс строится один раз на версию данных. Названия нормализуются (регистр,
+ё/е, знаки препинания), все слова и коды складываются в один отсортированный
+список, и префикс любой длины ищется двумя бинарными поисками. Для запросов,
+которые не совпали с началом слова (середина длинного описания товара),
+есть триграммный индекс: кандидаты - пересечение списков записей по триграммам
+запроса, затем точная проверка подстроки.
+"""
+
+import bisect
+import re
+
+import numpy as np
+import pandas as pd
+from flask import jsonify, request
+
+from lookups import country_lookup, to_codes
+
+KINDS = {
+    'partner': "Партнер",
+    'commodity': "Товарная группа",
+}
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+_NON_WORD = re.compile(r'[^0-9a-zа-я]+')
+
+# Ранги совпадений: меньше - выше в выдаче
+EXACT_CODE, NAME_START, WORD_PREFIX, SUBSTRING = range(4)
+
+
+def normalize(text):
+    """Нижний регистр, ё -> е, всё кроме букв и цифр - пробелы"""
+    text = str(text).lower().replace('ё', 'е')
+    return _NON_WORD.sub(' ', text).strip()
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """Префиксный и триграммный индекс по названиям и кодам"""
+
+    def __init__(self, kinds, codes, labels, extra_keys=None, weights=None):
+        self.kinds = list(kinds)
+        self.codes = [int(code) for code in codes]
+        self.labels = [str(label) for label in labels]
+        self.weights = np.asarray(weights if weights is not None else np.zeros(len(self.codes)), dtype=float)
+        self.names = [normalize(label) for label in self.labels]
+        extra_keys = extra_keys if extra_keys is not None else [()] * len(self.codes)
+
+        # Слова названий, коды и доп. ключи (ISO3) - в одном отсортированном списке
+        tokens = []
+        for entry, (name, code, keys) in enumerate(zip(self.names, self.codes, extra_keys)):
+            for position, word in enumerate(name.split()):
+                tokens.append((word, entry, NAME_START if position == 0 else WORD_PREFIX))
+            tokens.append((str(code), entry, EXACT_CODE))
+            for key in keys:
+                if isinstance(key, str) and key:
+                    tokens.append((normalize(key), entry, EXACT_CODE))
+        tokens.sort()
+        self._tokens = [token for token, _, _ in tokens]
+        self._token_entries = np.array([entry for _, entry, _ in tokens], dtype=np.int64)
+        self._token_ranks = np.array([rank for _, _, rank in tokens], dtype=np.int64)
+
+        postings = {}
+        for entry, name in enumerate(self.names):
+            for gram in trigrams(name):
+                postings.setdefault(gram, []).append(entry)
+        self._trigrams = {gram: np.array(entries, dtype=np.int64) for gram, entries in postings.items()}
+        self._positions = {(kind, code): position for position, (kind, code) in enumerate(zip(self.kinds, self.codes))}
+
+    def __len__(self):
+        return len(self.codes)
+
+    def _prefix(self, word):
+        """Лучший ранг каждой записи, у которой есть слово или код, начинающийся с word"""
+        start = bisect.bisect_left(self._tokens, word)
+        end = bisect.bisect_left(self._tokens, word + '\uffff', start)
+        entries = self._token_entries[start:end]
+        ranks = self._token_ranks[start:end].copy()
+        # Код засчитывается как точное совпадение, только если он введен целиком
+        for offset in np.flatnonzero(ranks == EXACT_CODE):
+            if self._tokens[start + offset] != word:
+                ranks[offset] = WORD_PREFIX
+        best = {}
+        for entry, rank in zip(entries.tolist(), ranks.tolist()):
+            if rank < best.get(entry, SUBSTRING + 1):
+                best[entry] = rank
+        return best
+
+    def _substring(self, query):
+        grams = trigrams(query)
+        # Пробелы по краям запроса не обязаны совпадать с границами слов
+        grams = {gram for gram in grams if gram.strip() == gram} or grams
+        candidates = None
+        for gram in grams:
+            entries = self._trigrams.get(gram)
+            if entries is None:
+                return {}
+            candidates = entries if candidates is None else np.intersect1d(candidates, entries, assume_unique=True)
+        return {int(entry): SUBSTRING for entry in candidates if query in self.names[entry]}
+
+    def search(self, query, kind=None, limit=DEFAULT_LIMIT):
+        """Записи по запросу: сначала точные коды, затем совпадения с началом названия и слов"""
+        query = normalize(query)
+        if not query:
+            return []
+
+        # Все слова запроса должны совпасть с началом какого-нибудь слова записи
+        matches = None
+        for word in query.split():
+            found = self._prefix(word)
+            if matches is None:
+                matches = found
+            else:
+                matches = {entry: max(rank, found[entry]) for entry, rank in matches.items() if entry in found}
+        if not matches and len(query) >= 3:
+            matches = self._substring(query)
+
+        results = [
+            entry for entry in matches
+            if kind is None or self.kinds[entry] == kind
+        ]
+        results.sort(key=lambda entry: (matches[entry], -self.weights[entry], len(self.labels[entry])))
+        return [self.entry(entry) for entry in results[:limit]]
+
+    def entry(self, position):
+        return {
+            'kind': self.kinds[position],
+            'code': self.codes[position],
+            'label': self.labels[position],
+        }
+
+    def find(self, kind, code):
+        """Запись по виду и коду или None"""
+        position = self._positions.get((kind, code))
+        return self.entry(position) if position is not None else None
+
+
+def build_search_index(trade_df, countries_df, commodities_df, aggregates):
+    """Индекс по партнерам из торговых данных и товарным группам справочника"""
+    # Пары код-название партнеров, которые реально встречаются в данных
+    partners = trade_df[['partnerCode', 'partnerName']].drop_duplicates('partnerCode').drop_duplicates('partnerName')
+    partner_codes = to_codes(partners['partnerCode'])
+    partners = partners[~np.isnan(partner_codes)]
+    partner_codes = partner_codes[~np.isnan(partner_codes)].astype(np.int64)
+    iso3 = country_lookup(countries_df).take(partner_codes, 'iso3')
+    partner_weights = aggregates['partner_totals'].reindex(partners['partnerName']).fillna(0).to_numpy()
+
+    commodity_codes = to_codes(commodities_df['id'])
+    commodities = commodities_df[~np.isnan(commodity_codes)]
+    commodity_codes = commodity_codes[~np.isnan(commodity_codes)].astype(np.int64)
+    commodity_totals = aggregates['commodity_flow'].groupby('commodityCode')['value'].sum()
+    commodity_weights = commodity_totals.reindex(commodity_codes).fillna(0).to_numpy()
+
+    return SearchIndex(
+        kinds=['partner'] * len(partner_codes) + ['commodity'] * len(commodity_codes),
+        codes=np.concatenate([partner_codes, commodity_codes]),
+        labels=list(partners['partnerName']) + list(commodities['text']),
+        # Главы ТН ВЭД ищутся и с ведущим нулем: '01', '08'
+        extra_keys=[(value,) for value in pd.Series(iso3).tolist()] + [(f"{code:02d}",) for code in commodity_codes],
+        weights=np.concatenate([partner_weights, commodity_weights]),
+    )
+
+
+def install_search(server, store, url='/search'):
+    """Регистрирует маршрут поиска: /search?q=...&kind=partner|commodity&limit=20"""
+
+    def search():
+        if not store.ready:
+            return jsonify(status='loading', error=store.error), 503
+        kind = request.args.get('kind') or None
+        if kind is not None and kind not in KINDS:
+            return jsonify(error=f"Неизвестный вид {kind}, доступны: {', '.join(KINDS)}"), 400
+        try:
+            limit = min(int(request.args.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+        except ValueError:
+            return jsonify(error="Параметр limit должен быть целым числом"), 400
+        results = store.get().search.search(request.args.get('q', ''), kind, limit)
+        return jsonify(results=results, version=store.version)
+
+    server.add_url_rule(url, endpoint='search', view_func=search)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Быстрая сериализация ответов callback'ов: orjson и усечение точности.
+
+Всё включается явно через переменные окружения:
+    DASHBOARD_FAST_JSON=1      - orjson + компактные фигуры
+    DASHBOARD_VALUE_DECIMALS=2 - сколько знаков оставлять у значений (млн USD)
+    DASHBOARD_COMPRESS=1       - сжатие ответов встроенным в Dash flask-compress (gzip, brotli)
+"""
+
+import os
+
+import numpy as np
+import plotly.io as pio
+
+FAST_JSON = os.environ.get('DASHBOARD_FAST_JSON', '0') == '1'
+COMPRESS = os.environ.get('DASHBOARD_COMPRESS', '0') == '1'
+VALUE_DECIMALS = int(os.environ.get('DASHBOARD_VALUE_DECIMALS', '2'))
+
+# Атрибуты трасс, в которых лежат значения торговли
+VALUE_ATTRIBUTES = ('x', 'y', 'z', 'values')
+
+
+def trim_values(values, decimals=VALUE_DECIMALS):
+    """Округляет массив значений до decimals знаков"""
+    array = np.asarray(values)
+    if array.dtype.kind != 'f':
+        return values
+    # Остается float64: кратчайшая запись округленного числа короткая (0.1), а float32
+    # при сериализации расширяется обратно до float64 и дает 0.10000000149011612
+    return np.round(array, decimals)
+
+
+def shrink_figure_dict(fig, decimals=VALUE_DECIMALS):
+    """То же для фигуры-словаря; общий шаблон из figures не изменяется, а копируется"""
+    data = []
+    for trace in fig['data']:
+        trace = dict(trace)
+        for attr in VALUE_ATTRIBUTES:
+            if attr in trace:
+                trace[attr] = trim_values(trace[attr], decimals)
+        data.append(trace)
+
+    layout = fig['layout']
+    template = layout.get('template')
+    if template and 'data' in template:
+        used_types = {trace.get('type', 'scatter') for trace in data}
+        layout = dict(layout, template=dict(template, data={
+            trace_type: styles for trace_type, styles in template['data'].items()
+            if trace_type in used_types
+        }))
+    return {'data': data, 'layout': layout}
+
+
+def shrink_figure(fig, decimals=VALUE_DECIMALS):
+    """Уменьшает фигуру: точность значений и неиспользуемые части шаблона"""
+    if isinstance(fig, dict):
+        return shrink_figure_dict(fig, decimals)
+    for trace in fig.data:
+        for attr in VALUE_ATTRIBUTES:
+            values = getattr(trace, attr, None)
+            if values is not None:
+                trace[attr] = trim_values(values, decimals)
+
+    # Шаблон plotly_white содержит стили для всех типов трасс - оставляем только нужные
+    used_types = {trace.type for trace in fig.data}
+    template = fig.layout.template
+    if template.data is not None:
+        template_data = template.data.to_plotly_json()
+        fig.layout.template.data = {
+            trace_type: styles for trace_type, styles in template_data.items()
+            if trace_type in used_types
+        }
+
+    return fig
+
+
+def compact_figure(fig):
+    """Сжимает фигуру перед отправкой, если включен быстрый путь"""
+    if not FAST_JSON:
+        return fig
+    return shrink_figure(fig)
+
+
+def install(app):
+    """Включает быстрый путь сериализации для Dash-приложения по настройкам окружения"""
+    if FAST_JSON:
+        # Dash сериализует ответы через plotly.io.json - переключаем его движок
+        pio.json.config.default_engine = 'orjson'
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Снимок подготовленных данных: таблицы и агрегаты в одном файле, который отображается в память.
+
+Формат файла:
+    MAGIC (8 байт) | длина заголовка (uint64) | заголовок JSON | выровненные массивы колонок
+
+Числовые колонки хранятся как есть и читаются без копирования через mmap,
+строковые - словарным кодированием (коды + отсортированный список значений в заголовке)
+и читаются как category поверх отображенных кодов, тоже без копирования.
+Снимок действителен, пока не изменились исходные CSV и код подготовки данных.
+"""
+
+import contextlib
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+import data_store
+import lookups
+import reconciliation
+from data_store import DATA_FILES, TradeData, prepare_data
+from http_cache import file_fingerprint
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'FTDSNAP1'
+ALIGNMENT = 64
+
+SNAPSHOT_ENABLED = os.environ.get('DASHBOARD_SNAPSHOT', '1') == '1'
+SNAPSHOT_PATH = os.environ.get('DASHBOARD_SNAPSHOT_PATH', os.path.join('.snapshots', 'trade_data.snap'))
+
+TABLES = ('trade_df', 'countries_df', 'commodities_df')
+
+
+def code_version():
+    """Версия кода подготовки данных: при его изменении снимок пересобирается"""
+    digest = hashlib.sha256(pd.__version__.encode('utf-8'))
+    for module in (data_store, lookups, reconciliation, sys.modules[__name__]):
+        with open(module.__file__, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+
+def source_stats(paths=DATA_FILES):
+    """Быстрая проверка исходников без чтения: размер и время изменения"""
+    stats = {}
+    for path in paths:
+        stat = os.stat(path)
+        stats[path] = [stat.st_size, stat.st_mtime_ns]
+    return stats
+
+
+def _align(size):
+    return (size + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _encode_frame(frame, blobs, offset):
+    """Раскладываем DataFrame на массивы колонок; возвращаем описание и новый offset"""
+    columns = []
+    for name in frame.columns:
+        column = frame[name]
+        spec = {'name': name, 'dtype': str(column.dtype)}
+        if column.dtype.kind in 'biuf':
+            array = np.ascontiguousarray(column.to_numpy())
+        else:
+            # Значения по возрастанию: порядок категорий совпадает с порядком строк при сортировке,
+            # а тип кодов - тот, который pandas выбирает сам, чтобы при чтении не было приведения
+            categorical = pd.Categorical(column)
+            array = categorical.codes
+            spec['categories'] = [str(value) for value in categorical.categories]
+        spec['array_dtype'] = array.dtype.str
+        spec['offset'] = offset
+        spec['length'] = len(array)
+        blobs.append((offset, array))
+        offset = _align(offset + array.nbytes)
+        columns.append(spec)
+    return {'columns': columns, 'rows': len(frame)}, offset
+
+
+def _decode_frame(spec, buffer, data_start):
+    """Собираем DataFrame из массивов, отображенных в память"""
+    columns = {}
+    for column in spec['columns']:
+        dtype = np.dtype(column['array_dtype'])
+        if column['length'] == 0:
+            array = np.empty(0, dtype=dtype)
+        else:
+            array = np.frombuffer(
+                buffer, dtype=dtype, count=column['length'], offset=data_start + column['offset']
+            )
+        if 'categories' in column:
+            # Без astype: перевод в строки - проход по всем строкам с копированием в кучу
+            columns[column['name']] = pd.Categorical.from_codes(array, column['categories'], validate=False)
+        else:
+            columns[column['name']] = array
+    return pd.DataFrame(columns, copy=False) if columns else pd.DataFrame(index=range(spec['rows']))
+
+
+def _encode_value(value, blobs, offset):
+    """Описание агрегата: таблица, ряд с индексом или число"""
+    if isinstance(value, pd.DataFrame):
+        frame_spec, offset = _encode_frame(value.reset_index(drop=True), blobs, offset)
+        return {'kind': 'frame', 'frame': frame_spec}, offset
+    if isinstance(value, pd.Series):
+        index_names = list(value.index.names)
+        frame_spec, offset = _encode_frame(value.reset_index(), blobs, offset)
+        return {'kind': 'series', 'name': value.name, 'index': index_names, 'frame': frame_spec}, offset
+    return {'kind': 'scalar', 'value': value.item() if hasattr(value, 'item') else value}, offset
+
+
+def _decode_value(spec, buffer, data_start):
+    if spec['kind'] == 'frame':
+        return _decode_frame(spec['frame'], buffer, data_start)
+    if spec['kind'] == 'series':
+        frame = _decode_frame(spec['frame'], buffer, data_start)
+        return frame.set_index(spec['index'])[spec['name']]
+    return spec['value']
+
+
+def save_snapshot(data, path=SNAPSHOT_PATH, stats=None):
+    """Записывает снимок атомарно: сначала во временный файл, потом rename"""
+    blobs = []
+    offset = 0
+    tables = {}
+    for name in TABLES:
+        tables[name], offset = _encode_value(getattr(data, name), blobs, offset)
+    aggregates = {}
+    for name, value in data.aggregates.items():
+        aggregates[name], offset = _encode_value(value, blobs, offset)
+
+    header = json.dumps({
+        'code_version': code_version(),
+        'source_version': data.version,
+        'source_stats': stats if stats is not None else source_stats(),
+        'tables': tables,
+        'aggregates': aggregates,
+    }, ensure_ascii=False).encode('utf-8')
+    data_start = _align(len(MAGIC) + 8 + len(header))
+
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(MAGIC)
+            f.write(struct.pack('<Q', len(header)))
+            f.write(header)
+            for blob_offset, array in blobs:
+                f.seek(data_start + blob_offset)
+                f.write(array.tobytes())
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info("Снимок данных сохранен: %s", path)
+
+
+def read_header(path=SNAPSHOT_PATH):
+    """Читает заголовок снимка; None, если файла нет или он поврежден"""
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (length,) = struct.unpack('<Q', f.read(8))
+            return json.loads(f.read(length).decode('utf-8'))
+    except (OSError, ValueError, struct.error):
+        return None
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """Отображает снимок в память и собирает из него TradeData без пересчета"""
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    (length,) = struct.unpack_from('<Q', buffer, len(MAGIC))
+    header = json.loads(buffer[len(MAGIC) + 8:len(MAGIC) + 8 + length].decode('utf-8'))
+    data_start = _align(len(MAGIC) + 8 + length)
+
+    tables = {
+        name: _decode_value(spec, buffer, data_start) for name, spec in header['tables'].items()
+    }
+    aggregates = {
+        name: _decode_value(spec, buffer, data_start) for name, spec in header['aggregates'].items()
+    }
+    return TradeData(aggregates=aggregates, version=header['source_version'], **tables)
+
+
+def is_current(header, stats):
+    """Снимок актуален, если код тот же, а исходники не менялись"""
+    if header is None or header.get('code_version') != code_version():
+        return False
+    if header.get('source_stats') == stats:
+        return True
+    # Время изменения могло поменяться без изменения содержимого - сверяем хэш
+    return header.get('source_version') == file_fingerprint(DATA_FILES)
+
+
+@contextlib.contextmanager
+def build_lock(path=SNAPSHOT_PATH):
+    """Межпроцессная блокировка подготовки: снимок собирает один воркер, остальные ждут"""
+    if fcntl is None:
+        yield
+        return
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    with open(path + '.lock', 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _load_current(path, stats):
+    """Данные из снимка, если он актуален и читается, иначе None"""
+    if not is_current(read_header(path), stats):
+        return None
+    try:
+        return load_snapshot(path)
+    except (OSError, ValueError, KeyError, struct.error):
+        logger.exception("Не удалось прочитать снимок %s, готовим данные заново", path)
+        return None
+
+
+def load_or_prepare(prepare=prepare_data, path=SNAPSHOT_PATH):
+    """Теплый старт из снимка, а если он устарел - полная подготовка и новый снимок"""
+    if not SNAPSHOT_ENABLED:
+        return prepare()
+
+    stats = source_stats()
+    data = _load_current(path, stats)
+    if data is not None:
+        return data
+
+    with build_lock(path):
+        # Пока ждали блокировку, снимок мог собрать другой воркер
+        data = _load_current(path, stats)
+        if data is not None:
+            return data
+
+        data = prepare()
+        try:
+            save_snapshot(data, path, stats)
+        except OSError:
+            logger.exception("Не удалось сохранить снимок %s", path)
+    return data
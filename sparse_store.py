@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Разреженная матрица партнер × товар по каждому году и потоку.
+
+Большая часть пар партнер-товар пустая, поэтому плотный куб годы × потоки ×
+партнеры × товары (а на уровне HS6 - тем более) не строится. Каждая матрица
+хранится в формате CSR (indptr, indices, data), а выбор топ-K строк и столбцов
+и вырезание небольшой плотной подматрицы для heatmap делаются прямо по нему.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+class CSRMatrix:
+    """Разреженная матрица в формате CSR на массивах NumPy"""
+
+    def __init__(self, indptr, indices, data, shape):
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.shape = shape
+
+    @classmethod
+    def from_coo(cls, rows, cols, values, shape):
+        """Из троек (строка, столбец, значение); повторные пары суммируются"""
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        values = np.asarray(values, dtype=np.float64)
+
+        keys = rows * shape[1] + cols
+        keys, inverse = np.unique(keys, return_inverse=True)
+        data = np.bincount(inverse, weights=values, minlength=len(keys))
+        rows, indices = np.divmod(keys, shape[1])
+
+        indptr = np.zeros(shape[0] + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        return cls(indptr, indices.astype(np.int32), data, shape)
+
+    @property
+    def nnz(self):
+        return len(self.data)
+
+    def row_ids(self):
+        """Номер строки для каждого ненулевого элемента"""
+        return np.repeat(np.arange(self.shape[0]), np.diff(self.indptr))
+
+    def row_sums(self):
+        return np.bincount(self.row_ids(), weights=self.data, minlength=self.shape[0])
+
+    def col_sums(self):
+        return np.bincount(self.indices, weights=self.data, minlength=self.shape[1])
+
+    @staticmethod
+    def _top(sums, k):
+        """Индексы k наибольших ненулевых сумм по убыванию"""
+        nonzero = np.flatnonzero(sums)
+        if len(nonzero) > k:
+            nonzero = nonzero[np.argpartition(sums[nonzero], -k)[-k:]]
+        return nonzero[np.argsort(-sums[nonzero], kind='stable')]
+
+    def top_rows(self, k):
+        return self._top(self.row_sums(), k)
+
+    def top_cols(self, k):
+        return self._top(self.col_sums(), k)
+
+    def submatrix(self, rows, cols):
+        """Плотная подматрица len(rows) × len(cols) только из выбранных строк"""
+        rows = np.asarray(rows, dtype=np.int64)
+        result = np.zeros((len(rows), len(cols)))
+        if not len(rows) or not len(cols):
+            return result
+
+        # Позиции выбранных столбцов в результате, -1 - столбец не выбран
+        col_position = np.full(self.shape[1], -1, dtype=np.int64)
+        col_position[cols] = np.arange(len(cols))
+
+        starts, ends = self.indptr[rows], self.indptr[rows + 1]
+        lengths = ends - starts
+        row_position = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + offsets
+
+        columns = col_position[self.indices[positions]]
+        keep = columns >= 0
+        result[row_position[keep], columns[keep]] = self.data[positions[keep]]
+        return result
+
+
+class PartnerCommodityStore:
+    """CSR-матрицы партнер × товар по ключу (год, поток) с общими осями"""
+
+    def __init__(self, frame, row_column='partnerName', col_column='commodityCode',
+                 value_column='value', key_columns=('year', 'flow')):
+        row_codes, self.row_labels = pd.factorize(frame[row_column], sort=True)
+        col_codes, self.col_labels = pd.factorize(frame[col_column], sort=True)
+        shape = (len(self.row_labels), len(self.col_labels))
+        values = frame[value_column].to_numpy()
+
+        self.matrices = {}
+        key_columns = list(key_columns)
+        for key, positions in frame.groupby(key_columns, sort=True, observed=True).indices.items():
+            self.matrices[key] = CSRMatrix.from_coo(
+                row_codes[positions], col_codes[positions], values[positions], shape
+            )
+
+    def keys(self):
+        return list(self.matrices)
+
+    def years(self):
+        return sorted({int(key[0]) for key in self.matrices})
+
+    def heatmap(self, key, top_rows=20, top_cols=20):
+        """Топ-K строк и столбцов матрицы и плотная подматрица для них"""
+        matrix = self.matrices.get(key)
+        if matrix is None:
+            return [], [], np.zeros((0, 0))
+        rows = matrix.top_rows(top_rows)
+        cols = matrix.top_cols(top_cols)
+        return (
+            list(self.row_labels[rows]),
+            list(self.col_labels[cols]),
+            matrix.submatrix(rows, cols),
+        )